@@ -1,13 +1,15 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import jwt
 from jwt.exceptions import PyJWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from .database import db
-from .models import UserModel, TokenInfo
+from .models import UserModel, UserSession, TokenInfo
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from . import crud
 import os
 import dotenv
 from .logger import get_logger
@@ -20,6 +22,10 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+# Claim carrying the user's token generation at issue time; logging out
+# everywhere bumps the generation, which revokes every older token at once
+TOKEN_GENERATION_CLAIM = "gen"
+
 users_collection = db['users']
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -33,8 +39,9 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 def get_user(email: str):
+    """Load a user with their credentials, for login."""
     logger.debug(f"Fetching user with email: {email}")
-    user_data = users_collection.find_one({"email": email})
+    user_data = users_collection.find_one({"email": email}, crud.user_projection(crud.UserProfile.CREDENTIAL))
     if user_data:
         logger.trace(f"User found: {email}")
         return UserModel(**user_data)
@@ -109,6 +116,11 @@ def verify_token(token: str, token_type: str = None):
     It also checks if the token type matches the expected type (access or refresh).
     If the token is valid, it returns the payload; otherwise, it returns None.
     """
+    payload, _ = _verify_token(token, token_type, {"_id": 1})
+    return payload
+
+def _verify_token(token: str, token_type: Optional[str], projection: dict) -> Tuple[Optional[dict], Optional[dict]]:
+    # Returns the payload and the user document read with the projection, or (None, None)
     logger.debug(f"Verifying token: {token}")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -118,46 +130,48 @@ def verify_token(token: str, token_type: str = None):
         logger.debug(f"Verifying token for user ID: {user_id}")
         if user_id is None:
             logger.warning("Token validation failed: Missing user ID in token")
-            return None
+            return None, None
             
         # Check token type if specified
         if token_type and payload.get("token_type") != token_type:
             logger.warning(f"Token validation failed: Expected {token_type} token but got {payload.get('token_type')}")
-            return None
+            return None, None
             
         # Check if token exists in user's token list (now in TokenInfo format)
         # Is this checking all tokens in the token field?
-        user = users_collection.find_one({"_id": ObjectId(user_id), "tokens": token})
+        user = users_collection.find_one(
+            {"_id": ObjectId(user_id), "tokens": token, **_generation_filter(payload.get(TOKEN_GENERATION_CLAIM, 0))},
+            projection
+        )
         if not user:
             logger.warning(f"Token validation failed: Token not found for user ID: {user_id}")
-            return None
+            return None, None
             
         logger.debug(f"Token verified successfully for user ID: {user_id}")
-        return payload
+        return payload, user
     except PyJWTError as e:
         logger.warning(f"Token validation failed: JWT Error: {str(e)}")
-        return None
+        return None, None
 
-def invalidate_token(token: str):
-    """Remove a token from the user's token list."""
-    try:
-        logger.debug("invalidate_token() -- Invalidating token: %s", token)
+def _generation_filter(generation: int) -> dict:
+    # Users who never logged out everywhere have no token_generation field
+    if not generation:
+        return {"token_generation": {"$in": [0, None]}}
+    return {"token_generation": generation}
 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("id")
+def _token_user_id(token: str) -> Optional[str]:
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("id")
 
-        # Show the db user before and after the update
-        user_before = users_collection.find_one({"_id": ObjectId(user_id)})
-        logger.debug(f"User before update: {user_before}")
+def invalidate_token(token: str):
+    """Remove a token from the user's token list with a single update."""
+    try:
+        user_id = _token_user_id(token)
         if user_id:
-            # Try to remove the token in both formats
-            # 1. First try to remove as direct token string
             result = users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$pull": {"tokens": token}}
             )
-            user_after = users_collection.find_one({"_id": ObjectId(user_id)})
-            logger.debug(f"User after update: {user_after}")
             logger.debug(f"Token invalidated for user ID: {user_id}, modified: {result.modified_count}")
             return result.modified_count > 0
     except PyJWTError as e:
@@ -165,19 +179,61 @@ def invalidate_token(token: str):
     return False
 
 def invalidate_tokens(tokens: list):
-    """Remove multiple tokens from the user's token list."""
+    """Remove multiple tokens from their users' token lists.
+
+    Tokens are grouped by user and removed with one $pullAll per user, all
+    sent in a single bulk write.
+
+    Returns:
+        bool: True if every token was valid and every user's list changed.
+    """
     if not tokens or len(tokens) == 0:
         logger.warning("No tokens provided for invalidation")
         return False
-    
+
     success = True
+    tokens_by_user: Dict[str, List[str]] = {}
     for token in tokens:
-        if token:  # Skip None or empty tokens
-            if not invalidate_token(token):
-                success = False
-    
+        if not token:  # Skip None or empty tokens
+            continue
+        try:
+            user_id = _token_user_id(token)
+        except PyJWTError as e:
+            logger.warning(f"Token invalidation failed: JWT Error: {str(e)}")
+            success = False
+            continue
+        if not user_id:
+            success = False
+            continue
+        tokens_by_user.setdefault(user_id, []).append(token)
+
+    if tokens_by_user:
+        modified = crud.pull_user_tokens(tokens_by_user)
+        logger.debug(f"Invalidated {sum(len(t) for t in tokens_by_user.values())} tokens of {modified} users")
+        success = success and modified == len(tokens_by_user)
     return success
 
+def revoke_all_tokens(user_id: str) -> Optional[int]:
+    """Log a user out everywhere in one write.
+
+    Clears the stored tokens and bumps the user's token generation, so any
+    token issued before, stored or not, fails verify_token.
+
+    Returns:
+        int: The new generation to issue tokens with, or None if the user doesn't exist.
+    """
+    user = users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"tokens": []}, "$inc": {"token_generation": 1}},
+        projection={"token_generation": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        logger.warning(f"Cannot revoke tokens of missing user: {user_id}")
+        return None
+    logger.info(f"Revoked all tokens of user {user_id}, generation now {user['token_generation']}")
+    return user["token_generation"]
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     logger.debug("Validating token for authentication")
     credentials_exception = HTTPException(
@@ -186,18 +242,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = verify_token(token, token_type="access")
+    # The token check and the user read are one query, loading only the session profile
+    payload, user_data = _verify_token(token, "access", crud.user_projection(crud.UserProfile.SESSION))
     if payload is None:
         raise credentials_exception
     
-    user_id = payload.get("id")
-    user_data = users_collection.find_one({"_id": ObjectId(user_id)})
-    if user_data is None:
-        logger.warning(f"User not found with ID: {user_id}")
-        raise credentials_exception
-    
     logger.debug(f"User authenticated via token: {user_data.get('email')}")
-    return UserModel(**user_data)
+    return UserSession(**user_data)
 
 def is_jwt_token(token: str) -> bool:
     """Check if the token is a JWT token.
@@ -0,0 +1,42 @@
+"""
+The include=author option of list endpoints.
+
+Embeds each item's author as a UserPublicResponse, resolving every distinct
+author on the page with one call to crud.get_public_profiles instead of one
+/users/{id} request per author from the client.
+"""
+from typing import Iterable, List, Optional, Set
+from fastapi import HTTPException
+from . import crud, schemas
+
+INCLUDE_AUTHOR = "author"
+SUPPORTED_INCLUDES = {INCLUDE_AUTHOR}
+
+def parse_include(include: Optional[str]) -> Set[str]:
+    """Parse a comma-separated include parameter, rejecting unknown values."""
+    if not include:
+        return set()
+    requested = {value.strip().lower() for value in include.split(",") if value.strip()}
+    unknown = requested - SUPPORTED_INCLUDES
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported include value(s): {', '.join(sorted(unknown))}"
+        )
+    return requested
+
+def embed_authors(items: Iterable, response_schema=None) -> List:
+    """Return the items as response schemas with their author set.
+
+    Items are models or response schemas with an author_id; response_schema
+    converts models first. Blocking; call it in a worker thread from handlers.
+    An author that no longer exists is embedded as None.
+    """
+    items = [response_schema.model_validate(item, from_attributes=True) if response_schema else item for item in items]
+    profiles = crud.get_public_profiles([item.author_id for item in items])
+    return [
+        item.model_copy(update={
+            "author": schemas.UserPublicResponse(**profiles[item.author_id]) if item.author_id in profiles else None
+        })
+        for item in items
+    ]
@@ -0,0 +1,460 @@
+"""
+Bulk export and import of posts with their comments.
+
+An export is NDJSON, optionally gzip-compressed. Each post is one line of
+{"type": "post", "data": {...}} followed by one {"type": "comment", ...}
+line per comment on it, and the stream ends with a {"type": "summary"} line
+carrying counts, throughput and the last exported post ID. Documents are
+written in MongoDB Extended JSON, so ObjectIds and dates survive the round
+trip.
+
+Posts are read from one batched cursor in _id order. The comments of each
+batch of posts come from a second cursor sorted the same way and are merged
+in, so memory stays bounded by one batch of posts however large the export
+is. Because posts are in _id order, an interrupted export resumes with
+after_id set to the last post it wrote.
+
+An import reads the same format, a batch of lines at a time. Each batch is
+validated against PostModel and CommentModel, and then written with one
+unordered insert_many for its posts followed by one for its comments. Every
+imported document gets a new ObjectId, assigned before the write, and
+post_id and parent_id references to documents earlier in the stream are
+remapped to the new IDs. A post_id that isn't in the stream must belong to
+an existing post. Invalid records and failed writes are counted and reported
+by line number without stopping the import.
+
+Memory stays bounded however large the import is: compressed input is
+inflated EXPORT_CHUNK_SIZE bytes at a time, lines longer than
+IMPORT_MAX_LINE_BYTES stop the import, and only the IDs of the last
+IMPORT_MAX_REMAPPED_IDS records are remembered. Exports put comments right
+after their post, so references reach back far less than that; a comment on a
+post further back is rejected as referencing a post that doesn't exist.
+
+Usage:
+    python -m app.bulk export --out posts.ndjson.gz
+    python -m app.bulk export --out rest.ndjson --after-id 65f0c1... --author 65a1...
+    python -m app.bulk import posts.ndjson.gz --batch-size 2000
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from bson import json_util
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from . import crud
+from .models import PostModel, CommentModel
+from .logger import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = 500
+# Lines are gathered into chunks of about this size before being written
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+IMPORT_BATCH_SIZE = 1000
+# Errors beyond this many are counted but not listed
+IMPORT_MAX_ERRORS = 100
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", 16 * 1024 * 1024))
+IMPORT_MAX_REMAPPED_IDS = int(os.getenv("IMPORT_MAX_REMAPPED_IDS", 100_000))
+PREVIEW_LENGTH = 200
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+GZIP_MEDIA_TYPE = "application/gzip"
+
+@dataclass
+class ExportStats:
+    """Counters reported at the end of an export."""
+    posts: int = 0
+    comments: int = 0
+    # Uncompressed, not counting the summary line
+    bytes: int = 0
+    last_post_id: Optional[str] = None
+    elapsed_seconds: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return (self.posts + self.comments) / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        stats["documents_per_second"] = round(self.documents_per_second, 1)
+        return stats
+
+def _line(record_type: str, data: Any, stats: Optional[ExportStats] = None) -> bytes:
+    line = (json_util.dumps({"type": record_type, "data": data}, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n").encode()
+    if stats is not None:
+        stats.bytes += len(line)
+    return line
+
+def iter_export_lines(filters: Dict[str, Any], stats: ExportStats, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Yield the NDJSON lines of an export, ending with the summary line. Blocking."""
+    started = time.perf_counter()
+    posts = crud.iter_post_documents(filters, batch_size)
+    while True:
+        batch = list(itertools.islice(posts, batch_size))
+        if not batch:
+            break
+        comments = crud.iter_comment_documents([str(post["_id"]) for post in batch])
+        comment = next(comments, None)
+        for post in batch:
+            post_id = str(post["_id"])
+            yield _line("post", post, stats)
+            stats.posts += 1
+            # Comments arrive grouped by post in the same order as the batch
+            while comment is not None and comment["post_id"] == post_id:
+                yield _line("comment", comment, stats)
+                stats.comments += 1
+                comment = next(comments, None)
+            stats.last_post_id = post_id
+        comments.close()
+    stats.elapsed_seconds = time.perf_counter() - started
+    logger.info(f"Export finished: {stats.as_dict()}")
+    yield _line("summary", stats.as_dict())
+
+def chunked(lines: Iterable[bytes], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Join lines into chunks of about chunk_size bytes."""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into one gzip member, chunk by chunk."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(filters: Dict[str, Any], compress: bool = False, stats: Optional[ExportStats] = None,
+                  batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """The bytes of an export, for a streaming HTTP response or a file. Blocking."""
+    stats = stats if stats is not None else ExportStats()
+    chunks = chunked(iter_export_lines(filters, stats, batch_size))
+    return gzipped(chunks) if compress else chunks
+
+def export_to_file(path: str, filters: Dict[str, Any], compress: Optional[bool] = None,
+                   batch_size: int = EXPORT_BATCH_SIZE) -> ExportStats:
+    """Write an export to a file, or stdout for "-"; compressed if the name ends in .gz unless compress says otherwise."""
+    compress = path.endswith(".gz") if compress is None else compress
+    stats = ExportStats()
+    out = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        for chunk in export_stream(filters, compress, stats, batch_size):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return stats
+
+@dataclass
+class ImportStats:
+    """Counters and errors reported at the end of an import."""
+    lines: int = 0
+    batches: int = 0
+    posts: int = 0
+    comments: int = 0
+    invalid: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def documents_per_second(self) -> float:
+        return (self.posts + self.comments) / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        stats["documents_per_second"] = round(self.documents_per_second, 1)
+        return stats
+
+def _validation_message(e: ValidationError) -> str:
+    error = e.errors()[0]
+    return f"{error['msg']} ({'.'.join(map(str, error['loc']))})"
+
+def _preview(body: str) -> str:
+    return body[:PREVIEW_LENGTH] + "..." if len(body) > PREVIEW_LENGTH else body
+
+class LineTooLongError(ValueError):
+    """A line of an import is longer than the configured maximum."""
+
+def _remember(ids: "OrderedDict[str, Any]", key: str, value: Any, limit: int) -> None:
+    ids[key] = value
+    if len(ids) > limit:
+        ids.popitem(last=False)
+
+class BulkImporter:
+    """Imports an NDJSON export fed to it in chunks.
+
+    import_chunk() inflates and splits a chunk and imports every batch it
+    completes before reading further, so a small gzip bomb can't expand into
+    memory all at once. It blocks; call it from a thread in async code.
+    Chunks must be imported in order, since a comment's references are
+    remapped through the IDs given to earlier posts and comments.
+    """
+
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE, compressed: bool = False,
+                 max_line_bytes: int = IMPORT_MAX_LINE_BYTES, max_remapped_ids: int = IMPORT_MAX_REMAPPED_IDS):
+        self.batch_size = batch_size
+        self.max_line_bytes = max_line_bytes
+        self.max_remapped_ids = max_remapped_ids
+        self.stats = ImportStats()
+        self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) if compressed else None
+        self._partial = b""
+        self._batch: List[Tuple[int, bytes]] = []
+        # Old ID -> new ID of the most recently imported posts and comments
+        self._new_ids: "OrderedDict[str, ObjectId]" = OrderedDict()
+        # Old IDs of recent records that weren't imported, so their children aren't either
+        self._skipped: "OrderedDict[str, None]" = OrderedDict()
+        self._started = time.perf_counter()
+
+    def feed(self, chunk: bytes) -> Iterator[List[Tuple[int, bytes]]]:
+        """Add a chunk of the stream, yielding batches as they complete.
+
+        Raises:
+            LineTooLongError: If a line exceeds max_line_bytes.
+            zlib.error: If compressed input isn't valid gzip.
+        """
+        if self._decompressor is None:
+            yield from self._split(chunk)
+            return
+        while chunk:
+            # Inflate a bounded slice at a time; the rest of the input waits in unconsumed_tail
+            yield from self._split(self._decompressor.decompress(chunk, EXPORT_CHUNK_SIZE))
+            chunk = self._decompressor.unconsumed_tail
+
+    def close(self) -> Iterator[List[Tuple[int, bytes]]]:
+        """End the stream, yielding the remaining batches."""
+        if self._decompressor is not None:
+            yield from self._split(self._decompressor.flush())
+        rest, self._partial = self._partial, b""
+        if rest:
+            yield from self._add_lines([rest])
+        if self._batch:
+            batch, self._batch = self._batch, []
+            yield batch
+
+    def _split(self, data: bytes) -> Iterator[List[Tuple[int, bytes]]]:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > self.max_line_bytes:
+            raise LineTooLongError(f"Line {self.stats.lines + len(lines) + 1} is longer than {self.max_line_bytes} bytes")
+        yield from self._add_lines(lines)
+
+    def _add_lines(self, lines: List[bytes]) -> Iterator[List[Tuple[int, bytes]]]:
+        for line in lines:
+            self.stats.lines += 1
+            if len(line) > self.max_line_bytes:
+                raise LineTooLongError(f"Line {self.stats.lines} is longer than {self.max_line_bytes} bytes")
+            if not line.strip():
+                continue
+            self._batch.append((self.stats.lines, line))
+            if len(self._batch) >= self.batch_size:
+                batch, self._batch = self._batch, []
+                yield batch
+
+    def import_chunk(self, chunk: bytes) -> None:
+        """Feed a chunk and import the batches it completes. Blocking."""
+        for batch in self.feed(chunk):
+            self.import_batch(batch)
+
+    def import_rest(self) -> None:
+        """End the stream and import what is left. Blocking."""
+        for batch in self.close():
+            self.import_batch(batch)
+
+    def _error(self, line_number: int, message: str) -> None:
+        if len(self.stats.errors) < IMPORT_MAX_ERRORS:
+            self.stats.errors.append({"line": line_number, "batch": self.stats.batches, "error": message})
+
+    def _reject(self, line_number: int, old_id: Optional[str], message: str) -> None:
+        self.stats.invalid += 1
+        if old_id:
+            _remember(self._skipped, old_id, None, self.max_remapped_ids)
+        self._error(line_number, message)
+
+    def _parse(self, line_number: int, line: bytes) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+        try:
+            record = json_util.loads(line)
+            record_type, data = record["type"], record["data"]
+        except Exception as e:
+            self._reject(line_number, None, f"Malformed record: {e}")
+            return None
+        if record_type == "summary":
+            return None
+        if record_type not in ("post", "comment") or not isinstance(data, dict):
+            self._reject(line_number, None, f"Unknown record type: {record_type}")
+            return None
+        old_id = data.pop("_id", None)
+        return record_type, data, str(old_id) if old_id is not None else None
+
+    def _validate_post(self, line_number: int, data: Dict[str, Any], old_id: Optional[str]) -> Optional[dict]:
+        try:
+            post = PostModel(**data)
+        except ValidationError as e:
+            self._reject(line_number, old_id, f"Invalid post: {_validation_message(e)}")
+            return None
+        post.body_preview = post.body_preview or _preview(post.body)
+        document = post.dict(exclude={"id"})
+        document["_id"] = ObjectId()
+        if old_id:
+            _remember(self._new_ids, old_id, document["_id"], self.max_remapped_ids)
+        return document
+
+    def _validate_comment(self, line_number: int, data: Dict[str, Any], old_id: Optional[str]) -> Optional[dict]:
+        try:
+            comment = CommentModel(**data)
+        except ValidationError as e:
+            self._reject(line_number, old_id, f"Invalid comment: {_validation_message(e)}")
+            return None
+        for reference in (comment.post_id, comment.parent_id):
+            if reference in self._skipped:
+                self._reject(line_number, old_id, f"References {reference}, which was not imported")
+                return None
+        if comment.post_id in self._new_ids:
+            comment.post_id = str(self._new_ids[comment.post_id])
+        if comment.parent_id in self._new_ids:
+            comment.parent_id = str(self._new_ids[comment.parent_id])
+        comment.body_preview = comment.body_preview or _preview(comment.body)
+        document = comment.dict(exclude={"id"})
+        document["_id"] = ObjectId()
+        if old_id:
+            _remember(self._new_ids, old_id, document["_id"], self.max_remapped_ids)
+        return document
+
+    def import_batch(self, batch: List[Tuple[int, bytes]]) -> None:
+        """Validate and write one batch of lines: its posts, then its comments. Blocking."""
+        self.stats.batches += 1
+        posts: List[Tuple[int, dict, Optional[str]]] = []
+        comments: List[Tuple[int, dict, Optional[str]]] = []
+        # Comments on posts outside the stream, whose existence is checked at once
+        outside: Dict[str, List[int]] = {}
+        for line_number, line in batch:
+            parsed = self._parse(line_number, line)
+            if parsed is None:
+                continue
+            record_type, data, old_id = parsed
+            if record_type == "post":
+                document = self._validate_post(line_number, data, old_id)
+                if document is not None:
+                    posts.append((line_number, document, old_id))
+            else:
+                post_id = data.get("post_id")
+                document = self._validate_comment(line_number, data, old_id)
+                if document is not None:
+                    if document["post_id"] == post_id:
+                        outside.setdefault(document["post_id"], []).append(len(comments))
+                    comments.append((line_number, document, old_id))
+
+        if outside:
+            existing = crud.get_existing_post_ids(list(outside))
+            dropped = {index for post_id, indexes in outside.items() if post_id not in existing for index in indexes}
+            for index in sorted(dropped):
+                line_number, document, old_id = comments[index]
+                self._reject(line_number, old_id, f"Post {document['post_id']} does not exist")
+            comments = [comment for index, comment in enumerate(comments) if index not in dropped]
+
+        # Posts first, so comments never land before the post they belong to
+        failed = self._write(crud.insert_posts_batch, posts)
+        self.stats.posts += len(posts) - len(failed)
+        if failed:
+            failed_ids = {str(posts[index][1]["_id"]) for index in failed}
+            for line_number, document, old_id in comments:
+                if document["post_id"] in failed_ids:
+                    self._reject(line_number, old_id, f"Post {document['post_id']} failed to import")
+            comments = [comment for comment in comments if comment[1]["post_id"] not in failed_ids]
+        self.stats.comments += len(comments) - len(self._write(crud.insert_comments_batch, comments))
+        logger.debug(f"Import batch {self.stats.batches}: {len(posts)} posts, {len(comments)} comments")
+
+    def _write(self, insert, records: List[Tuple[int, dict, Optional[str]]]) -> Set[int]:
+        """Insert the documents of records; returns the indexes of those that failed."""
+        errors = insert([document for _, document, _ in records])
+        for index, message in errors:
+            line_number, _, old_id = records[index]
+            self.stats.failed += 1
+            if old_id:
+                _remember(self._skipped, old_id, None, self.max_remapped_ids)
+            self._error(line_number, message)
+        return {index for index, _ in errors}
+
+    def finish(self) -> ImportStats:
+        self.stats.elapsed_seconds = time.perf_counter() - self._started
+        logger.info(f"Import finished: {self.stats.as_dict()}")
+        return self.stats
+
+def import_file(path: str, batch_size: int = IMPORT_BATCH_SIZE, compressed: Optional[bool] = None) -> ImportStats:
+    """Import an export file, or stdin for "-"; compressed if the name ends in .gz unless compressed says otherwise."""
+    compressed = path.endswith(".gz") if compressed is None else compressed
+    importer = BulkImporter(batch_size, compressed)
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b""):
+            importer.import_chunk(chunk)
+        importer.import_rest()
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    return importer.finish()
+
+def _datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+def _bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export and import of posts and their comments.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Stream posts and comments to NDJSON")
+    export.add_argument("--out", default="-", help="Output file; .gz is compressed; - for stdout")
+    export.add_argument("--author", default=None, help="Only posts by this author ID")
+    export.add_argument("--created-after", type=_datetime, default=None, help="Only posts created at or after this ISO time")
+    export.add_argument("--created-before", type=_datetime, default=None, help="Only posts created before this ISO time")
+    export.add_argument("--published", type=_bool, default=None, help="Only published (true) or unpublished (false) posts")
+    export.add_argument("--after-id", default=None, help="Resume after this post ID")
+    export.add_argument("--before-id", default=None, help="Stop before this post ID")
+    export.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Posts per cursor batch")
+
+    load = commands.add_parser("import", help="Load posts and comments from an export")
+    load.add_argument("path", help="Export file; .gz is decompressed; - for stdin")
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Lines per validated, bulk-written batch")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if args.command == "import":
+        stats = import_file(args.path, batch_size=args.batch_size)
+        for key, value in stats.as_dict().items():
+            print(f"{key}: {value}", file=sys.stderr)
+        return
+
+    filters = crud.export_post_filters(
+        author_id=args.author,
+        created_after=args.created_after,
+        created_before=args.created_before,
+        is_published=args.published,
+        after_id=args.after_id,
+        before_id=args.before_id
+    )
+    stats = export_to_file(args.out, filters, batch_size=args.batch_size)
+    for key, value in stats.as_dict().items():
+        print(f"{key}: {value}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
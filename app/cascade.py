@@ -0,0 +1,101 @@
+"""
+Background cascade deletion of posts and users.
+
+Deleting a post or user removes its document at once, so reads stop
+returning it, and enqueues a cascade_delete job. The job is the tombstone:
+it removes what depended on the document in batches - a post's comments,
+image references and storage objects; a user's posts (each of which gets its
+own job) and comments - and records progress on the job after every batch.
+Every step re-queries what is left, so a cascade interrupted by a restart
+resumes when the job runner reclaims the job.
+"""
+import os
+from typing import Callable, Dict, List, Tuple
+from dotenv import load_dotenv
+from . import crud, image_store
+from .jobs import job_runner
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+CASCADE_BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", 500))
+CASCADE_CONCURRENCY = int(os.getenv("CASCADE_CONCURRENCY", 2))
+
+CASCADE_JOB = "cascade_delete"
+POST = "post"
+USER = "user"
+
+def delete_post(post_id: str) -> None:
+    """Delete a post now and its comments and images in the background.
+
+    The job is enqueued first, so a crash in between still deletes the post. Blocking.
+    """
+    _enqueue(POST, post_id)
+    crud.delete_post(post_id)
+
+def delete_user(user_id: str) -> None:
+    """Delete a user now and their posts and comments in the background. Blocking."""
+    _enqueue(USER, user_id)
+    crud.delete_user(user_id)
+
+def _enqueue(kind: str, target_id: str) -> str:
+    # Deleting the same document twice while its cascade is pending reuses the job
+    return job_runner.enqueue(CASCADE_JOB, {"kind": kind, "target_id": target_id}, dedupe_key=f"{kind}:{target_id}")
+
+def _delete_post_document(post_id: str, batch_size: int) -> Dict[str, int]:
+    return {"post": crud.delete_post(post_id).deleted_count}
+
+def _delete_post_comments(post_id: str, batch_size: int) -> Dict[str, int]:
+    return {"comments": crud.delete_comments_batch({"post_id": post_id}, batch_size)}
+
+def _delete_user_document(user_id: str, batch_size: int) -> Dict[str, int]:
+    return {"user": crud.delete_user(user_id).deleted_count}
+
+def _delete_user_posts(user_id: str, batch_size: int) -> Dict[str, int]:
+    post_ids = crud.get_post_ids_by_author(user_id, limit=batch_size)
+    for post_id in post_ids:
+        delete_post(post_id)
+    return {"posts": len(post_ids)}
+
+def _delete_user_comments(user_id: str, batch_size: int) -> Dict[str, int]:
+    return {"comments": crud.delete_comments_batch({"author_id": user_id}, batch_size)}
+
+# Ordered steps per kind; each deletes one batch and returns counts keyed by
+# what it deleted, and is repeated until its own count falls below a batch
+STEPS: Dict[str, List[Tuple[str, Callable[[str, int], Dict[str, int]]]]] = {
+    POST: [
+        ("post", _delete_post_document),
+        ("comments", _delete_post_comments),
+        ("images", image_store.delete_post_images_batch),
+    ],
+    USER: [
+        ("user", _delete_user_document),
+        ("posts", _delete_user_posts),
+        ("comments", _delete_user_comments),
+    ],
+}
+
+def run_cascade(job: dict, batch_size: int = CASCADE_BATCH_SIZE) -> Dict[str, int]:
+    """Job handler: run every step of a cascade to completion. Blocking.
+
+    Returns:
+        Dict[str, int]: What this run deleted, by kind of document.
+    """
+    kind, target_id = job["payload"]["kind"], job["payload"]["target_id"]
+    logger.info(f"Cascading deletion of {kind} {target_id} (attempt {job.get('attempts', 1)})")
+    deleted: Dict[str, int] = {}
+    for name, step in STEPS[kind]:
+        while True:
+            counts = step(target_id, batch_size)
+            if any(counts.values()):
+                crud.record_job_progress(job["_id"], counts)
+                for key, count in counts.items():
+                    deleted[key] = deleted.get(key, 0) + count
+            if counts.get(name, 0) < batch_size:
+                break
+    logger.info(f"Cascade of {kind} {target_id} finished: {deleted}")
+    return deleted
+
+job_runner.register(CASCADE_JOB, run_cascade, concurrency=CASCADE_CONCURRENCY)
@@ -0,0 +1,131 @@
+"""
+Online migration of comments embedded in posts.comments to the comments collection.
+
+Comments used to be pushed onto an array in their post, which makes posts
+with many comments slow to load and can run into the 16 MB document limit.
+The migrate_comments job scans posts that still have a comments array in
+_id order, COMMENT_MIGRATION_BATCH_SIZE at a time. For each batch it:
+
+1. converts the embedded comments to CommentModel documents, keeping their
+   _id (or deriving a stable one), with one unordered insert_many;
+2. verifies that every converted comment of a post is in the comments
+   collection, with one query;
+3. removes the arrays of the verified posts with one bulk write, matching
+   only arrays that still have the migrated size.
+
+Posts with comments that fail validation or to insert keep their array and
+are reported. The last post ID is checkpointed after every batch, so an
+interrupted run resumes there, and rerunning is safe because inserts of
+already copied comments are skipped. Meanwhile crud reads both layouts.
+
+Usage:
+    python -m app.comment_migration --batch-size 200
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from . import crud
+from .jobs import job_runner
+from .leader import leader
+from .logger import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+COMMENT_MIGRATION_BATCH_SIZE = int(os.getenv("COMMENT_MIGRATION_BATCH_SIZE", 100))
+COMMENT_MIGRATION_BATCH_DELAY = float(os.getenv("COMMENT_MIGRATION_BATCH_DELAY_SECONDS", 0.05))
+
+MIGRATION_JOB = "migrate_comments"
+
+def convert_post(post: Dict[str, Any]) -> Tuple[List[dict], int]:
+    """Convert the embedded comments of a post; returns the documents and the number that were invalid."""
+    embedded = post.get("comments") or []
+    documents = crud.convert_embedded_comments(str(post["_id"]), embedded)
+    return documents, len(embedded) - len(documents)
+
+def migrate_batch(after_id: Optional[str], batch_size: int = COMMENT_MIGRATION_BATCH_SIZE) -> Tuple[Optional[str], Dict[str, int]]:
+    """Migrate the comments of the next batch of posts after after_id. Blocking.
+
+    Returns:
+        Tuple[Optional[str], Dict[str, int]]: The last post ID scanned (None
+        when no posts are left) and counts of what was migrated.
+    """
+    posts = crud.get_posts_with_embedded_comments(after_id, batch_size)
+    if not posts:
+        return None, {}
+    converted = [convert_post(post) for post in posts]
+    documents = [document for post_documents, _ in converted for document in post_documents]
+    errors = crud.insert_migrated_comments(documents)
+    for index, message in errors:
+        logger.warning(f"Comment {documents[index]['_id']} of post {documents[index]['post_id']} was not copied: {message}")
+
+    present = crud.get_existing_comment_ids([document["_id"] for document in documents])
+    verified: Dict[Any, int] = {}
+    for post, (post_documents, invalid) in zip(posts, converted):
+        ids = [document["_id"] for document in post_documents]
+        # Every embedded comment must be valid, distinct and copied before the array goes
+        if not invalid and len(set(ids)) == len(ids) and all(_id in present for _id in ids):
+            verified[post["_id"]] = len(ids)
+    posts_migrated = crud.unset_embedded_comments(verified)
+    counts = {
+        "posts_scanned": len(posts),
+        "posts_migrated": posts_migrated,
+        "posts_skipped": len(posts) - posts_migrated,
+        "comments_copied": len(documents) - len(errors),
+        "comments_invalid": sum(invalid for _, invalid in converted),
+        "comments_failed": len(errors),
+    }
+    return str(posts[-1]["_id"]), counts
+
+def run_migration(job: Optional[dict], batch_size: int = COMMENT_MIGRATION_BATCH_SIZE,
+                  batch_delay: float = COMMENT_MIGRATION_BATCH_DELAY) -> Dict[str, int]:
+    """Job handler: migrate from the checkpoint to the end of the posts. Blocking."""
+    checkpoint = crud.get_checkpoint(MIGRATION_JOB)
+    after_id = checkpoint["position"] if checkpoint else None
+    totals: Dict[str, int] = {}
+    batches = 0
+    while True:
+        if batches and batch_delay:
+            time.sleep(batch_delay)
+        last_id, counts = migrate_batch(after_id, batch_size)
+        batches += 1
+        finished = last_id is None or counts["posts_scanned"] < batch_size
+        # Back to the start once the end is reached, to retry skipped posts next time
+        crud.save_checkpoint(MIGRATION_JOB, None if finished else last_id, counts)
+        if counts:
+            if job is not None:
+                crud.record_job_progress(job["_id"], counts)
+            for key, count in counts.items():
+                totals[key] = totals.get(key, 0) + count
+        if finished:
+            break
+        after_id = last_id
+    logger.info(f"Comment migration run finished after {batches} batches: {totals}")
+    return totals
+
+def start_migration() -> str:
+    """Enqueue a migration run, unless one is already pending. Blocking."""
+    return job_runner.enqueue(MIGRATION_JOB, {}, dedupe_key=MIGRATION_JOB)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move comments embedded in posts to the comments collection.")
+    parser.add_argument("--batch-size", type=int, default=COMMENT_MIGRATION_BATCH_SIZE, help="Posts per batch")
+    parser.add_argument("--batch-delay", type=float, default=COMMENT_MIGRATION_BATCH_DELAY, help="Seconds to pause between batches")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    crud.setup_legacy_comment_index()
+    totals = run_migration(None, batch_size=args.batch_size, batch_delay=args.batch_delay)
+    for key, value in totals.items():
+        print(f"{key}: {value}", file=sys.stderr)
+
+job_runner.register(MIGRATION_JOB, run_migration)
+# Serves dual reads of single comments and of user comments until every post is migrated
+leader.on_elected(crud.setup_legacy_comment_index)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,85 @@
-from .models import UserModel, PostModel, CommentModel, ImageModel
-from .database import db, users_collection, posts_collection, comments_collection, images_collection
+from .models import UserModel, UserPublic, UserSession, PostModel, CommentModel, ImageModel, ImageVariant, ImageBlobModel
+from .database import db, users_collection, posts_collection, comments_collection, images_collection, image_blobs_collection, versions_collection, jobs_collection, leases_collection, checkpoints_collection
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from .logger import get_logger
-from typing import Dict, Any, Optional
-from datetime import timedelta
+from .response_cache import response_cache, POSTS_TAG, AUTHORS_TAG, post_tag
+from .profile_cache import profile_cache, PUBLIC_PROFILE_FIELDS
+from .negative_cache import missing_posts
+from .pagination import keyset_filter, keyset_sort, cursor_after
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from pydantic import ValidationError
+import hashlib
+import struct
 
 logger = get_logger(__name__)
 
+class UpdateOutcome(str, Enum):
+    """What a conditional update did; see _update_owned."""
+    UPDATED = "updated"
+    UNCHANGED = "unchanged"
+    NOT_FOUND = "not_found"
+    FORBIDDEN = "forbidden"
+
+def _update_owned(collection, document_id: str, changes: Dict[str, Any], owner_id: Optional[str] = None,
+                  projection: Optional[Dict[str, Any]] = None) -> Tuple[Optional[dict], UpdateOutcome]:
+    """Apply changes to a document in one round trip and return its post-image.
+
+    Ownership (author_id == owner_id, unless owner_id is None) and "at least
+    one field differs" are part of the filter, so the write only happens when
+    it is allowed and would change something, and updated_at only moves when
+    it does. Only when nothing matched is the document read again, to tell a
+    missing document from a forbidden or no-op update.
+
+    Returns:
+        Tuple[Optional[dict], UpdateOutcome]: The document as it is now (None
+        if not found or forbidden) and what happened.
+    """
+    if not ObjectId.is_valid(document_id):
+        return None, UpdateOutcome.NOT_FOUND
+    object_id = ObjectId(document_id)
+    if changes:
+        query = {"_id": object_id, "$or": [{field: {"$ne": value}} for field, value in changes.items()]}
+        if owner_id is not None:
+            query["author_id"] = owner_id
+        document = collection.find_one_and_update(
+            query,
+            {"$set": {**changes, "updated_at": datetime.now(timezone.utc)}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if document:
+            return document, UpdateOutcome.UPDATED
+    document = collection.find_one({"_id": object_id}, projection)
+    if document is None:
+        return None, UpdateOutcome.NOT_FOUND
+    if owner_id is not None and document.get("author_id") != owner_id:
+        return None, UpdateOutcome.FORBIDDEN
+    return document, UpdateOutcome.UNCHANGED
+
+class UserProfile(str, Enum):
+    """Named user read profiles; each maps to a projection and a model."""
+    PUBLIC = "public"
+    SESSION = "session"
+    CREDENTIAL = "credential"
+
+# Only login and password changes need the credential profile. No profile
+# loads the stored token list, which verify_token matches in the query.
+USER_PROFILES = {
+    UserProfile.PUBLIC: ({field: 1 for field in PUBLIC_PROFILE_FIELDS}, UserPublic),
+    UserProfile.SESSION: ({field: 1 for field in UserSession.model_fields if field != "id"}, UserSession),
+    UserProfile.CREDENTIAL: ({"tokens": 0}, UserModel),
+}
+
+def user_projection(profile: UserProfile) -> Dict[str, int]:
+    return USER_PROFILES[profile][0]
+
+def user_from_document(user_data: dict, profile: UserProfile):
+    return USER_PROFILES[profile][1](**user_data)
+
 # User CRUD operations
 def create_user(user: UserModel):
     # Convert to dict but exclude_unset to avoid sending null _id
@@ -25,45 +98,178 @@ def create_user(user: UserModel):
         logger.error(f"Error creating user: {str(e)}")
         raise
 
-def get_user_by_email(email: str):
+def get_user_by_email(email: str, profile: UserProfile = UserProfile.SESSION):
     logger.debug(f"Retrieving user by email: {email}")
     try:
-        user_data = users_collection.find_one({"email": email})
+        user_data = users_collection.find_one({"email": email}, user_projection(profile))
         if user_data:
             logger.debug(f"Found user with email: {email}")
-            return UserModel(**user_data)
+            return user_from_document(user_data, profile)
         logger.debug(f"User not found with email: {email}")
         return None
     except Exception as e:
         logger.error(f"Error retrieving user by email: {str(e)}")
         raise
 
-def get_user_by_id(user_id: str):
+def get_user_by_id(user_id: str, profile: UserProfile = UserProfile.SESSION):
     logger.debug(f"Retrieving user by ID: {user_id}")
     try:
-        user_data = users_collection.find_one({"_id": ObjectId(user_id)})
+        user_data = users_collection.find_one({"_id": ObjectId(user_id)}, user_projection(profile))
         if user_data:
             logger.debug(f"Found user with ID: {user_id}")
-            return UserModel(**user_data)
+            return user_from_document(user_data, profile)
         logger.debug(f"User not found with ID: {user_id}")
         return None
     except Exception as e:
         logger.error(f"Error retrieving user by ID: {str(e)}")
         raise
 
-def get_all_users():
+def _valid_object_ids(ids: List[str]) -> List[ObjectId]:
+    # Invalid IDs can't match any document, so they are treated as missing
+    return [ObjectId(i) for i in set(ids) if ObjectId.is_valid(i)]
+
+def get_users_by_ids(user_ids: List[str], profile: UserProfile = UserProfile.SESSION) -> Dict[str, UserSession]:
+    """Retrieve several users with a single query.
+
+    Returns:
+        Dict[str, UserSession]: Users by ID, as the profile's model; missing
+        or invalid IDs are left out.
+    """
+    logger.debug(f"Retrieving {len(user_ids)} users by ID")
+    try:
+        return {
+            str(user_data["_id"]): user_from_document(user_data, profile)
+            for user_data in users_collection.find({"_id": {"$in": _valid_object_ids(user_ids)}}, user_projection(profile))
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving users by ID: {str(e)}")
+        raise
+
+def get_public_profiles(user_ids: List[str]) -> Dict[str, dict]:
+    """Retrieve the public profiles of several users, e.g. the authors of a page of posts.
+
+    Cached profiles are served from the profile cache; the rest are fetched
+    with a single projected query and cached.
+
+    Returns:
+        Dict[str, dict]: UserPublicResponse fields by user ID; missing or invalid IDs are left out.
+    """
+    profiles, missing = profile_cache.get_many(user_ids)
+    if not missing:
+        return profiles
+    logger.debug(f"Retrieving {len(missing)} public profiles ({len(profiles)} cached)")
+    try:
+        fetched = {}
+        projection = {field: 1 for field in PUBLIC_PROFILE_FIELDS}
+        for user_data in users_collection.find({"_id": {"$in": _valid_object_ids(missing)}}, projection):
+            user_id = str(user_data.pop("_id"))
+            fetched[user_id] = {"id": user_id, **user_data}
+    except Exception as e:
+        logger.error(f"Error retrieving public profiles: {str(e)}")
+        raise
+    profile_cache.set_many(fetched)
+    profiles.update(fetched)
+    return profiles
+
+def _invalidate_profile(user_id: str):
+    # Lists that embed authors are versioned and cached as a whole, so any profile change invalidates them
+    profile_cache.invalidate(user_id)
+    bump_version(AUTHORS_VERSION_KEY)
+    response_cache.invalidate(AUTHORS_TAG)
+
+def get_all_users(profile: UserProfile = UserProfile.SESSION):
     """Retrieve all users from the database."""
     logger.info("app/crud.py get_all_users()")
     try:
-        users = []
-        for user_data in users_collection.find():
-            logger.debug(f"Found user: {user_data}")
-            users.append(UserModel(**user_data))
+        users = [user_from_document(user_data, profile) for user_data in users_collection.find({}, user_projection(profile))]
+        logger.debug(f"Found {len(users)} users")
         return users
     except Exception as e:
         logger.error(f"Error retrieving all users: {str(e)}")
         raise
 
+# Fields admin listings can sort on; each is indexed by setup_user_indexes
+USER_SORT_FIELDS = ("created_at", "email", "_id")
+
+def user_filters(is_active: Optional[bool] = None, is_admin: Optional[bool] = None,
+                 created_after: Optional[datetime] = None, created_before: Optional[datetime] = None) -> Dict[str, Any]:
+    """Build a users query from optional admin listing filters."""
+    filters: Dict[str, Any] = {}
+    if is_active is not None:
+        filters["is_active"] = is_active
+    if is_admin is not None:
+        filters["is_admin"] = is_admin
+    if created_after is not None or created_before is not None:
+        filters["created_at"] = {}
+        if created_after is not None:
+            filters["created_at"]["$gte"] = created_after
+        if created_before is not None:
+            filters["created_at"]["$lt"] = created_before
+    return filters
+
+def get_users_page(filters: Dict[str, Any], sort_by: str = "created_at", direction: int = -1,
+                   after: Optional[Tuple[Any, ObjectId]] = None, limit: int = 100,
+                   profile: UserProfile = UserProfile.SESSION) -> Tuple[List[UserSession], Optional[str]]:
+    """Retrieve one page of users in (sort_by, _id) order, after a cursor position.
+
+    Args:
+        filters (Dict[str, Any]): Query from user_filters.
+        sort_by (str): One of USER_SORT_FIELDS.
+        direction (int): 1 for ascending, -1 for descending.
+        after (Optional[Tuple[Any, ObjectId]]): Decoded cursor of the previous page.
+        limit (int): Page size.
+        profile (UserProfile): Which read profile to load.
+
+    Returns:
+        Tuple[List[UserSession], Optional[str]]: The users and the cursor of
+        the next page, or None if this is the last page.
+    """
+    logger.debug(f"Retrieving users page: filters={filters}, sort_by={sort_by}, direction={direction}, limit={limit}")
+    try:
+        # One extra document tells whether another page follows
+        documents = list(
+            users_collection.find({**filters, **keyset_filter(sort_by, direction, after)}, user_projection(profile))
+            .sort(keyset_sort(sort_by, direction))
+            .limit(limit + 1)
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving users page: {str(e)}")
+        raise
+    next_cursor = cursor_after(documents[limit - 1], sort_by) if len(documents) > limit else None
+    return [user_from_document(user_data, profile) for user_data in documents[:limit]], next_cursor
+
+def iter_users(filters: Dict[str, Any], sort_by: str = "created_at", direction: int = -1,
+               after: Optional[Tuple[Any, ObjectId]] = None, batch_size: int = 1000,
+               profile: UserProfile = UserProfile.SESSION) -> Iterator[UserSession]:
+    """Yield every matching user from one batched cursor, holding one batch in memory at a time. Blocking."""
+    logger.debug(f"Streaming users: filters={filters}, sort_by={sort_by}, direction={direction}")
+    cursor = (
+        users_collection.find({**filters, **keyset_filter(sort_by, direction, after)}, user_projection(profile))
+        .sort(keyset_sort(sort_by, direction))
+        .batch_size(batch_size)
+    )
+    try:
+        for user_data in cursor:
+            yield user_from_document(user_data, profile)
+    except Exception as e:
+        logger.error(f"Error streaming users: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+def setup_user_indexes():
+    """Indexes for login lookups and for filtered, sorted admin listings."""
+    logger.info("Setting up indexes for users collection")
+    try:
+        # Also serves lookups by email
+        users_collection.create_index([("email", 1), ("_id", 1)])
+        users_collection.create_index([("created_at", 1), ("_id", 1)])
+        users_collection.create_index([("is_active", 1), ("created_at", 1), ("_id", 1)])
+        users_collection.create_index([("is_admin", 1), ("created_at", 1), ("_id", 1)])
+    except Exception as e:
+        logger.error(f"Error setting up indexes for users collection: {str(e)}")
+        raise
+
 def update_user(user_id: str, updates: dict):
     logger.info(f"Updating user with ID: {user_id}")
     logger.debug(f"Update data: {updates}")
@@ -71,6 +277,8 @@ def update_user(user_id: str, updates: dict):
         result = users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": updates})
         if result.modified_count > 0:
             logger.info(f"Successfully updated user: {user_id}")
+            if any(field in updates for field in PUBLIC_PROFILE_FIELDS):
+                _invalidate_profile(user_id)
         else:
             logger.warning(f"No changes made to user: {user_id}")
         return result
@@ -78,12 +286,38 @@ def update_user(user_id: str, updates: dict):
         logger.error(f"Error updating user {user_id}: {str(e)}")
         raise
 
+def update_user_fields(user_id: str, changes: Dict[str, Any]) -> Optional[UserSession]:
+    """Update a user's fields and return the updated user in one round trip.
+
+    Fields that already have the given values are not rewritten; if none
+    differ, the user is returned unchanged.
+
+    Returns:
+        UserSession: The user after the update, or None if not found.
+    """
+    logger.info(f"Updating fields of user: {user_id}")
+    logger.debug(f"Changed fields: {list(changes)}")
+    try:
+        user_data, outcome = _update_owned(users_collection, user_id, changes,
+                                           projection=user_projection(UserProfile.SESSION))
+        if outcome == UpdateOutcome.UPDATED:
+            logger.info(f"Successfully updated user: {user_id}")
+            if any(field in changes for field in PUBLIC_PROFILE_FIELDS):
+                _invalidate_profile(user_id)
+        elif outcome == UpdateOutcome.UNCHANGED:
+            logger.info(f"No changes to apply to user: {user_id}")
+        return UserSession(**user_data) if user_data else None
+    except Exception as e:
+        logger.error(f"Error updating user {user_id}: {str(e)}")
+        raise
+
 def delete_user(user_id: str):
     logger.warning(f"Deleting user with ID: {user_id}")
     try:
         result = users_collection.delete_one({"_id": ObjectId(user_id)})
         if result.deleted_count > 0:
             logger.info(f"Successfully deleted user: {user_id}")
+            _invalidate_profile(user_id)
         else:
             logger.warning(f"User not found for deletion: {user_id}")
         return result
@@ -91,6 +325,37 @@ def delete_user(user_id: str):
         logger.error(f"Error deleting user {user_id}: {str(e)}")
         raise
 
+def get_user_tokens_batch(after_id: Optional[str], limit: int) -> List[dict]:
+    """The next users in _id order after after_id that hold any tokens, with only their tokens loaded."""
+    filters: Dict[str, Any] = {"tokens.0": {"$exists": True}}
+    if after_id is not None:
+        filters["_id"] = {"$gt": ObjectId(after_id)}
+    try:
+        return list(users_collection.find(filters, {"tokens": 1}).sort("_id", 1).limit(limit))
+    except Exception as e:
+        logger.error(f"Error retrieving user tokens after {after_id}: {str(e)}")
+        raise
+
+def pull_user_tokens(tokens_by_user: Dict[str, List[str]]) -> int:
+    """Remove tokens from many users with one unordered bulk write of a $pullAll per user.
+
+    Returns:
+        int: The number of users modified.
+    """
+    operations = [
+        UpdateOne({"_id": ObjectId(user_id)}, {"$pullAll": {"tokens": tokens}})
+        for user_id, tokens in tokens_by_user.items() if tokens
+    ]
+    if not operations:
+        return 0
+    try:
+        result = users_collection.bulk_write(operations, ordered=False)
+        logger.debug(f"Pulled tokens from {result.modified_count} of {len(operations)} users")
+        return result.modified_count
+    except Exception as e:
+        logger.error(f"Error pulling tokens from {len(operations)} users: {str(e)}")
+        raise
+
 # Post CRUD operations
 def create_post(post: PostModel):
     post_dict = post.dict(by_alias=True, exclude_unset=True)
@@ -101,6 +366,9 @@ def create_post(post: PostModel):
     try:
         insert_result = posts_collection.insert_one(post_dict)
         post.id = str(insert_result.inserted_id)
+        missing_posts.discard(post.id)
+        bump_version(POSTS_VERSION_KEY)
+        response_cache.invalidate(POSTS_TAG)
         logger.info(f"Post created with ID: {post.id}")
         logger.debug(f"////Post: {post}")
         logger.debug(f"////insert_result: {insert_result}")
@@ -112,16 +380,79 @@ def create_post(post: PostModel):
 def get_post_by_id(post_id: str):
     logger.debug(f"Retrieving post by ID: {post_id}")
     try:
-        post_data = posts_collection.find_one({"_id": ObjectId(post_id)})
+        object_id = ObjectId(post_id)
+        if str(object_id) in missing_posts:
+            logger.debug(f"Post recently not found, skipping lookup: {post_id}")
+            return None
+        post_data = posts_collection.find_one({"_id": object_id})
         if post_data:
             logger.debug(f"Found post with ID: {post_id}")
             return PostModel(**post_data)
         logger.debug(f"Post not found with ID: {post_id}")
+        missing_posts.add(str(object_id))
         return None
     except Exception as e:
         logger.error(f"Error retrieving post by ID: {str(e)}")
         raise
 
+def _find_post_fields(post_id: str, projection: Dict[str, int]) -> Optional[dict]:
+    # Invalid and recently missed IDs are answered without a query
+    if not ObjectId.is_valid(post_id):
+        return None
+    key = str(ObjectId(post_id))
+    if key in missing_posts:
+        return None
+    post_data = posts_collection.find_one({"_id": ObjectId(post_id)}, projection)
+    if post_data is None:
+        missing_posts.add(key)
+    return post_data
+
+def post_exists(post_id: str) -> bool:
+    """Check whether a post exists without reading it.
+
+    The query projects only _id, so it is answered from the _id index.
+    Invalid IDs and IDs that recently matched nothing don't query at all.
+
+    Returns:
+        bool: True if the post exists.
+    """
+    logger.debug(f"Checking if post exists: {post_id}")
+    try:
+        return _find_post_fields(post_id, {"_id": 1}) is not None
+    except Exception as e:
+        logger.error(f"Error checking if post {post_id} exists: {str(e)}")
+        raise
+
+def get_post_author_id(post_id: str) -> Optional[str]:
+    """Return a post's author ID, reading only that field, for ownership checks.
+
+    Returns:
+        str: The author ID, or None if the post doesn't exist.
+    """
+    logger.debug(f"Retrieving author of post: {post_id}")
+    try:
+        post_data = _find_post_fields(post_id, {"author_id": 1})
+        return post_data["author_id"] if post_data else None
+    except Exception as e:
+        logger.error(f"Error retrieving author of post {post_id}: {str(e)}")
+        raise
+
+def get_posts_by_ids(post_ids: List[str]) -> Dict[str, PostModel]:
+    """Retrieve several posts with a single query.
+
+    Returns:
+        Dict[str, PostModel]: Posts by ID; missing or invalid IDs are left out.
+    """
+    logger.debug(f"Retrieving {len(post_ids)} posts by ID")
+    try:
+        return {
+            str(post_data["_id"]): PostModel(**post_data)
+            for post_data in posts_collection.find({"_id": {"$in": _valid_object_ids(post_ids)}})
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving posts by ID: {str(e)}")
+        raise
+
 def get_all_posts(limit: int = 100, skip: int = 0):
     logger.info(f"Retrieving all posts with limit: {limit}, skip: {skip}")
     posts = []
@@ -152,6 +483,8 @@ def update_post(post_id: str, updates: Dict[str, Any]):
     try:
         result = posts_collection.update_one({"_id": ObjectId(post_id)}, {"$set": updates})
         if result.modified_count > 0:
+            bump_version(POSTS_VERSION_KEY)
+            response_cache.invalidate(POSTS_TAG, post_tag(post_id))
             logger.info(f"Successfully updated post: {post_id}")
         else:
             logger.warning(f"No changes made to post: {post_id}")
@@ -160,11 +493,41 @@ def update_post(post_id: str, updates: Dict[str, Any]):
         logger.error(f"Error updating post {post_id}: {str(e)}")
         raise
 
+def update_post_owned(post_id: str, changes: Dict[str, Any], owner_id: Optional[str] = None) -> Tuple[Optional[PostModel], UpdateOutcome]:
+    """Update a post if owner_id is its author (or owner_id is None) and return the updated post.
+
+    Args:
+        post_id (str): The post to update.
+        changes (Dict[str, Any]): The fields to set; updated_at is set when any of them differ.
+        owner_id (Optional[str]): The user who must be the author; None for admins.
+
+    Returns:
+        Tuple[Optional[PostModel], UpdateOutcome]: The post as it is now (None
+        if not found or forbidden) and what happened.
+    """
+    logger.info(f"Updating post with ID: {post_id}")
+    logger.debug(f"Changed fields: {changes}")
+    try:
+        post_data, outcome = _update_owned(posts_collection, post_id, changes, owner_id)
+        if outcome == UpdateOutcome.UPDATED:
+            bump_version(POSTS_VERSION_KEY)
+            response_cache.invalidate(POSTS_TAG, post_tag(post_id))
+            logger.info(f"Successfully updated post: {post_id}")
+        else:
+            logger.info(f"Post {post_id} not updated: {outcome.value}")
+        return (PostModel(**post_data) if post_data else None), outcome
+    except Exception as e:
+        logger.error(f"Error updating post {post_id}: {str(e)}")
+        raise
+
 def delete_post(post_id: str):
     logger.warning(f"Deleting post with ID: {post_id}")
     try:
         result = posts_collection.delete_one({"_id": ObjectId(post_id)})
         if result.deleted_count > 0:
+            missing_posts.add(str(ObjectId(post_id)))
+            bump_version(POSTS_VERSION_KEY, comments_version_key(post_id))
+            response_cache.invalidate(POSTS_TAG, post_tag(post_id))
             logger.info(f"Successfully deleted post: {post_id}")
         else:
             logger.warning(f"Post not found for deletion: {post_id}")
@@ -238,47 +601,33 @@ def get_posts_by_author_and_category(author_id: str, category_id: int, limit: in
         raise
 
 # Comment CRUD operations
+# Comments used to be embedded in posts.comments. They now live in
+# comments_collection, and the embedded arrays are moved there by the
+# migrate_comments job (see comment_migration.py). Until it finishes, reads
+# merge in comments still embedded in their post, and these legacy functions
+# write to comments_collection.
 def create_comment(post_id: str, comment: Dict[str, Any]):
+    """Create a comment on a post; a dict form of create_comment_v2."""
     logger.info(f"Creating comment for post ID: {post_id}")
-    try:
-        comment["post_id"] = post_id
-        # This is inserting the comment into the post's comments array!
-        # Is this the behavior we want? Sounds good, but need to make sure the rest of the app expects this (including schema and model).
-        # The comment should have a unique ID, so we can use ObjectId() to generate one.
-        insert_result = posts_collection.update_one({"_id": ObjectId(post_id)}, {"$push": {"comments": comment}})
-        if insert_result.modified_count > 0:
-            logger.info(f"Comment added to post: {post_id}")
-        else:
-            logger.warning(f"No changes made to post: {post_id}")
-        # Is this what should be returned?
-        # UpdateResult({'n': 1, 'nModified': 1, 'ok': 1.0, 'updatedExisting': True}, acknowledged=True)
-        logger.debug(f"+++++insert_result: {insert_result}")
-        return insert_result
-    except Exception as e:
-        logger.error(f"Error creating comment for post {post_id}: {str(e)}")
-        raise
+    # Set explicitly: create_comment_v2 leaves out fields that were never set
+    comment = {"created_at": datetime.now(timezone.utc), **comment, "post_id": post_id}
+    return create_comment_v2(CommentModel(**comment))
 
 def get_comments_for_post(post_id: str):
-    logger.info(f"Retrieving comments for post ID: {post_id}")
-    try:
-        post_data = posts_collection.find_one({"_id": ObjectId(post_id)})
-        if post_data and "comments" in post_data:
-            logger.info(f"Found {len(post_data['comments'])} comments for post: {post_id}")
-            return post_data["comments"]
-        logger.debug(f"No comments found for post: {post_id}")
-        return []
-    except Exception as e:
-        logger.error(f"Error retrieving comments for post {post_id}: {str(e)}")
-        raise
+    return get_comments_for_post_v2(post_id)
 
 def update_comment(post_id: str, comment_id: str, updates: Dict[str, Any]):
     logger.info(f"Updating comment ID: {comment_id} for post ID: {post_id}")
     try:
-        result = posts_collection.update_one(
-            {"_id": ObjectId(post_id), "comments._id": ObjectId(comment_id)},
-            {"$set": {"comments.$": updates}}
-        )
+        result = comments_collection.update_one({"_id": ObjectId(comment_id), "post_id": post_id}, {"$set": updates})
+        if not result.matched_count:
+            # Not migrated yet
+            result = posts_collection.update_one(
+                {"_id": ObjectId(post_id), "comments._id": ObjectId(comment_id)},
+                {"$set": {f"comments.$.{field}": value for field, value in updates.items()}}
+            )
         if result.modified_count > 0:
+            bump_version(comments_version_key(post_id))
             logger.info(f"Successfully updated comment: {comment_id} for post: {post_id}")
         else:
             logger.warning(f"No changes made to comment: {comment_id} for post: {post_id}")
@@ -290,11 +639,14 @@ def update_comment(post_id: str, comment_id: str, updates: Dict[str, Any]):
 def delete_comment(post_id: str, comment_id: str):
     logger.warning(f"Deleting comment ID: {comment_id} for post ID: {post_id}")
     try:
-        result = posts_collection.update_one(
-            {"_id": ObjectId(post_id)},
+        result = comments_collection.delete_one({"_id": ObjectId(comment_id), "post_id": post_id})
+        # A copy may still be embedded if the migration hasn't unset the post's array yet
+        pulled = posts_collection.update_one(
+            {"_id": ObjectId(post_id), "comments._id": ObjectId(comment_id)},
             {"$pull": {"comments": {"_id": ObjectId(comment_id)}}}
         )
-        if result.modified_count > 0:
+        if result.deleted_count or pulled.modified_count:
+            bump_version(comments_version_key(post_id))
             logger.info(f"Successfully deleted comment: {comment_id} for post: {post_id}")
         else:
             logger.warning(f"Comment not found for deletion: {comment_id} for post: {post_id}")
@@ -304,18 +656,84 @@ def delete_comment(post_id: str, comment_id: str):
         raise
 
 def get_comments_by_user_id(user_id: str, limit: int = 100, skip: int = 0):
-    logger.info(f"Retrieving comments by user ID: {user_id}")
-    comments = []
-    try:
-        for post_data in posts_collection.find({"comments.user_id": user_id}).skip(skip).limit(limit).sort("created_at", -1):
-            for comment in post_data.get("comments", []):
-                if comment.get("user_id") == user_id:
-                    comments.append(comment)
-        logger.info(f"Retrieved {len(comments)} comments for user: {user_id}")
-        return comments
-    except Exception as e:
-        logger.error(f"Error retrieving comments by user: {str(e)}")
-        raise
+    return get_comments_by_user_v2(user_id, limit=limit, skip=skip)
+
+def _legacy_comment_id(post_id: str, index: int, created_at: datetime) -> ObjectId:
+    # Stamped with the comment's creation time so _id order stays chronological,
+    # and derived from its post and position so every conversion gives the same _id
+    created_at = created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+    digest = hashlib.sha1(f"{post_id}:{index}".encode()).digest()
+    return ObjectId(struct.pack(">I", max(0, int(created_at.timestamp()))) + digest[:8])
+
+def legacy_comment_document(post_id: str, embedded: Dict[str, Any], index: int) -> dict:
+    """Convert a comment embedded in posts.comments to a comments_collection document.
+
+    Embedded comments were free-form: they may use user_id and content rather
+    than author_id and body, and may lack an _id or created_at. Embedded
+    _ids are kept; missing ones are derived from the post and the comment's
+    position, so converting the same comment twice gives the same document.
+
+    Raises:
+        pydantic.ValidationError: If the comment can't be a valid CommentModel.
+    """
+    data = {key: value for key, value in embedded.items() if key != "_id"}
+    data["post_id"] = post_id
+    data.setdefault("author_id", embedded.get("user_id"))
+    data.setdefault("body", embedded.get("content"))
+    data.setdefault("created_at", ObjectId(post_id).generation_time)
+    if isinstance(data.get("parent_id"), ObjectId):
+        data["parent_id"] = str(data["parent_id"])
+    comment = CommentModel(**data)
+    document = comment.dict(exclude={"id"})
+    embedded_id = embedded.get("_id")
+    if isinstance(embedded_id, ObjectId) or (isinstance(embedded_id, str) and ObjectId.is_valid(embedded_id)):
+        document["_id"] = ObjectId(embedded_id)
+    else:
+        document["_id"] = _legacy_comment_id(post_id, index, comment.created_at)
+    return document
+
+def convert_embedded_comments(post_id: str, embedded_comments: List[Dict[str, Any]]) -> List[dict]:
+    """Convert the embedded comments of a post with legacy_comment_document, skipping invalid ones."""
+    documents = []
+    for index, embedded in enumerate(embedded_comments):
+        try:
+            documents.append(legacy_comment_document(post_id, embedded, index))
+        except ValidationError as e:
+            logger.warning(f"Skipping invalid embedded comment {index} of post {post_id}: {str(e)}")
+    return documents
+
+def _embedded_comments(post_id: str) -> List[dict]:
+    """Comments of a post that are still embedded in it, converted; one _id lookup."""
+    if not ObjectId.is_valid(post_id):
+        return []
+    post = posts_collection.find_one({"_id": ObjectId(post_id), "comments.0": {"$exists": True}}, {"comments": 1})
+    return convert_embedded_comments(post_id, post["comments"]) if post else []
+
+def _find_embedded_comment(comment_id: str) -> Optional[dict]:
+    """A comment that is still embedded in its post, found through the sparse comments._id index."""
+    post = posts_collection.find_one({"comments._id": ObjectId(comment_id)}, {"comments": 1})
+    if not post:
+        return None
+    for document in convert_embedded_comments(str(post["_id"]), post["comments"]):
+        if document["_id"] == ObjectId(comment_id):
+            return document
+    return None
+
+def _embedded_comments_by_author(user_id: str) -> List[dict]:
+    """Comments by a user that are still embedded in posts, converted; found through the sparse author indexes."""
+    documents = []
+    posts = posts_collection.find(
+        {"$or": [{"comments.author_id": user_id}, {"comments.user_id": user_id}]}, {"comments": 1}
+    )
+    for post in posts:
+        documents += [document for document in convert_embedded_comments(str(post["_id"]), post["comments"])
+                      if document["author_id"] == user_id]
+    return documents
+
+def _created_at_key(document: dict) -> datetime:
+    # Rows written without created_at sort by when their _id was generated
+    created_at = document.get("created_at") or ObjectId(document["_id"]).generation_time
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
 
 # New Comment CRUD operations with separate collection
 def create_comment_v2(comment: CommentModel):
@@ -328,6 +746,7 @@ def create_comment_v2(comment: CommentModel):
     try:
         insert_result = comments_collection.insert_one(comment_dict)
         comment.id = str(insert_result.inserted_id)
+        bump_version(comments_version_key(comment.post_id))
         logger.info(f"Comment created with ID: {comment.id}")
         return comment
     except Exception as e:
@@ -339,6 +758,8 @@ def get_comment_by_id(comment_id: str):
     logger.debug(f"Retrieving comment by ID: {comment_id}")
     try:
         comment_data = comments_collection.find_one({"_id": ObjectId(comment_id)})
+        if not comment_data:
+            comment_data = _find_embedded_comment(comment_id)
         if comment_data:
             logger.debug(f"Found comment with ID: {comment_id}")
             return CommentModel(**comment_data)
@@ -348,6 +769,22 @@ def get_comment_by_id(comment_id: str):
         logger.error(f"Error retrieving comment by ID: {str(e)}")
         raise
 
+def get_comments_by_ids(comment_ids: List[str]) -> Dict[str, CommentModel]:
+    """Retrieve several comments with a single query.
+
+    Returns:
+        Dict[str, CommentModel]: Comments by ID; missing or invalid IDs are left out.
+    """
+    logger.debug(f"Retrieving {len(comment_ids)} comments by ID")
+    try:
+        return {
+            str(comment_data["_id"]): CommentModel(**comment_data)
+            for comment_data in comments_collection.find({"_id": {"$in": _valid_object_ids(comment_ids)}})
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving comments by ID: {str(e)}")
+        raise
+
 def update_comment_v2(comment_id: str, updates: Dict[str, Any]):
     """Update a comment with the specified fields."""
     logger.info(f"Updating comment with ID: {comment_id}")
@@ -355,6 +792,7 @@ def update_comment_v2(comment_id: str, updates: Dict[str, Any]):
     try:
         result = comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$set": updates})
         if result.modified_count > 0:
+            _bump_comment_list_version(comment_id)
             logger.info(f"Successfully updated comment: {comment_id}")
         else:
             logger.warning(f"No changes made to comment: {comment_id}")
@@ -363,12 +801,43 @@ def update_comment_v2(comment_id: str, updates: Dict[str, Any]):
         logger.error(f"Error updating comment {comment_id}: {str(e)}")
         raise
 
+def update_comment_owned(comment_id: str, changes: Dict[str, Any], owner_id: Optional[str] = None) -> Tuple[Optional[CommentModel], UpdateOutcome]:
+    """Update a comment if owner_id is its author (or owner_id is None) and return the updated comment.
+
+    Args:
+        comment_id (str): The comment to update.
+        changes (Dict[str, Any]): The fields to set; updated_at is set when any of them differ.
+        owner_id (Optional[str]): The user who must be the author; None for admins.
+
+    Returns:
+        Tuple[Optional[CommentModel], UpdateOutcome]: The comment as it is now
+        (None if not found or forbidden) and what happened.
+    """
+    logger.info(f"Updating comment with ID: {comment_id}")
+    logger.debug(f"Changed fields: {changes}")
+    try:
+        comment_data, outcome = _update_owned(comments_collection, comment_id, changes, owner_id)
+        if outcome == UpdateOutcome.UPDATED:
+            # The post-image carries post_id, so the list version needs no extra read
+            bump_version(comments_version_key(comment_data["post_id"]))
+            logger.info(f"Successfully updated comment: {comment_id}")
+        else:
+            logger.info(f"Comment {comment_id} not updated: {outcome.value}")
+        return (CommentModel(**comment_data) if comment_data else None), outcome
+    except Exception as e:
+        logger.error(f"Error updating comment {comment_id}: {str(e)}")
+        raise
+
 def delete_comment_v2(comment_id: str):
     """Delete a comment by its ID."""
     logger.warning(f"Deleting comment with ID: {comment_id}")
     try:
+        # Look up the post first; the comment is gone once deleted
+        existing = comments_collection.find_one({"_id": ObjectId(comment_id)}, {"post_id": 1})
         result = comments_collection.delete_one({"_id": ObjectId(comment_id)})
         if result.deleted_count > 0:
+            if existing:
+                bump_version(comments_version_key(existing["post_id"]))
             logger.info(f"Successfully deleted comment: {comment_id}")
         else:
             logger.warning(f"Comment not found for deletion: {comment_id}")
@@ -382,7 +851,19 @@ def get_comments_for_post_v2(post_id: str, limit: int = 100, skip: int = 0):
     logger.info(f"Retrieving comments for post ID: {post_id} with limit: {limit}, skip: {skip}")
     comments = []
     try:
-        for comment_data in comments_collection.find({"post_id": post_id}).skip(skip).limit(limit).sort("created_at", -1):
+        embedded = _embedded_comments(post_id)
+        cursor = comments_collection.find({"post_id": post_id}).sort("created_at", -1)
+        if not embedded:
+            documents = cursor.skip(skip).limit(limit)
+        else:
+            # Not migrated yet: page through both layouts together. Comments
+            # copied but not yet unset from the post have the same _id in both.
+            documents = list(cursor.limit(skip + limit))
+            copied = {document["_id"] for document in documents}
+            documents += [document for document in embedded if document["_id"] not in copied]
+            documents.sort(key=_created_at_key, reverse=True)
+            documents = documents[skip:skip + limit]
+        for comment_data in documents:
             comments.append(CommentModel(**comment_data))
         logger.info(f"Retrieved {len(comments)} comments for post: {post_id}")
         return comments
@@ -395,7 +876,18 @@ def get_comments_by_user_v2(user_id: str, limit: int = 100, skip: int = 0):
     logger.info(f"Retrieving comments by user ID: {user_id} with limit: {limit}, skip: {skip}")
     comments = []
     try:
-        for comment_data in comments_collection.find({"author_id": user_id}).skip(skip).limit(limit).sort("created_at", -1):
+        embedded = _embedded_comments_by_author(user_id)
+        cursor = comments_collection.find({"author_id": user_id}).sort("created_at", -1)
+        if not embedded:
+            documents = cursor.skip(skip).limit(limit)
+        else:
+            # Same merge as get_comments_for_post_v2, across the posts not migrated yet
+            documents = list(cursor.limit(skip + limit))
+            copied = {document["_id"] for document in documents}
+            documents += [document for document in embedded if document["_id"] not in copied]
+            documents.sort(key=_created_at_key, reverse=True)
+            documents = documents[skip:skip + limit]
+        for comment_data in documents:
             comments.append(CommentModel(**comment_data))
         logger.info(f"Retrieved {len(comments)} comments for user: {user_id}")
         return comments
@@ -416,6 +908,80 @@ def get_comment_replies(comment_id: str, limit: int = 100, skip: int = 0):
         logger.error(f"Error retrieving replies for comment {comment_id}: {str(e)}")
         raise
 
+# Version counters and cheap validator reads for conditional GETs
+POSTS_VERSION_KEY = "posts"
+AUTHORS_VERSION_KEY = "authors"
+
+def comments_version_key(post_id: str) -> str:
+    return f"comments:{post_id}"
+
+def bump_version(*keys: str):
+    """Increment the version counters of the given lists, creating them as needed."""
+    logger.debug(f"Bumping versions: {keys}")
+    try:
+        if len(keys) == 1:
+            versions_collection.update_one({"_id": keys[0]}, {"$inc": {"version": 1}}, upsert=True)
+        elif keys:
+            # One round trip however many lists changed, e.g. after a bulk import
+            versions_collection.bulk_write(
+                [UpdateOne({"_id": key}, {"$inc": {"version": 1}}, upsert=True) for key in keys], ordered=False
+            )
+    except Exception as e:
+        logger.error(f"Error bumping versions {keys}: {str(e)}")
+        raise
+
+def get_version(key: str) -> int:
+    """Current version counter of a list; 0 if it has never changed."""
+    try:
+        version = versions_collection.find_one({"_id": key}, {"version": 1})
+        return version["version"] if version else 0
+    except Exception as e:
+        logger.error(f"Error retrieving version {key}: {str(e)}")
+        raise
+
+def _bump_comment_list_version(comment_id: str):
+    comment = comments_collection.find_one({"_id": ObjectId(comment_id)}, {"post_id": 1})
+    if comment:
+        bump_version(comments_version_key(comment["post_id"]))
+
+def _get_modified_at(collection, document_id: str):
+    document = collection.find_one({"_id": ObjectId(document_id)}, {"updated_at": 1, "created_at": 1})
+    if document is None:
+        return None
+    return document.get("updated_at") or document.get("created_at")
+
+def get_post_modified_at(post_id: str):
+    """Return when a post last changed, reading only its timestamps.
+
+    Returns:
+        datetime: updated_at (or created_at), or None if the post doesn't exist.
+    """
+    logger.debug(f"Retrieving modification time of post: {post_id}")
+    try:
+        return _get_modified_at(posts_collection, post_id)
+    except Exception as e:
+        logger.error(f"Error retrieving modification time of post {post_id}: {str(e)}")
+        raise
+
+def get_comment_validators(comment_id: str) -> Tuple[Optional[str], Optional[datetime]]:
+    """Return a comment's post ID and when it last changed, reading only those fields.
+
+    Returns:
+        Tuple[Optional[str], Optional[datetime]]: The post ID and updated_at
+        (or created_at), or (None, None) if the comment doesn't exist.
+    """
+    logger.debug(f"Retrieving validators of comment: {comment_id}")
+    try:
+        document = comments_collection.find_one(
+            {"_id": ObjectId(comment_id)}, {"post_id": 1, "updated_at": 1, "created_at": 1}
+        )
+        if document is None:
+            return None, None
+        return document["post_id"], document.get("updated_at") or document.get("created_at")
+    except Exception as e:
+        logger.error(f"Error retrieving validators of comment {comment_id}: {str(e)}")
+        raise
+
 def setup_comment_indexes():
     """Set up MongoDB indexes for the comments collection for optimal performance."""
     logger.info("Setting up indexes for comments collection")
@@ -427,6 +993,8 @@ def setup_comment_indexes():
         comments_collection.create_index("created_at")
         # Compound index for sorting comments by creation time within a post
         comments_collection.create_index([("post_id", 1), ("created_at", -1)])
+        # Streams a post's comments in _id order for bulk export
+        comments_collection.create_index([("post_id", 1), ("_id", 1)])
         logger.info("Successfully created indexes for comments collection")
     except Exception as e:
         logger.error(f"Error setting up indexes for comments collection: {str(e)}")
@@ -538,6 +1106,272 @@ def delete_image(image_id: str):
         logger.error(f"Error deleting image reference {image_id}: {str(e)}")
         raise
 
+def finalize_image_reference(image_id: str, updates: Dict[str, Any]):
+    """Finalize a pending image reference once its upload has been verified.
+    
+    Only images still in the "pending" state are updated, so completing the
+    same upload twice is harmless.
+    
+    Args:
+        image_id (str): The ID of the pending image reference.
+        updates (Dict[str, Any]): The fields to set, including the new status.
+        
+    Returns:
+        UpdateResult: The result of the update operation.
+        
+    Raises:
+        Exception: If there is an error updating the image reference.
+    """
+    logger.info(f"Finalizing image reference with ID: {image_id}")
+    logger.debug(f"Update data: {updates}")
+    try:
+        result = images_collection.update_one(
+            {"_id": ObjectId(image_id), "status": "pending"},
+            {"$set": updates}
+        )
+        if result.modified_count > 0:
+            logger.info(f"Successfully finalized image reference: {image_id}")
+        else:
+            logger.warning(f"No pending image reference to finalize: {image_id}")
+        return result
+    except Exception as e:
+        logger.error(f"Error finalizing image reference {image_id}: {str(e)}")
+        raise
+
+def set_image_variants(image_id: str, variants: List[ImageVariant]):
+    """Record the generated variants of an image.
+    
+    Args:
+        image_id (str): The ID of the image reference.
+        variants (List[ImageVariant]): The variants that were stored.
+        
+    Returns:
+        UpdateResult: The result of the update operation.
+        
+    Raises:
+        Exception: If there is an error updating the image reference.
+    """
+    logger.info(f"Storing {len(variants)} variants for image: {image_id}")
+    try:
+        result = images_collection.update_one(
+            {"_id": ObjectId(image_id)},
+            {"$set": {"variants": [variant.dict() for variant in variants]}}
+        )
+        if result.matched_count == 0:
+            logger.warning(f"Image reference not found for variants: {image_id}")
+        return result
+    except Exception as e:
+        logger.error(f"Error storing variants for image {image_id}: {str(e)}")
+        raise
+
+def pop_image_reference(image_id: str):
+    """Delete an image reference and return what was deleted.
+    
+    Args:
+        image_id (str): The ID of the image reference to delete.
+        
+    Returns:
+        ImageModel: The deleted image information if found, None otherwise.
+        
+    Raises:
+        Exception: If there is an error deleting the image reference.
+    """
+    logger.warning(f"Deleting image reference with ID: {image_id}")
+    try:
+        image_data = images_collection.find_one_and_delete({"_id": ObjectId(image_id)})
+        if image_data:
+            logger.info(f"Successfully deleted image reference: {image_id}")
+            return ImageModel(**image_data)
+        logger.warning(f"Image reference not found for deletion: {image_id}")
+        return None
+    except Exception as e:
+        logger.error(f"Error deleting image reference {image_id}: {str(e)}")
+        raise
+
+# Content-addressed image blob operations
+def acquire_image_blob(sha256: str):
+    """Add a reference to an already stored blob.
+    
+    This is the whole cost of a duplicate upload: one metadata write.
+    
+    Args:
+        sha256 (str): The hex-encoded SHA-256 of the content.
+        
+    Returns:
+        ImageBlobModel: The blob with its incremented reference count, or None
+        if no blob with this content is stored.
+        
+    Raises:
+        Exception: If there is an error updating the blob.
+    """
+    logger.debug(f"Acquiring image blob: {sha256}")
+    try:
+        blob_data = image_blobs_collection.find_one_and_update(
+            {"_id": sha256, "ref_count": {"$gt": 0}},
+            {"$inc": {"ref_count": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob_data:
+            logger.info(f"Reusing stored image blob {sha256} (refs: {blob_data['ref_count']})")
+            return ImageBlobModel(**blob_data)
+        return None
+    except Exception as e:
+        logger.error(f"Error acquiring image blob {sha256}: {str(e)}")
+        raise
+
+def register_image_blob(blob: ImageBlobModel):
+    """Record a newly stored blob, or add a reference if it was stored concurrently.
+    
+    Args:
+        blob (ImageBlobModel): The blob that was written to storage.
+        
+    Returns:
+        ImageBlobModel: The blob with its current reference count.
+        
+    Raises:
+        Exception: If there is an error storing the blob.
+    """
+    logger.info(f"Registering image blob: {blob.id}")
+    try:
+        blob_data = image_blobs_collection.find_one_and_update(
+            {"_id": blob.id},
+            {
+                "$inc": {"ref_count": 1},
+                "$setOnInsert": blob.dict(by_alias=True, exclude={"id", "ref_count"})
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return ImageBlobModel(**blob_data)
+    except Exception as e:
+        logger.error(f"Error registering image blob {blob.id}: {str(e)}")
+        raise
+
+def release_image_blob(sha256: str):
+    """Drop a reference to a blob.
+    
+    Args:
+        sha256 (str): The hex-encoded SHA-256 of the content.
+        
+    Returns:
+        ImageBlobModel: The blob if this was the last reference and its record
+        was removed, None otherwise. The caller should then delete the object,
+        unless get_existing_image_blob_ids shows it was registered again.
+        
+    Raises:
+        Exception: If there is an error updating the blob.
+    """
+    logger.debug(f"Releasing image blob: {sha256}")
+    try:
+        blob_data = image_blobs_collection.find_one_and_update(
+            {"_id": sha256, "ref_count": {"$gt": 0}},
+            {"$inc": {"ref_count": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not blob_data or blob_data["ref_count"] > 0:
+            return None
+        # Only remove the record if nobody registered it again in the meantime
+        result = image_blobs_collection.delete_one({"_id": sha256, "ref_count": 0})
+        if result.deleted_count > 0:
+            logger.info(f"Last reference to image blob released: {sha256}")
+            return ImageBlobModel(**blob_data)
+        return None
+    except Exception as e:
+        logger.error(f"Error releasing image blob {sha256}: {str(e)}")
+        raise
+
+def get_existing_image_blob_ids(sha256s: List[str]) -> Set[str]:
+    """The subset of sha256s with a blob record, with one indexed query.
+
+    A released blob whose record is back was stored again by a concurrent
+    upload of the same content, and its object must be kept.
+    """
+    if not sha256s:
+        return set()
+    try:
+        return {blob["_id"] for blob in image_blobs_collection.find({"_id": {"$in": list(sha256s)}}, {"_id": 1})}
+    except Exception as e:
+        logger.error(f"Error checking {len(sha256s)} image blob IDs: {str(e)}")
+        raise
+
+def get_image_storage_report():
+    """Summarize how much storage content-addressed deduplication saves.
+    
+    Returns:
+        dict: Blob and reference counts, the bytes actually stored, the bytes
+        that would be stored without deduplication, and the difference.
+        
+    Raises:
+        Exception: If there is an error aggregating the blobs.
+    """
+    logger.info("Building image storage report")
+    try:
+        totals = next(image_blobs_collection.aggregate([
+            {"$group": {
+                "_id": None,
+                "blobs": {"$sum": 1},
+                "references": {"$sum": "$ref_count"},
+                "stored_bytes": {"$sum": "$size"},
+                "logical_bytes": {"$sum": {"$multiply": ["$size", "$ref_count"]}}
+            }}
+        ]), None) or {"blobs": 0, "references": 0, "stored_bytes": 0, "logical_bytes": 0}
+        report = {
+            "blobs": totals["blobs"],
+            "references": totals["references"],
+            "stored_bytes": totals["stored_bytes"],
+            "logical_bytes": totals["logical_bytes"],
+            "saved_bytes": totals["logical_bytes"] - totals["stored_bytes"]
+        }
+        logger.debug(f"Image storage report: {report}")
+        return report
+    except Exception as e:
+        logger.error(f"Error building image storage report: {str(e)}")
+        raise
+
+def iter_referenced_object_names(bucket_name: str, batch_size: int = 1000):
+    """Stream every object name referenced from the database, in sorted order.
+    
+    Covers image files (including records written before the filepath field
+    existed, which used object_name), their variants, and content-addressed
+    blobs. The sort runs in MongoDB with allowDiskUse, so memory stays bounded
+    on both sides no matter how many images there are. Names may repeat.
+    
+    Args:
+        bucket_name (str): Only references into this bucket are returned.
+        batch_size (int, optional): Cursor batch size. Defaults to 1000.
+        
+    Yields:
+        str: Referenced object names in ascending binary order, which matches
+        the order object storage lists keys in.
+    """
+    logger.info(f"Streaming referenced object names for bucket: {bucket_name}")
+    pipeline = [
+        {"$match": {"$or": [{"bucket_name": bucket_name}, {"bucket_name": None}]}},
+        {"$project": {
+            "_id": 0,
+            "name": {"$concatArrays": [
+                [{"$ifNull": ["$filepath", "$object_name"]}],
+                {"$map": {"input": {"$ifNull": ["$variants", []]}, "as": "v", "in": "$$v.object_name"}}
+            ]}
+        }},
+        {"$unwind": "$name"},
+        {"$unionWith": {
+            "coll": image_blobs_collection.name,
+            "pipeline": [
+                {"$match": {"bucket_name": bucket_name}},
+                {"$project": {"_id": 0, "name": "$object_name"}}
+            ]
+        }},
+        {"$match": {"name": {"$type": "string"}}},
+        {"$sort": {"name": 1}}
+    ]
+    try:
+        for doc in images_collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+            yield doc["name"]
+    except Exception as e:
+        logger.error(f"Error streaming referenced object names: {str(e)}")
+        raise
+
 def setup_image_indexes():
     """Set up MongoDB indexes for the images collection for optimal performance."""
     logger.info("Setting up indexes for images collection")
@@ -546,6 +1380,8 @@ def setup_image_indexes():
         images_collection.create_index("uploaded_by")
         images_collection.create_index("upload_date")
         images_collection.create_index("filename")
+        images_collection.create_index("sha256")
+        images_collection.create_index("post_id")
         # Compound index for sorting images by upload date for a specific user
         images_collection.create_index([("uploaded_by", 1), ("upload_date", -1)])
         logger.info("Successfully created indexes for images collection")
@@ -553,6 +1389,541 @@ def setup_image_indexes():
         logger.error(f"Error setting up indexes for images collection: {str(e)}")
         raise
 
+# Background jobs
+# Jobs in these states hold their dedupe_key; see setup_job_indexes
+ACTIVE_JOB_STATUSES = ["queued", "running"]
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], run_at: Optional[datetime] = None,
+                max_attempts: int = 5, dedupe_key: Optional[str] = None) -> str:
+    """Add a job to the durable queue.
+
+    Args:
+        job_type (str): The registered job type.
+        payload (Dict[str, Any]): Arguments for the handler.
+        run_at (Optional[datetime]): When the job becomes due; now if not given.
+        max_attempts (int): How many times the job may be claimed before it fails.
+        dedupe_key (Optional[str]): If set, a queued or running job with the
+            same key is reused instead of adding another.
+
+    Returns:
+        str: The ID of the job.
+    """
+    now = datetime.now(timezone.utc)
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "progress": {},
+        "created_at": now,
+        "run_at": run_at or now,
+        "lease_expires_at": now,
+    }
+    logger.debug(f"Enqueuing {job_type} job: {payload}")
+    try:
+        if dedupe_key is None:
+            return str(jobs_collection.insert_one(job).inserted_id)
+        job["dedupe_key"] = dedupe_key
+        active = {"dedupe_key": dedupe_key, "status": {"$in": ACTIVE_JOB_STATUSES}}
+        try:
+            existing = jobs_collection.find_one_and_update(
+                active, {"$setOnInsert": job}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent enqueue inserted it first; the unique index kept it to one job
+            existing = jobs_collection.find_one(active, {"_id": 1})
+            if existing is None:
+                raise
+        return str(existing["_id"])
+    except Exception as e:
+        logger.error(f"Error enqueuing {job_type} job: {str(e)}")
+        raise
+
+def claim_job(job_type: str, lease_seconds: float) -> Optional[dict]:
+    """Atomically claim the next due job of a type.
+
+    A job is claimable when it is queued and due, or running with an expired
+    lease (its worker died). Claiming increments attempts, which also serves
+    as the claim token for renew_job_lease, complete_job and fail_job.
+
+    Returns:
+        dict: The claimed job, or None if none is due.
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        return jobs_collection.find_one_and_update(
+            {
+                "type": job_type,
+                "status": {"$in": ["queued", "running"]},
+                "run_at": {"$lte": now},
+                "lease_expires_at": {"$lte": now}
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        logger.error(f"Error claiming {job_type} job: {str(e)}")
+        raise
+
+def _claimed(job_id, attempt: int) -> dict:
+    # Matches only while the claim that made this attempt still holds
+    return {"_id": ObjectId(str(job_id)), "status": "running", "attempts": attempt}
+
+def renew_job_lease(job_id, attempt: int, lease_seconds: float) -> bool:
+    """Extend a claimed job's lease. False if the claim was lost to another worker."""
+    try:
+        result = jobs_collection.update_one(
+            _claimed(job_id, attempt),
+            {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}}
+        )
+        return result.matched_count > 0
+    except Exception as e:
+        logger.error(f"Error renewing lease of job {job_id}: {str(e)}")
+        raise
+
+def complete_job(job_id, attempt: int) -> bool:
+    try:
+        result = jobs_collection.update_one(
+            _claimed(job_id, attempt),
+            {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}}
+        )
+        return result.matched_count > 0
+    except Exception as e:
+        logger.error(f"Error completing job {job_id}: {str(e)}")
+        raise
+
+def fail_job(job_id, attempt: int, error: str, retry_at: Optional[datetime] = None) -> bool:
+    """Record a failed attempt, requeueing the job for retry_at or failing it for good."""
+    now = datetime.now(timezone.utc)
+    if retry_at is not None:
+        update = {"status": "queued", "run_at": retry_at, "lease_expires_at": now, "last_error": error}
+    else:
+        update = {"status": "failed", "finished_at": now, "last_error": error}
+    try:
+        result = jobs_collection.update_one(_claimed(job_id, attempt), {"$set": update})
+        return result.matched_count > 0
+    except Exception as e:
+        logger.error(f"Error failing job {job_id}: {str(e)}")
+        raise
+
+def record_job_progress(job_id, counts: Dict[str, int]):
+    """Add counts to a job's progress, so a resumed job can report its total."""
+    try:
+        jobs_collection.update_one(
+            {"_id": ObjectId(str(job_id))},
+            {"$inc": {f"progress.{name}": count for name, count in counts.items()}}
+        )
+    except Exception as e:
+        logger.error(f"Error recording progress of job {job_id}: {str(e)}")
+        raise
+
+def get_jobs(job_type: Optional[str] = None, statuses: Optional[List[str]] = None, limit: int = 100) -> List[dict]:
+    """Jobs of a type and status, oldest due first."""
+    filters = {}
+    if job_type is not None:
+        filters["type"] = job_type
+    if statuses is not None:
+        filters["status"] = {"$in": statuses}
+    try:
+        return list(jobs_collection.find(filters).sort("run_at", 1).limit(limit))
+    except Exception as e:
+        logger.error(f"Error retrieving jobs: {str(e)}")
+        raise
+
+def count_jobs(job_type: str, status: str, limit: int = 0) -> int:
+    try:
+        return jobs_collection.count_documents({"type": job_type, "status": status}, limit=limit)
+    except Exception as e:
+        logger.error(f"Error counting {status} {job_type} jobs: {str(e)}")
+        raise
+
+def get_job_queue_stats(since: datetime) -> Dict[str, Dict[str, int]]:
+    """Count jobs by type and status, plus jobs finished since the given time.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Per job type, counts for "queued" (due now),
+        "scheduled" (due later), "running", "failed" and "done", and
+        "finished_since" for throughput.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        stats: Dict[str, Dict[str, int]] = {}
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "type": "$type",
+                    "status": {"$cond": [
+                        {"$and": [{"$eq": ["$status", "queued"]}, {"$gt": ["$run_at", now]}]},
+                        "scheduled",
+                        "$status"
+                    ]}
+                },
+                "count": {"$sum": 1},
+                "finished_since": {"$sum": {"$cond": [{"$gte": ["$finished_at", since]}, 1, 0]}}
+            }}
+        ]
+        for group in jobs_collection.aggregate(pipeline):
+            counts = stats.setdefault(group["_id"]["type"], {
+                "queued": 0, "scheduled": 0, "running": 0, "failed": 0, "done": 0, "finished_since": 0
+            })
+            counts[group["_id"]["status"]] = group["count"]
+            counts["finished_since"] += group["finished_since"]
+        return stats
+    except Exception as e:
+        logger.error(f"Error retrieving job queue stats: {str(e)}")
+        raise
+
+def setup_job_indexes(retention_seconds: int):
+    """Indexes for claiming jobs, plus a TTL index that removes finished jobs after retention_seconds."""
+    logger.info("Setting up indexes for jobs collection")
+    try:
+        jobs_collection.create_index([("type", 1), ("status", 1), ("run_at", 1)])
+        # At most one queued or running job per dedupe_key, even with concurrent enqueues
+        if "dedupe_key_1" in jobs_collection.index_information():
+            jobs_collection.drop_index("dedupe_key_1")
+        jobs_collection.create_index(
+            "dedupe_key",
+            name="dedupe_key_active",
+            unique=True,
+            partialFilterExpression={"status": {"$in": ACTIVE_JOB_STATUSES}, "dedupe_key": {"$exists": True}}
+        )
+        jobs_collection.create_index("finished_at", expireAfterSeconds=retention_seconds)
+    except Exception as e:
+        logger.error(f"Error setting up indexes for jobs collection: {str(e)}")
+        raise
+
+def delete_comments_batch(filters: Dict[str, Any], batch_size: int) -> int:
+    """Delete up to batch_size comments matching filters with one bulk delete.
+
+    Returns:
+        int: The number of comments deleted.
+    """
+    try:
+        comments = list(comments_collection.find(filters, {"post_id": 1}).limit(batch_size))
+        if not comments:
+            return 0
+        result = comments_collection.delete_many({"_id": {"$in": [comment["_id"] for comment in comments]}})
+        post_ids = {comment["post_id"] for comment in comments}
+        bump_version(*(comments_version_key(post_id) for post_id in post_ids))
+        logger.debug(f"Deleted {result.deleted_count} comments on {len(post_ids)} posts")
+        return result.deleted_count
+    except Exception as e:
+        logger.error(f"Error deleting comments matching {filters}: {str(e)}")
+        raise
+
+def get_post_ids_by_author(author_id: str, limit: int = 100) -> List[str]:
+    try:
+        return [str(post["_id"]) for post in posts_collection.find({"author_id": author_id}, {"_id": 1}).limit(limit)]
+    except Exception as e:
+        logger.error(f"Error retrieving post IDs by author {author_id}: {str(e)}")
+        raise
+
+def get_image_ids_for_post(post_id: str, limit: int = 100) -> List[str]:
+    try:
+        return [str(image["_id"]) for image in images_collection.find({"post_id": post_id}, {"_id": 1}).limit(limit)]
+    except Exception as e:
+        logger.error(f"Error retrieving image IDs for post {post_id}: {str(e)}")
+        raise
+
+# Bulk export and import
+def export_post_filters(author_id: Optional[str] = None, created_after: Optional[datetime] = None,
+                        created_before: Optional[datetime] = None, is_published: Optional[bool] = None,
+                        after_id: Optional[str] = None, before_id: Optional[str] = None) -> Dict[str, Any]:
+    """Build a posts query for export; after_id and before_id bound the _id range, exclusively.
+
+    Raises:
+        ValueError: If after_id or before_id is not a valid ObjectId.
+    """
+    for bound in (after_id, before_id):
+        if bound is not None and not ObjectId.is_valid(bound):
+            raise ValueError(f"Invalid post ID: {bound}")
+    filters: Dict[str, Any] = {}
+    if author_id is not None:
+        filters["author_id"] = author_id
+    if is_published is not None:
+        filters["is_published"] = is_published
+    if created_after is not None or created_before is not None:
+        filters["created_at"] = {}
+        if created_after is not None:
+            filters["created_at"]["$gte"] = created_after
+        if created_before is not None:
+            filters["created_at"]["$lt"] = created_before
+    if after_id is not None or before_id is not None:
+        filters["_id"] = {}
+        if after_id is not None:
+            filters["_id"]["$gt"] = ObjectId(after_id)
+        if before_id is not None:
+            filters["_id"]["$lt"] = ObjectId(before_id)
+    return filters
+
+def iter_post_documents(filters: Dict[str, Any], batch_size: int = 500) -> Iterator[dict]:
+    """Stream raw post documents in _id order from one batched cursor. Blocking."""
+    logger.info(f"Streaming posts: {filters}")
+    cursor = posts_collection.find(filters).sort("_id", 1).batch_size(batch_size)
+    try:
+        yield from cursor
+    except Exception as e:
+        logger.error(f"Error streaming posts: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+def iter_comment_documents(post_ids: List[str], batch_size: int = 1000) -> Iterator[dict]:
+    """Stream the raw comments of several posts, grouped by post in post _id order. Blocking.
+
+    Post IDs are fixed-width hex strings, so sorting on post_id matches the
+    _id order of the posts themselves.
+    """
+    cursor = (
+        comments_collection.find({"post_id": {"$in": post_ids}})
+        .sort([("post_id", 1), ("_id", 1)])
+        .batch_size(batch_size)
+    )
+    try:
+        yield from cursor
+    except Exception as e:
+        logger.error(f"Error streaming comments of {len(post_ids)} posts: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+def _insert_unordered(collection, documents: List[dict], ignore_duplicates: bool = False) -> List[Tuple[int, str]]:
+    """Insert documents with one unordered insert_many; the rest are written even if some fail.
+
+    Returns:
+        List[Tuple[int, str]]: The index and message of every document that
+        failed, leaving out duplicate _ids if ignore_duplicates is set.
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+        return []
+    except BulkWriteError as e:
+        errors = [
+            (error["index"], error["errmsg"]) for error in e.details.get("writeErrors", [])
+            if not (ignore_duplicates and error.get("code") == 11000)
+        ]
+        if not errors:
+            return []
+        logger.warning(f"{len(errors)} of {len(documents)} documents failed to insert into {collection.name}")
+        return errors
+
+def insert_posts_batch(documents: List[dict]) -> List[Tuple[int, str]]:
+    """Bulk insert raw post documents, which must carry their _id. Blocking.
+
+    Returns:
+        List[Tuple[int, str]]: The index and message of every post that failed.
+    """
+    if not documents:
+        return []
+    try:
+        errors = _insert_unordered(posts_collection, documents)
+        for document in documents:
+            missing_posts.discard(str(document["_id"]))
+        bump_version(POSTS_VERSION_KEY)
+        response_cache.invalidate(POSTS_TAG)
+        logger.debug(f"Imported {len(documents) - len(errors)} posts")
+        return errors
+    except Exception as e:
+        logger.error(f"Error importing {len(documents)} posts: {str(e)}")
+        raise
+
+def insert_comments_batch(documents: List[dict]) -> List[Tuple[int, str]]:
+    """Bulk insert raw comment documents, which must carry their _id. Blocking.
+
+    Returns:
+        List[Tuple[int, str]]: The index and message of every comment that failed.
+    """
+    if not documents:
+        return []
+    try:
+        errors = _insert_unordered(comments_collection, documents)
+        bump_version(*sorted({comments_version_key(document["post_id"]) for document in documents}))
+        logger.debug(f"Imported {len(documents) - len(errors)} comments")
+        return errors
+    except Exception as e:
+        logger.error(f"Error importing {len(documents)} comments: {str(e)}")
+        raise
+
+def get_existing_post_ids(post_ids: List[str]) -> set:
+    """The subset of post_ids that exist, with one indexed query. Blocking."""
+    object_ids = _valid_object_ids(post_ids)
+    if not object_ids:
+        return set()
+    try:
+        return {str(post["_id"]) for post in posts_collection.find({"_id": {"$in": object_ids}}, {"_id": 1})}
+    except Exception as e:
+        logger.error(f"Error checking {len(object_ids)} post IDs: {str(e)}")
+        raise
+
+# Migration of embedded comments
+def setup_legacy_comment_index():
+    """Index the _ids and authors of comments still embedded in posts; sparse, so they shrink as they are migrated."""
+    try:
+        posts_collection.create_index("comments._id", sparse=True)
+        # Old comments name their author either way
+        posts_collection.create_index("comments.author_id", sparse=True)
+        posts_collection.create_index("comments.user_id", sparse=True)
+    except Exception as e:
+        logger.error(f"Error creating the embedded comments index: {str(e)}")
+        raise
+
+def get_posts_with_embedded_comments(after_id: Optional[str], limit: int) -> List[dict]:
+    """The next posts after after_id, in _id order, that still have a comments array. Blocking."""
+    filters: Dict[str, Any] = {"comments": {"$exists": True}}
+    if after_id:
+        filters["_id"] = {"$gt": ObjectId(after_id)}
+    try:
+        return list(posts_collection.find(filters, {"comments": 1}).sort("_id", 1).limit(limit))
+    except Exception as e:
+        logger.error(f"Error retrieving posts with embedded comments: {str(e)}")
+        raise
+
+def insert_migrated_comments(documents: List[dict]) -> List[Tuple[int, str]]:
+    """Bulk insert converted comments; ones copied by an earlier, interrupted run are skipped. Blocking.
+
+    Returns:
+        List[Tuple[int, str]]: The index and message of every comment that failed.
+    """
+    if not documents:
+        return []
+    try:
+        return _insert_unordered(comments_collection, documents, ignore_duplicates=True)
+    except Exception as e:
+        logger.error(f"Error inserting {len(documents)} migrated comments: {str(e)}")
+        raise
+
+def get_existing_comment_ids(comment_ids: List[ObjectId]) -> Set[ObjectId]:
+    """The subset of comment_ids present in comments_collection, with one indexed query. Blocking."""
+    if not comment_ids:
+        return set()
+    try:
+        return {comment["_id"] for comment in comments_collection.find({"_id": {"$in": comment_ids}}, {"_id": 1})}
+    except Exception as e:
+        logger.error(f"Error checking {len(comment_ids)} comment IDs: {str(e)}")
+        raise
+
+def unset_embedded_comments(sizes: Dict[ObjectId, int]) -> int:
+    """Remove the comments arrays of migrated posts with one bulk write. Blocking.
+
+    Each update only matches while the array still has the size that was
+    migrated, so a post that got another embedded comment meanwhile keeps
+    its array until the next pass.
+
+    Returns:
+        int: The number of posts whose array was removed.
+    """
+    operations = [
+        UpdateOne({"_id": post_id, "comments": {"$size": size}}, {"$unset": {"comments": ""}})
+        for post_id, size in sizes.items()
+    ]
+    if not operations:
+        return 0
+    try:
+        return posts_collection.bulk_write(operations, ordered=False).modified_count
+    except Exception as e:
+        logger.error(f"Error unsetting comments of {len(operations)} posts: {str(e)}")
+        raise
+
+# Leader leases
+def acquire_lease(name: str, holder: str, lease_seconds: float) -> Optional[dict]:
+    """Take a named lease if it is free, expired or already held by holder.
+
+    Every acquisition increments the lease's fencing token, so the token
+    identifies one term of leadership; renew_lease and record_periodic_run
+    only match the current term.
+
+    Returns:
+        dict: The lease document, or None if another holder has it.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        return leases_collection.find_one_and_update(
+            {"_id": name, "$or": [{"holder": holder}, {"expires_at": {"$lte": now}}]},
+            {
+                "$set": {"holder": holder, "acquired_at": now, "expires_at": now + timedelta(seconds=lease_seconds)},
+                "$inc": {"token": 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The upsert lost to a live lease held by someone else
+        return None
+    except Exception as e:
+        logger.error(f"Error acquiring lease {name}: {str(e)}")
+        raise
+
+def renew_lease(name: str, token: int, lease_seconds: float) -> bool:
+    """Extend the lease for the term with this token. False if another holder has taken it since."""
+    try:
+        result = leases_collection.update_one(
+            {"_id": name, "token": token},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}}
+        )
+        return result.matched_count > 0
+    except Exception as e:
+        logger.error(f"Error renewing lease {name}: {str(e)}")
+        raise
+
+def release_lease(name: str, token: int):
+    """Expire the lease now so another holder can take it without waiting for it to lapse."""
+    try:
+        leases_collection.update_one({"_id": name, "token": token}, {"$set": {"expires_at": datetime.now(timezone.utc)}})
+    except Exception as e:
+        logger.error(f"Error releasing lease {name}: {str(e)}")
+        raise
+
+def record_periodic_run(name: str, token: int, task: str) -> bool:
+    """Record that a periodic task is starting, fenced by the lease token.
+
+    Returns:
+        bool: False if the term has ended, in which case the task must not run.
+    """
+    try:
+        result = leases_collection.update_one(
+            {"_id": name, "token": token},
+            {"$set": {f"runs.{task}": datetime.now(timezone.utc)}}
+        )
+        return result.matched_count > 0
+    except Exception as e:
+        logger.error(f"Error recording run of {task} under lease {name}: {str(e)}")
+        raise
+
+def get_lease(name: str) -> Optional[dict]:
+    try:
+        return leases_collection.find_one({"_id": name})
+    except Exception as e:
+        logger.error(f"Error retrieving lease {name}: {str(e)}")
+        raise
+
+# Checkpoints of resumable maintenance tasks
+def get_checkpoint(name: str) -> Optional[dict]:
+    try:
+        return checkpoints_collection.find_one({"_id": name})
+    except Exception as e:
+        logger.error(f"Error retrieving checkpoint {name}: {str(e)}")
+        raise
+
+def save_checkpoint(name: str, position: Any, totals: Optional[Dict[str, int]] = None):
+    """Store where a task got to, adding totals to its running counts."""
+    update: Dict[str, Any] = {"$set": {"position": position, "updated_at": datetime.now(timezone.utc)}}
+    if totals:
+        update["$inc"] = {f"totals.{key}": value for key, value in totals.items()}
+    try:
+        checkpoints_collection.update_one({"_id": name}, update, upsert=True)
+    except Exception as e:
+        logger.error(f"Error saving checkpoint {name}: {str(e)}")
+        raise
+
 # Search operations
 def search_posts_v2(query: str, limit: int = 10, skip: int = 0, sort_by: str = "created_at", sort_direction: int = -1):
     """
@@ -30,4 +30,9 @@ users_collection = db['users']
 posts_collection = db['posts']
 comments_collection = db['comments']
 images_collection = db['images']
+image_blobs_collection = db['image_blobs']
+versions_collection = db['versions']
+jobs_collection = db['jobs']
+leases_collection = db['leases']
+checkpoints_collection = db['checkpoints']
 logger.info("Database collections initialized")
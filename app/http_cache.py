@@ -0,0 +1,78 @@
+"""
+ETag and Last-Modified helpers for conditional GETs.
+
+Single documents get a strong ETag derived from their _id and updated_at.
+Lists get one derived from a version counter that every write to the list
+increments (see crud.bump_version) plus the query parameters, so a client
+revalidating an unchanged page costs one small indexed read instead of a
+full query and re-serialization.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+load_dotenv()
+
+# Clients and shared caches may reuse a response for this long, then must revalidate
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", 0))
+CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate"
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the values that determine a response."""
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def document_etag(document_id: str, modified_at: Optional[datetime]) -> str:
+    return make_etag(document_id, _as_utc(modified_at).isoformat() if modified_at else "")
+
+def _as_utc(value: datetime) -> datetime:
+    # MongoDB returns naive datetimes in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value), usegmt=True)
+
+def has_validators(request: Request) -> bool:
+    """Whether the request is conditional and worth a cheap validator lookup."""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag; W/ prefixes are ignored."""
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def unmodified_since(if_modified_since: str, modified_at: datetime) -> bool:
+    """Whether modified_at is no later than an If-Modified-Since header; False if it doesn't parse."""
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # Dates written with "-0000" parse as naive, but are still UTC.
+    # HTTP dates have one second precision.
+    return _as_utc(modified_at).replace(microsecond=0) <= _as_utc(since)
+
+def is_not_modified(request: Request, etag: str, modified_at: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when it is absent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified_at:
+        return unmodified_since(if_modified_since, modified_at)
+    return False
+
+def set_validators(response: Response, etag: str, modified_at: Optional[datetime] = None) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if modified_at:
+        response.headers["Last-Modified"] = http_date(modified_at)
+
+def not_modified(etag: str, modified_at: Optional[datetime] = None) -> Response:
+    """A 304 response carrying the same validators a 200 would have."""
+    response = Response(status_code=304)
+    set_validators(response, etag, modified_at)
+    return response
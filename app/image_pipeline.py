@@ -0,0 +1,229 @@
+"""
+Background pipeline that renders resized variants of uploaded post images.
+
+Uploads enqueue an image_variants job (see app.jobs), so queued work
+survives restarts and is retried with backoff. The job downloads the
+original, renders the configured widths and formats in a process pool (so
+resizing never blocks the event loop or holds the GIL) and stores the
+results under posts/{post_id}/images/variants/.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from . import crud
+from .logger import get_logger
+from .models import ImageModel, ImageVariant
+from .object_storage import get_minio_client
+from .jobs import job_runner
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+VARIANT_WIDTHS = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()]
+VARIANT_FORMATS = [f.strip().lower() for f in os.getenv("IMAGE_VARIANT_FORMATS", "webp,jpeg").split(",") if f.strip()]
+VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv("IMAGE_PIPELINE_QUEUE_SIZE", 100))
+PIPELINE_MAX_ATTEMPTS = int(os.getenv("IMAGE_PIPELINE_MAX_ATTEMPTS", 3))
+PIPELINE_RETRY_DELAY = float(os.getenv("IMAGE_PIPELINE_RETRY_DELAY_SECONDS", 2))
+
+VARIANTS_JOB = "image_variants"
+
+FORMAT_CONTENT_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+def render_variants(source_path: str, output_dir: str, widths: List[int], formats: List[str], quality: int) -> List[dict]:
+    """Render resized copies of an image. Runs in a worker process.
+
+    Widths larger than the original are skipped so images are never upscaled.
+
+    Args:
+        source_path (str): Path of the original image.
+        output_dir (str): Directory to write the variants to.
+        widths (List[int]): Target widths in pixels.
+        formats (List[str]): Output formats, e.g. ["webp", "jpeg"].
+        quality (int): Encoder quality for lossy formats.
+
+    Returns:
+        List[dict]: One entry per rendered file with its path, size and dimensions.
+    """
+    # Imported here because this only ever runs inside the pool's worker processes
+    from PIL import Image, ImageOps
+
+    rendered = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                output = resized
+                if fmt == "jpeg" and output.mode not in ("RGB", "L"):
+                    output = output.convert("RGB")
+                path = os.path.join(output_dir, f"{width}.{fmt}")
+                output.save(path, format=fmt.upper(), quality=quality, optimize=True)
+                rendered.append({
+                    "path": path,
+                    "width": width,
+                    "height": height,
+                    "format": fmt,
+                    "file_size": os.path.getsize(path),
+                })
+    return rendered
+
+def select_variant(image: ImageModel, width: Optional[int] = None, accept: str = "") -> Optional[ImageVariant]:
+    """Pick the best stored variant for a request.
+
+    WebP is preferred when the client's Accept header allows it. Among variants
+    of the chosen format, the smallest one at least as wide as the requested
+    width wins; without a width the largest variant is used. Returns None when
+    the original should be served instead.
+    """
+    if not image.variants:
+        return None
+    accepted = [v for v in image.variants if v.format == "webp"] if "image/webp" in accept else []
+    candidates = accepted or [v for v in image.variants if v.format != "webp"] or image.variants
+    candidates = sorted(candidates, key=lambda v: v.width)
+    if width is None:
+        return candidates[-1]
+    for variant in candidates:
+        if variant.width >= width:
+            return variant
+    # Nothing is wide enough; the original is the best match
+    return None
+
+class ImagePipeline:
+    """Process pool that renders image variants for image_variants jobs."""
+
+    def __init__(self, widths: List[int] = VARIANT_WIDTHS, formats: List[str] = VARIANT_FORMATS,
+                 workers: int = PIPELINE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 max_attempts: int = PIPELINE_MAX_ATTEMPTS, retry_delay: float = PIPELINE_RETRY_DELAY,
+                 quality: int = VARIANT_QUALITY):
+        self.widths = widths
+        self.formats = formats
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.quality = quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._rejected = 0
+        self._last_seconds = None
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        logger.info(f"Image pipeline started with {self.workers} workers, queue size {self.queue_size}")
+
+    async def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Image pipeline stopped")
+
+    def enqueue(self, image_id: str) -> bool:
+        """Queue an image for variant generation. Blocking (one small write).
+
+        Returns False when the pipeline isn't running, the queue is full or the
+        job could not be stored; the image is still served as its original in
+        that case.
+        """
+        if not self.running:
+            logger.warning(f"Image pipeline not running, skipping variants for image: {image_id}")
+            return False
+        try:
+            if crud.count_jobs(VARIANTS_JOB, "queued", limit=self.queue_size) >= self.queue_size:
+                self._rejected += 1
+                logger.warning(f"Image pipeline queue full, skipping variants for image: {image_id}")
+                return False
+            job_runner.enqueue(VARIANTS_JOB, {"image_id": image_id}, dedupe_key=f"variants:{image_id}")
+        except Exception as e:
+            logger.error(f"Failed to queue variants for image {image_id}: {str(e)}")
+            return False
+        logger.debug(f"Queued image for variants: {image_id}")
+        return True
+
+    async def run_job(self, job: dict) -> None:
+        """Job handler for image_variants; failures are retried by the job runner."""
+        if not self.running:
+            raise RuntimeError("Image pipeline not running")
+        image_id = job["payload"]["image_id"]
+        started = time.perf_counter()
+        await self.process(image_id)
+        self._last_seconds = time.perf_counter() - started
+        logger.info(f"Variants generated for image {image_id} in {self._last_seconds:.2f}s")
+
+    async def process(self, image_id: str) -> List[ImageVariant]:
+        """Render and store the variants of one image and record them on its ImageModel."""
+        image = await run_in_threadpool(crud.get_image_by_id, image_id)
+        if not image or image.status != "ready":
+            logger.warning(f"Image not ready for variant generation: {image_id}")
+            return []
+
+        client = get_minio_client()
+        stem = os.path.splitext(image.filename)[0]
+        variants = []
+        with tempfile.TemporaryDirectory() as work_dir:
+            source_path = os.path.join(work_dir, "original")
+            await run_in_threadpool(client.fget_object, image.bucket_name, image.filepath, source_path)
+
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(
+                self._executor, render_variants, source_path, work_dir, self.widths, self.formats, self.quality
+            )
+
+            for item in rendered:
+                object_name = f"posts/{image.post_id}/images/variants/{stem}-{item['width']}.{item['format']}"
+                content_type = FORMAT_CONTENT_TYPES.get(item["format"], "application/octet-stream")
+                await run_in_threadpool(
+                    client.fput_object, image.bucket_name, object_name, item["path"], content_type=content_type
+                )
+                variants.append(ImageVariant(
+                    width=item["width"],
+                    height=item["height"],
+                    format=item["format"],
+                    content_type=content_type,
+                    object_name=object_name,
+                    file_size=item["file_size"]
+                ))
+
+        await run_in_threadpool(crud.set_image_variants, image_id, variants)
+        return variants
+
+    def get_stats(self) -> dict:
+        """Queue depth and processing time metrics."""
+        jobs = job_runner.get_stats().get(VARIANTS_JOB, {})
+        return {
+            "running": self.running,
+            "queue_depth": crud.count_jobs(VARIANTS_JOB, "queued") if self.running else 0,
+            "queue_capacity": self.queue_size,
+            "workers": self.workers,
+            "processed": jobs.get("completed", 0),
+            "failed": jobs.get("failed", 0),
+            "rejected": self._rejected,
+            "retries": jobs.get("retried", 0),
+            "avg_processing_seconds": jobs.get("avg_seconds"),
+            "last_processing_seconds": self._last_seconds,
+        }
+
+image_pipeline = ImagePipeline()
+job_runner.register(
+    VARIANTS_JOB, image_pipeline.run_job, concurrency=PIPELINE_WORKERS,
+    max_attempts=PIPELINE_MAX_ATTEMPTS, retry_delay=PIPELINE_RETRY_DELAY
+)
@@ -0,0 +1,312 @@
+"""
+Helpers for serving stored images through the API.
+
+Objects are proxied from storage in fixed-size chunks, so memory per request
+is bounded by IMAGE_STREAM_CHUNK_SIZE and the number of concurrent streams by
+IMAGE_PROXY_MAX_CONCURRENCY. Hot images can additionally be kept in a local
+disk cache (enabled by setting IMAGE_DISK_CACHE_DIR) that evicts the least
+recently used files once it grows past IMAGE_DISK_CACHE_MAX_BYTES.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import format_datetime
+from typing import AsyncIterator, Optional, Tuple
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from . import http_cache
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+STREAM_CHUNK_SIZE = int(os.getenv("IMAGE_STREAM_CHUNK_SIZE", 64 * 1024))
+PROXY_MAX_CONCURRENCY = int(os.getenv("IMAGE_PROXY_MAX_CONCURRENCY", 32))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Used when the response may change later, e.g. the original is served
+# because variants for the requested width haven't been generated yet
+SHORT_CACHE_CONTROL = f"public, max-age={int(os.getenv('IMAGE_CACHE_MAX_AGE_SECONDS', 300))}"
+DISK_CACHE_DIR = os.getenv("IMAGE_DISK_CACHE_DIR") or None
+DISK_CACHE_MAX_BYTES = int(os.getenv("IMAGE_DISK_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+DISK_CACHE_MAX_OBJECT_SIZE = int(os.getenv("IMAGE_DISK_CACHE_MAX_OBJECT_SIZE", 10 * 1024 * 1024))
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header can't be satisfied for the object size."""
+
+@dataclass
+class ObjectInfo:
+    """The parts of stat_object needed to answer a request."""
+    bucket_name: str
+    object_name: str
+    size: int
+    etag: str
+    last_modified: Optional[datetime]
+    content_type: str
+
+    @property
+    def etag_header(self) -> str:
+        return f'"{self.etag}"'
+
+    @property
+    def last_modified_header(self) -> Optional[str]:
+        return format_datetime(self.last_modified, usegmt=True) if self.last_modified else None
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range into inclusive (start, end) offsets.
+
+    Returns None when the whole object should be sent: no header, a header we
+    don't understand, or several ranges (which servers may ignore).
+
+    Raises:
+        RangeNotSatisfiable: If the range lies entirely outside the object.
+    """
+    if not header:
+        return None
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+def is_not_modified(headers, info: ObjectInfo) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        return http_cache.etag_matches(if_none_match, info.etag_header)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and info.last_modified:
+        return http_cache.unmodified_since(if_modified_since, info.last_modified)
+    return False
+
+def range_applies(headers, info: ObjectInfo) -> bool:
+    """Check If-Range: a stale validator means the full object must be sent."""
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == info.etag_header
+    return if_range == info.last_modified_header
+
+def stat(client, bucket_name: str, object_name: str) -> ObjectInfo:
+    """Blocking stat_object call; run it in a worker thread."""
+    result = client.stat_object(bucket_name, object_name)
+    return ObjectInfo(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        size=result.size,
+        etag=(result.etag or "").strip('"'),
+        last_modified=result.last_modified,
+        content_type=result.content_type or "application/octet-stream"
+    )
+
+class DiskImageCache:
+    """Local LRU file cache of stored objects, keyed by name and ETag.
+
+    Keying on the ETag means an overwritten object is never served stale;
+    the old file simply ages out. All methods block and are thread-safe.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DISK_CACHE_MAX_BYTES,
+                 max_object_size: int = DISK_CACHE_MAX_OBJECT_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_size = max_object_size
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        # Rebuild the LRU order from access times left by a previous process
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat_result = entry.stat()
+                files.append((stat_result.st_atime, entry.name, stat_result.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+    def _key(self, info: ObjectInfo) -> str:
+        return hashlib.sha256(f"{info.bucket_name}/{info.object_name}/{info.etag}".encode()).hexdigest()
+
+    def cacheable(self, info: ObjectInfo) -> bool:
+        return info.size <= self.max_object_size
+
+    def get(self, info: ObjectInfo) -> Optional[str]:
+        """Path of the cached copy of an object, or None."""
+        key = self._key(info)
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return os.path.join(self.directory, key)
+
+    def fetch(self, client, info: ObjectInfo) -> str:
+        """Download an object into the cache and return its path."""
+        key = self._key(info)
+        path = os.path.join(self.directory, key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".download-")
+        os.close(fd)
+        try:
+            client.fget_object(info.bucket_name, info.object_name, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+        return path
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._entries:
+                try:
+                    os.remove(os.path.join(self.directory, key))
+                except FileNotFoundError:
+                    pass
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+class ImageProxy:
+    """Streams objects to clients with a cap on concurrent streams."""
+
+    def __init__(self, max_concurrency: int = PROXY_MAX_CONCURRENCY, chunk_size: int = STREAM_CHUNK_SIZE,
+                 disk_cache: Optional[DiskImageCache] = None):
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.disk_cache = disk_cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._served = 0
+        self._bytes_sent = 0
+
+    async def stream(self, client, info: ObjectInfo, start: int, length: int) -> AsyncIterator[bytes]:
+        """Yield length bytes of an object starting at start.
+
+        A stream slot is held while the body is sent, so slow clients can't
+        make the server hold more than max_concurrency storage connections.
+        """
+        async with self._semaphore:
+            self._active += 1
+            try:
+                cached = await self._open_cached(client, info)
+                if cached is not None:
+                    reader = self._read_file(cached, start, length)
+                else:
+                    reader = self._read_object(client, info, start, length)
+                async with aclosing(reader):
+                    async for chunk in reader:
+                        self._bytes_sent += len(chunk)
+                        yield chunk
+                self._served += 1
+            finally:
+                self._active -= 1
+
+    async def _open_cached(self, client, info: ObjectInfo):
+        """Open the disk cache copy of an object, fetching it on a miss."""
+        if self.disk_cache is None or not self.disk_cache.cacheable(info):
+            return None
+        try:
+            path = self.disk_cache.get(info)
+            if path is None:
+                path = await run_in_threadpool(self.disk_cache.fetch, client, info)
+            # Once open, the file stays readable even if it is evicted meanwhile
+            return open(path, "rb")
+        except Exception as e:
+            # Fall back to proxying straight from storage
+            logger.error(f"Failed to read cached image object {info.object_name}: {str(e)}")
+            return None
+
+    async def _read_object(self, client, info: ObjectInfo, start: int, length: int) -> AsyncIterator[bytes]:
+        response = await run_in_threadpool(client.get_object, info.bucket_name, info.object_name, start, length)
+        try:
+            remaining = length
+            while remaining > 0:
+                chunk = await run_in_threadpool(response.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def _read_file(self, f, start: int, length: int) -> AsyncIterator[bytes]:
+        with f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def get_stats(self) -> dict:
+        return {
+            "active_streams": self._active,
+            "max_concurrency": self.max_concurrency,
+            "served": self._served,
+            "bytes_sent": self._bytes_sent,
+            "disk_cache": self.disk_cache.stats() if self.disk_cache is not None else None,
+        }
+
+image_proxy = ImageProxy(disk_cache=DiskImageCache(DISK_CACHE_DIR) if DISK_CACHE_DIR else None)
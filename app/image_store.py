@@ -0,0 +1,192 @@
+"""
+Content-addressed storage of post images.
+
+Uploaded files are hashed locally first. If an object with the same SHA-256
+is already stored, the new image only adds a reference to it; otherwise the
+file is streamed to blobs/sha256/<prefix>/<digest> and registered. Objects
+are removed only when their last reference is released and no concurrent
+upload of the same content has registered the blob again.
+
+These functions block on MongoDB and object storage; call them from a worker
+thread in async code.
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from . import crud
+from .logger import get_logger
+from .models import ImageModel, ImageBlobModel
+from .object_storage import (
+    get_minio_client, inspect_upload, stream_upload, presigned_url_cache, get_storage, BulkDeleteError,
+    IMAGE_BUCKET, MAX_UPLOAD_SIZE, ALLOWED_IMAGE_TYPES, UploadError
+)
+
+logger = get_logger(__name__)
+
+def content_addressed_name(sha256: str) -> str:
+    """Object storage key for content with the given SHA-256."""
+    return f"blobs/sha256/{sha256[:2]}/{sha256}"
+
+def store_image_upload(fileobj, filename: str, declared_content_type: Optional[str], post_id: str,
+                       user_id: str, bucket_name: str = IMAGE_BUCKET) -> ImageModel:
+    """Store an uploaded image, reusing identical content that is already stored.
+
+    Args:
+        fileobj: A readable, seekable binary file object, e.g. UploadFile.file.
+        filename (str): The client's filename, used only for its extension.
+        declared_content_type (str): The client's content type; it must match the sniffed one.
+        post_id (str): The post the image belongs to.
+        user_id (str): The uploading user.
+        bucket_name (str, optional): The bucket to store the content in.
+
+    Returns:
+        ImageModel: The stored image reference.
+
+    Raises:
+        UploadTooLargeError: If the file is larger than MAX_UPLOAD_SIZE.
+        UnsupportedContentTypeError: If the content type is not allowed.
+    """
+    inspected = inspect_upload(fileobj, declared_content_type, MAX_UPLOAD_SIZE, ALLOWED_IMAGE_TYPES)
+
+    blob = crud.acquire_image_blob(inspected.sha256)
+    if blob is None:
+        client = get_minio_client()
+        object_name = content_addressed_name(inspected.sha256)
+        upload = stream_upload(
+            client, bucket_name, object_name, fileobj,
+            declared_content_type=inspected.content_type,
+            max_size=MAX_UPLOAD_SIZE,
+            allowed_content_types=ALLOWED_IMAGE_TYPES
+        )
+        if upload.sha256 != inspected.sha256:
+            raise UploadError("Upload changed while it was being stored")
+        blob = crud.register_image_blob(ImageBlobModel(
+            _id=upload.sha256,
+            object_name=object_name,
+            bucket_name=bucket_name,
+            size=upload.size,
+            content_type=upload.content_type,
+            created_at=datetime.now(timezone.utc)
+        ))
+    else:
+        logger.info(f"Duplicate upload for post {post_id} stored as a reference to {blob.object_name}")
+
+    image = ImageModel(
+        filename=f"{uuid.uuid4()}{os.path.splitext(filename or '')[1]}",
+        filepath=blob.object_name,
+        # Presigned URLs expire, so they are signed on read rather than stored
+        url="",
+        uploaded_by=user_id,
+        upload_date=datetime.now(timezone.utc),
+        file_size=blob.size,
+        content_type=blob.content_type,
+        post_id=post_id,
+        bucket_name=blob.bucket_name,
+        sha256=blob.id
+    )
+    try:
+        return crud.store_image_reference(image)
+    except Exception:
+        # Don't leave a reference behind for an image that was never recorded
+        _release_blob(blob.id)
+        raise
+
+def _release_blob(sha256: str) -> None:
+    released = crud.release_image_blob(sha256)
+    if released is None or crud.get_existing_image_blob_ids([sha256]):
+        return
+    try:
+        get_minio_client().remove_object(released.bucket_name, released.object_name)
+        presigned_url_cache.invalidate(released.bucket_name, released.object_name)
+        logger.info(f"Removed unreferenced image object: {released.object_name}")
+    except Exception as e:
+        # The orphaned object is left for the storage garbage collector
+        logger.error(f"Failed to remove image object {released.object_name}: {str(e)}")
+
+def delete_image(image_id: str) -> bool:
+    """Delete an image reference, its variants, and its content if unreferenced.
+
+    Returns:
+        bool: True if the image existed.
+    """
+    image = crud.pop_image_reference(image_id)
+    if image is None:
+        return False
+
+    client = get_minio_client()
+    for variant in image.variants:
+        try:
+            client.remove_object(image.bucket_name, variant.object_name)
+        except Exception as e:
+            logger.error(f"Failed to remove image variant {variant.object_name}: {str(e)}")
+
+    if image.sha256 and image.filepath.startswith("blobs/"):
+        _release_blob(image.sha256)
+    elif image.bucket_name and image.filepath:
+        # Images stored before deduplication (or uploaded directly) own their object
+        try:
+            client.remove_object(image.bucket_name, image.filepath)
+        except Exception as e:
+            logger.error(f"Failed to remove image object {image.filepath}: {str(e)}")
+    return True
+
+def _objects_to_remove(image: ImageModel, released_blobs: Dict[Tuple[str, str], str]) -> List[Tuple[str, str]]:
+    """Release an already removed image reference and list the (bucket, object) pairs it leaves unreferenced.
+
+    Objects of released blobs are also added to released_blobs with their
+    SHA-256, to be checked again before they are removed.
+    """
+    objects = [(image.bucket_name, variant.object_name) for variant in image.variants]
+    if image.sha256 and image.filepath.startswith("blobs/"):
+        released = crud.release_image_blob(image.sha256)
+        if released is not None:
+            presigned_url_cache.invalidate(released.bucket_name, released.object_name)
+            objects.append((released.bucket_name, released.object_name))
+            released_blobs[(released.bucket_name, released.object_name)] = released.id
+    elif image.bucket_name and image.filepath:
+        objects.append((image.bucket_name, image.filepath))
+    return objects
+
+def delete_post_images_batch(post_id: str, batch_size: int) -> Dict[str, int]:
+    """Delete up to batch_size images of a post, removing their objects with bulk deletes.
+
+    Each reference is removed atomically before its blob is released, so a
+    batch interrupted part way can be re-run without releasing a blob twice;
+    objects it didn't get to remove are left for the storage garbage collector.
+
+    Returns:
+        Dict[str, int]: How many image references were processed ("images") and objects deleted ("objects").
+    """
+    objects = []
+    released_blobs: Dict[Tuple[str, str], str] = {}
+    images = 0
+    for image_id in crud.get_image_ids_for_post(post_id, limit=batch_size):
+        images += 1
+        image = crud.pop_image_reference(image_id)
+        if image is None:
+            # Deleted concurrently, e.g. through the image endpoint
+            continue
+        objects += _objects_to_remove(image, released_blobs)
+
+    # Keep the content of blobs that a concurrent upload stored again since their release
+    stored_again = crud.get_existing_image_blob_ids(list(set(released_blobs.values())))
+    objects_by_bucket = defaultdict(list)
+    for bucket_name, object_name in objects:
+        if released_blobs.get((bucket_name, object_name)) not in stored_again:
+            objects_by_bucket[bucket_name].append(object_name)
+
+    removed = 0
+    if objects_by_bucket:
+        storage = get_storage()
+        for bucket_name, object_names in objects_by_bucket.items():
+            try:
+                removed += storage.delete_files(bucket_name, object_names)
+            except BulkDeleteError as e:
+                removed += e.deleted
+                logger.error(f"Failed to remove {len(e.errors)} objects of post {post_id}; left for garbage collection")
+            except Exception as e:
+                logger.error(f"Failed to remove objects of post {post_id}: {str(e)}; left for garbage collection")
+    return {"images": images, "objects": removed}
+
@@ -0,0 +1,217 @@
+"""
+Durable background jobs backed by the jobs collection.
+
+enqueue() stores a job document; the JobRunner started from the app
+lifespan claims due jobs with an atomic find_one_and_update, so every job
+runs on one worker at a time even across processes. A claim is a lease the
+runner renews while the handler runs; if the process dies, the job becomes
+claimable again when the lease expires. Failures are retried with
+exponential backoff up to the job type's max_attempts, and each type has its
+own concurrency limit. Finished jobs are kept for JOBS_RETENTION_SECONDS for
+throughput stats and then removed by a TTL index.
+
+Handlers take the job document and may be coroutines or blocking functions
+(run in a worker thread). Because a job can run again after a crash, they
+must be idempotent.
+"""
+import asyncio
+import inspect
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from . import crud
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL_SECONDS", 5))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", 60))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 5))
+JOBS_RETRY_DELAY = float(os.getenv("JOBS_RETRY_DELAY_SECONDS", 5))
+JOBS_MAX_RETRY_DELAY = float(os.getenv("JOBS_MAX_RETRY_DELAY_SECONDS", 3600))
+JOBS_RETENTION_SECONDS = int(os.getenv("JOBS_RETENTION_SECONDS", 86400))
+# Window over which the admin endpoint reports throughput
+JOBS_THROUGHPUT_WINDOW = int(os.getenv("JOBS_THROUGHPUT_WINDOW_SECONDS", 300))
+
+@dataclass
+class JobType:
+    name: str
+    handler: Callable[[dict], Any]
+    concurrency: int = 1
+    max_attempts: int = JOBS_MAX_ATTEMPTS
+    retry_delay: float = JOBS_RETRY_DELAY
+    lease_seconds: float = JOBS_LEASE_SECONDS
+    active: int = 0
+    completed: int = 0
+    failed: int = 0
+    retried: int = 0
+    total_seconds: float = 0.0
+    wake: Optional[asyncio.Event] = field(default=None, repr=False)
+
+class JobRunner:
+    """Runs registered job types from the durable queue with per-type worker tasks."""
+
+    def __init__(self, poll_interval: float = JOBS_POLL_INTERVAL, max_retry_delay: float = JOBS_MAX_RETRY_DELAY,
+                 retention_seconds: int = JOBS_RETENTION_SECONDS):
+        self.poll_interval = poll_interval
+        self.max_retry_delay = max_retry_delay
+        self.retention_seconds = retention_seconds
+        self._types: Dict[str, JobType] = {}
+        self._tasks = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, name: str, handler: Callable[[dict], Any], concurrency: int = 1,
+                 max_attempts: int = JOBS_MAX_ATTEMPTS, retry_delay: float = JOBS_RETRY_DELAY,
+                 lease_seconds: float = JOBS_LEASE_SECONDS) -> None:
+        """Register a handler for a job type; call before start()."""
+        self._types[name] = JobType(name, handler, max(1, concurrency), max_attempts, retry_delay, lease_seconds)
+
+    def enqueue(self, name: str, payload: Dict[str, Any], delay: float = 0, dedupe_key: Optional[str] = None) -> str:
+        """Store a job and wake an idle worker for its type. Blocking.
+
+        Returns:
+            str: The job ID.
+        """
+        job_type = self._types[name]
+        run_at = datetime.now(timezone.utc) + timedelta(seconds=delay) if delay else None
+        job_id = crud.enqueue_job(name, payload, run_at=run_at, max_attempts=job_type.max_attempts, dedupe_key=dedupe_key)
+        if not delay:
+            self.notify(name)
+        return job_id
+
+    def notify(self, name: str) -> None:
+        """Wake the workers of a job type; safe to call from any thread."""
+        job_type = self._types.get(name)
+        if self._loop is None or job_type is None or job_type.wake is None:
+            return
+        self._loop.call_soon_threadsafe(job_type.wake.set)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        await run_in_threadpool(crud.setup_job_indexes, self.retention_seconds)
+        self._loop = asyncio.get_running_loop()
+        for job_type in self._types.values():
+            job_type.wake = asyncio.Event()
+            self._tasks += [asyncio.create_task(self._worker(job_type)) for _ in range(job_type.concurrency)]
+        logger.info(f"Job runner started: {', '.join(f'{t.name} x{t.concurrency}' for t in self._types.values())}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        logger.info("Job runner stopped")
+
+    async def _worker(self, job_type: JobType) -> None:
+        while True:
+            # Cleared before claiming, so a wake-up during the claim isn't lost
+            job_type.wake.clear()
+            try:
+                job = await run_in_threadpool(crud.claim_job, job_type.name, job_type.lease_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to claim {job_type.name} job: {str(e)}")
+                job = None
+            if job is not None:
+                try:
+                    await self.run_job(job_type, job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Recording the outcome failed; the lease expires and the job is retried
+                    logger.error(f"Failed to record outcome of {job_type.name} job {job['_id']}: {str(e)}")
+                continue
+            try:
+                await asyncio.wait_for(job_type.wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def retry_delay(self, job_type: JobType, attempt: int) -> float:
+        return min(job_type.retry_delay * 2 ** (attempt - 1), self.max_retry_delay)
+
+    async def run_job(self, job_type: JobType, job: dict) -> None:
+        """Run one claimed job, renewing its lease until the handler returns."""
+        job_id, attempt = job["_id"], job["attempts"]
+        if attempt > job_type.max_attempts:
+            # Claimed again after its worker died on the last attempt
+            job_type.failed += 1
+            await run_in_threadpool(crud.fail_job, job_id, attempt, job.get("last_error") or "Lease expired on last attempt")
+            return
+        job_type.active += 1
+        renewer = asyncio.create_task(self._renew_lease(job_type, job_id, attempt))
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(job_type.handler):
+                await job_type.handler(job)
+            else:
+                await run_in_threadpool(job_type.handler, job)
+        except asyncio.CancelledError:
+            # Shutting down; the lease expires and another worker resumes the job
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if attempt < job_type.max_attempts:
+                delay = self.retry_delay(job_type, attempt)
+                job_type.retried += 1
+                logger.warning(f"{job_type.name} job {job_id} failed (attempt {attempt}), retrying in {delay:.0f}s: {error}")
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                await run_in_threadpool(crud.fail_job, job_id, attempt, error, retry_at)
+            else:
+                job_type.failed += 1
+                logger.error(f"{job_type.name} job {job_id} failed after {attempt} attempts: {error}")
+                await run_in_threadpool(crud.fail_job, job_id, attempt, error)
+        else:
+            job_type.completed += 1
+            job_type.total_seconds += time.perf_counter() - started
+            if not await run_in_threadpool(crud.complete_job, job_id, attempt):
+                logger.warning(f"{job_type.name} job {job_id} finished after its lease was lost")
+        finally:
+            job_type.active -= 1
+            renewer.cancel()
+
+    async def _renew_lease(self, job_type: JobType, job_id, attempt: int) -> None:
+        while True:
+            await asyncio.sleep(job_type.lease_seconds / 3)
+            try:
+                if not await run_in_threadpool(crud.renew_job_lease, job_id, attempt, job_type.lease_seconds):
+                    logger.warning(f"Lost the lease on {job_type.name} job {job_id}")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to renew lease on {job_type.name} job {job_id}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Per job type counters for this process."""
+        return {
+            job_type.name: {
+                "concurrency": job_type.concurrency,
+                "active": job_type.active,
+                "completed": job_type.completed,
+                "failed": job_type.failed,
+                "retried": job_type.retried,
+                "avg_seconds": job_type.total_seconds / job_type.completed if job_type.completed else None,
+            }
+            for job_type in self._types.values()
+        }
+
+    def get_queue_stats(self) -> Dict[str, dict]:
+        """Queue depth per job type across all workers, with throughput over the last window. Blocking."""
+        since = datetime.now(timezone.utc) - timedelta(seconds=JOBS_THROUGHPUT_WINDOW)
+        stats = crud.get_job_queue_stats(since)
+        for counts in stats.values():
+            counts["throughput_per_minute"] = counts["finished_since"] * 60 / JOBS_THROUGHPUT_WINDOW
+        return stats
+
+job_runner = JobRunner()
@@ -0,0 +1,213 @@
+"""
+Leader election among API workers for singleton tasks.
+
+Every process started from the app lifespan campaigns for one lease document
+in the leases collection. The process holding it is the leader: it runs the
+on_elected startup tasks (such as creating the initial admin) and the
+periodic tasks registered with every(); the others only keep trying to take
+the lease.
+
+The leader renews the lease every third of LEADER_LEASE_SECONDS and steps
+down, cancelling its periodic tasks, as soon as a renewal fails or it can no
+longer renew before the lease would lapse. Shutting down releases the lease
+so a follower takes over on its next attempt rather than after expiry.
+
+Each term has a fencing token that increases with every new leader. Periodic
+runs are recorded on the lease with a write that only matches the current
+token, so a deposed leader that hasn't noticed yet cannot start a run, and
+the last run time survives failover.
+"""
+import asyncio
+import inspect
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from . import crud
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+LEADER_LEASE_NAME = os.getenv("LEADER_LEASE_NAME", "leader")
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", 15))
+
+@dataclass
+class PeriodicTask:
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    runs: int = 0
+    failures: int = 0
+    last_run_at: Optional[datetime] = None
+
+async def _call(func: Callable[[], Any]) -> Any:
+    if inspect.iscoroutinefunction(func):
+        return await func()
+    return await run_in_threadpool(func)
+
+class LeaderElector:
+    """Campaigns for a Mongo lease and runs leader-only tasks while holding it."""
+
+    def __init__(self, name: str = LEADER_LEASE_NAME, lease_seconds: float = LEADER_LEASE_SECONDS,
+                 holder: Optional[str] = None):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.token: Optional[int] = None
+        self.terms = 0
+        self._valid_until = 0.0
+        self._on_elected: List[Callable[[], Any]] = []
+        self._periodic: Dict[str, PeriodicTask] = {}
+        self._leader_tasks: List[asyncio.Task] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+
+    @property
+    def renew_interval(self) -> float:
+        return self.lease_seconds / 3
+
+    def on_elected(self, func: Callable[[], Any]) -> Callable[[], Any]:
+        """Run func (coroutine or blocking function) each time this process becomes leader."""
+        self._on_elected.append(func)
+        return func
+
+    def every(self, name: str, interval: float, func: Callable[[], Any]) -> None:
+        """Run func every interval seconds on whichever process is leader; register before start()."""
+        self._periodic[name] = PeriodicTask(name, func, interval)
+
+    async def start(self) -> None:
+        """Campaign once, running startup tasks if elected, then keep campaigning in the background."""
+        if self._task is not None:
+            return
+        await self.campaign()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            token = self.token
+            await self._step_down()
+            try:
+                await run_in_threadpool(crud.release_lease, self.name, token)
+            except Exception as e:
+                logger.error(f"Failed to release leader lease: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self.campaign()
+
+    async def campaign(self) -> None:
+        """Renew the lease if leading, otherwise try to take it."""
+        # Measured before the request, so the local view of the lease never outlives Mongo's
+        started = time.monotonic()
+        try:
+            if self.is_leader:
+                if await run_in_threadpool(crud.renew_lease, self.name, self.token, self.lease_seconds):
+                    self._valid_until = started + self.lease_seconds
+                else:
+                    logger.warning(f"Lost leader lease (term {self.token}) to another worker")
+                    await self._step_down()
+                return
+            lease = await run_in_threadpool(crud.acquire_lease, self.name, self.holder, self.lease_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Leader election failed: {str(e)}")
+            # Step down while the lease we can't renew is still ours
+            if self.is_leader and time.monotonic() + self.renew_interval >= self._valid_until:
+                logger.warning(f"Stepping down as leader (term {self.token}): lease could not be renewed")
+                await self._step_down()
+            return
+        if lease is not None:
+            await self._become_leader(lease, started)
+
+    async def _become_leader(self, lease: dict, started: float) -> None:
+        self.token = lease["token"]
+        self._valid_until = started + self.lease_seconds
+        self.terms += 1
+        logger.info(f"Elected leader {self.holder} (term {self.token})")
+        for func in self._on_elected:
+            try:
+                await _call(func)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leader startup task {getattr(func, '__name__', func)} failed: {str(e)}")
+        runs = lease.get("runs", {})
+        for task in self._periodic.values():
+            task.last_run_at = runs.get(task.name, task.last_run_at)
+            self._leader_tasks.append(asyncio.create_task(self._run_periodic(task, self.token)))
+
+    async def _step_down(self) -> None:
+        self.token = None
+        for task in self._leader_tasks:
+            task.cancel()
+        await asyncio.gather(*self._leader_tasks, return_exceptions=True)
+        self._leader_tasks = []
+
+    def _due_in(self, task: PeriodicTask) -> float:
+        if task.last_run_at is None:
+            return 0
+        last_run_at = task.last_run_at
+        if last_run_at.tzinfo is None:
+            # pymongo returns naive UTC datetimes
+            last_run_at = last_run_at.replace(tzinfo=timezone.utc)
+        elapsed = (datetime.now(timezone.utc) - last_run_at).total_seconds()
+        return max(0.0, task.interval - elapsed)
+
+    async def _run_periodic(self, task: PeriodicTask, token: int) -> None:
+        while True:
+            await asyncio.sleep(self._due_in(task))
+            try:
+                if not await run_in_threadpool(crud.record_periodic_run, self.name, token, task.name):
+                    # Deposed; the next campaign notices and steps down
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to record run of periodic task {task.name}: {str(e)}")
+                await asyncio.sleep(self.renew_interval)
+                continue
+            task.last_run_at = datetime.now(timezone.utc)
+            try:
+                await _call(task.func)
+                task.runs += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                task.failures += 1
+                logger.error(f"Periodic task {task.name} failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "token": self.token,
+            "terms": self.terms,
+            "lease_seconds": self.lease_seconds,
+            "periodic": {
+                task.name: {
+                    "interval_seconds": task.interval,
+                    "runs": task.runs,
+                    "failures": task.failures,
+                    "last_run_at": task.last_run_at,
+                }
+                for task in self._periodic.values()
+            },
+        }
+
+leader = LeaderElector()
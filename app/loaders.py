@@ -0,0 +1,97 @@
+"""
+Request-scoped loaders that batch and memoize document lookups by ID.
+
+Every load() made during the same event-loop tick is collected and fetched
+with one `$in` query per collection, and each result is remembered for the
+rest of the request, so fetching the same post twice, or the authors of a
+page of posts, costs one query. Handlers get a fresh set of loaders per
+request through the get_loaders dependency:
+
+    async def handler(loaders: Loaders = Depends(get_loaders)):
+        post, parent = await asyncio.gather(loaders.posts.load(post_id), loaders.comments.load(parent_id))
+"""
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from starlette.concurrency import run_in_threadpool
+from . import crud
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+class DataLoader:
+    """Batches load(key) calls made in the same tick into one batch_load call.
+
+    batch_load is a blocking function taking a list of keys and returning a
+    dict of the values found; it runs in a worker thread. Keys it leaves out
+    load as None.
+    """
+
+    def __init__(self, batch_load: Callable[[List[str]], Dict[str, Any]], name: str = ""):
+        self._batch_load = batch_load
+        self.name = name or getattr(batch_load, "__name__", "loader")
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self.batches = 0
+
+    async def load(self, key: Optional[str]) -> Optional[Any]:
+        """Load one value; a None key (an unset reference) loads as None."""
+        if key is None:
+            return None
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                # Dispatch once the loads already scheduled for this tick have queued their keys
+                loop.call_soon(self._schedule_dispatch)
+        # Shielded so one cancelled caller doesn't fail the others sharing the key
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[str]) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: str, value: Any) -> None:
+        """Remember a value that is already known, e.g. one just written."""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._futures[key] = future
+
+    def clear(self, key: str) -> None:
+        """Forget a key, so the next load fetches it again."""
+        self._futures.pop(key, None)
+
+    def _schedule_dispatch(self) -> None:
+        asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        futures = [self._futures[key] for key in keys]
+        self.batches += 1
+        logger.debug(f"Loader {self.name} fetching {len(keys)} keys in one batch")
+        try:
+            found = await run_in_threadpool(self._batch_load, keys)
+        except Exception as e:
+            for key, future in zip(keys, futures):
+                # Failures are not memoized; a later load retries
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in zip(keys, futures):
+            if not future.done():
+                future.set_result(found.get(key))
+
+class Loaders:
+    """The loaders available to one request."""
+
+    def __init__(self):
+        self.users = DataLoader(crud.get_users_by_ids, "users")
+        self.posts = DataLoader(crud.get_posts_by_ids, "posts")
+        self.comments = DataLoader(crud.get_comments_by_ids, "comments")
+
+def get_loaders() -> Loaders:
+    """FastAPI dependency; resolved once per request, so every use shares the same cache."""
+    return Loaders()
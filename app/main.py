@@ -6,6 +6,13 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 from .routes import router
 from .logger import setup_logging, get_logger
+from .object_storage import init_storage, close_storage
+from .image_pipeline import image_pipeline
+from .jobs import job_runner
+from .leader import leader
+from . import cascade  # registers the cascade_delete job
+from . import token_pruning  # registers the prune_tokens job and its schedule
+from . import comment_migration  # registers the migrate_comments job
 from contextlib import asynccontextmanager
 
 # Load environment variables
@@ -17,8 +24,11 @@ load_dotenv()
 setup_logging()
 logger = get_logger(__name__)
 
-# Create initial admin user on startup if it doesn't exist
-async def create_initial_admin():
+# Create initial admin user on startup if it doesn't exist. Runs on the
+# elected leader only, so several workers can't race into duplicate admins.
+# Blocking (pymongo and bcrypt), so the leader runs it in the threadpool.
+@leader.on_elected
+def create_initial_admin():
     admin_email = os.getenv("INITIAL_ADMIN_EMAIL")
     admin_password = os.getenv("INITIAL_ADMIN_PASSWORD")
     
@@ -43,17 +53,32 @@ async def create_initial_admin():
     else:
         logger.warning("Admin credentials not provided in environment variables")
 
+# Index builds only need to run once per cluster
+leader.on_elected(crud.setup_user_indexes)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialization code (before serving requests)
     # setup_logging()
     # logger = get_logger(__name__)
     logger.info("Application startup: Initializing logging")
-    await create_initial_admin()
+    # The leader creates the initial admin before it starts serving
+    await leader.start()
+    try:
+        init_storage()
+    except Exception as e:
+        # Uploads will retry the bucket check on first use
+        logger.error(f"Failed to initialize object storage: {str(e)}")
+    await image_pipeline.start()
+    await job_runner.start()
     
     yield  # This is where the application serves requests
     
     # Cleanup code (after serving requests, before shutdown)
+    await leader.stop()
+    await job_runner.stop()
+    await image_pipeline.stop()
+    close_storage()
     logger.info("Application shutdown")
 
 app = FastAPI(lifespan=lifespan)
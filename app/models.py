@@ -37,8 +37,27 @@ class UserModel(BaseModel):
     is_active: bool = True
     is_admin: bool = False
     tokens: List[str] = []
+    # Incremented on logout-all; tokens carrying an older generation are rejected
+    token_generation: int = 0
     password_history: List[str] = []
 
+class UserPublic(BaseModel):
+    """The public read profile of a user: what anyone may see."""
+    id: Optional[ObjectIdStr] = Field(None, alias='_id')
+    email: EmailStr
+    created_at: datetime
+
+class UserSession(BaseModel):
+    """The session read profile of a user: what authorization and admin
+    listings need, without the password hash, password history or tokens."""
+    id: Optional[ObjectIdStr] = Field(None, alias='_id')
+    email: EmailStr
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
+    is_active: bool = True
+    is_admin: bool = False
+    token_generation: int = 0
+
 class PostModel(BaseModel):
     id: Optional[ObjectIdStr] = Field(None, alias='_id')
     title: str
@@ -62,6 +81,24 @@ class CommentModel(BaseModel):
     is_deleted: bool = False
     body_preview: Optional[str] = None
 
+class ImageVariant(BaseModel):
+    """A resized copy of an uploaded image.
+    
+    Attributes:
+        width (int): The width of the variant in pixels.
+        height (int): The height of the variant in pixels.
+        format (str): The image format, e.g. "webp" or "jpeg".
+        content_type (str): The MIME type of the variant.
+        object_name (str): The object storage key of the variant.
+        file_size (int): The size of the variant in bytes.
+    """
+    width: int
+    height: int
+    format: str
+    content_type: str
+    object_name: str
+    file_size: int
+
 class ImageModel(BaseModel):
     """Model for storing image references.
     
@@ -72,11 +109,19 @@ class ImageModel(BaseModel):
         id (ObjectIdStr): The unique identifier for the image.
         filename (str): The original filename of the image.
         filepath (str): The path where the image is stored.
-        url (str): The URL to access the image.
+        url (str): Unused and left empty; presigned URLs expire, so they are
+            generated from bucket_name and filepath when the image is read.
         uploaded_by (str): The ID of the user who uploaded the image.
         upload_date (datetime): The date and time when the image was uploaded.
         file_size (int): The size of the image file in bytes.
         content_type (str): The MIME type of the image.
+        post_id (str): The ID of the post the image belongs to.
+        bucket_name (str): The object storage bucket holding the image.
+        sha256 (str): Hex-encoded SHA-256 checksum of the image content.
+        status (str): "pending" while a direct upload is outstanding, "ready"
+            once the object is stored and verified, "failed" if verification failed.
+        etag (str): The ETag of the stored object.
+        variants (List[ImageVariant]): Resized copies generated after upload.
     """
     id: Optional[ObjectIdStr] = Field(None, alias='_id')
     filename: str
@@ -86,3 +131,33 @@ class ImageModel(BaseModel):
     upload_date: datetime = Field(default_factory=datetime.utcnow)
     file_size: int
     content_type: str
+    post_id: Optional[str] = None
+    bucket_name: Optional[str] = None
+    sha256: Optional[str] = None
+    status: str = "ready"
+    etag: Optional[str] = None
+    variants: List[ImageVariant] = []
+
+class ImageBlobModel(BaseModel):
+    """Model for a content-addressed image object.
+    
+    Identical uploads share one stored object. Each ImageModel that points at
+    the object holds a reference, and the object is deleted when the last
+    reference is released.
+    
+    Attributes:
+        id (str): The hex-encoded SHA-256 of the content.
+        object_name (str): The object storage key of the content.
+        bucket_name (str): The object storage bucket holding the content.
+        size (int): The size of the content in bytes.
+        content_type (str): The MIME type of the content.
+        ref_count (int): The number of image references to the content.
+        created_at (datetime): When the content was first stored.
+    """
+    id: str = Field(..., alias='_id')
+    object_name: str
+    bucket_name: str
+    size: int
+    content_type: str
+    ref_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
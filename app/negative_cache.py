@@ -0,0 +1,80 @@
+"""
+Bounded cache of IDs recently looked up and not found.
+
+Requests for deleted posts or broken links tend to repeat; once an ID has
+missed, further lookups answer "not found" from memory for a short TTL
+instead of querying MongoDB. crud discards an ID when a document with it is
+created and records it when the document is deleted.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from dotenv import load_dotenv
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", 30))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+
+class NegativeCache:
+    """TTL + LRU set of keys known not to exist."""
+
+    def __init__(self, ttl: float = NEGATIVE_CACHE_TTL, max_entries: int = NEGATIVE_CACHE_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._expiry.get(key)
+            if expires_at is not None and expires_at > self._clock():
+                self._hits += 1
+                return True
+            if expires_at is not None:
+                del self._expiry[key]
+            self._misses += 1
+            return False
+
+    def add(self, key: str) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._expiry[key] = self._clock() + self.ttl
+            self._expiry.move_to_end(key)
+            while len(self._expiry) > self.max_entries:
+                self._expiry.popitem(last=False)
+                self._evictions += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expiry.clear()
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._expiry),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else None,
+            "evictions": self._evictions,
+        }
+
+# Post IDs that recently matched no post
+missing_posts = NegativeCache()
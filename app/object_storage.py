@@ -1,8 +1,24 @@
 import os
-import logging
-from logging.handlers import RotatingFileHandler
+import hashlib
+import io
+import time
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import certifi
+import urllib3
 from minio import Minio
+from minio.datatypes import Object
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
 from dotenv import load_dotenv
+from .logger import get_logger
+
+logger = get_logger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -15,89 +31,638 @@ MINIO_CONFIG = {
     "endpoint": os.getenv("MINIO_ENDPOINT", "localhost:9000"),
     "access_key": os.getenv("ACCESS_KEY", "miniouser"),
     "secret_key": os.getenv("SECRET_KEY", "pa55word"),
-    "secure": os.getenv("MINIO_SECURE", "false").lower() == "true"
+    "secure": os.getenv("MINIO_SECURE", "false").lower() == "true",
+    # Setting the region avoids a GetBucketLocation round trip before signing
+    "region": os.getenv("S3_REGION") or None
+}
+
+# Connection pool settings for the shared MinIO client
+POOL_CONFIG = {
+    "maxsize": int(os.getenv("MINIO_POOL_MAXSIZE", 20)),
+    "connect_timeout": float(os.getenv("MINIO_CONNECT_TIMEOUT", 5)),
+    "read_timeout": float(os.getenv("MINIO_READ_TIMEOUT", 60)),
+    "retries": int(os.getenv("MINIO_RETRIES", 3))
+}
+
+# Bucket holding post images
+IMAGE_BUCKET = os.getenv("S3_IMAGE_BUCKET", "blog-images")
+
+# Upload limits. Uploads are streamed to storage in parts of UPLOAD_PART_SIZE
+# bytes (S3 requires at least 5 MiB per multipart part), so memory use is
+# bounded by the part size rather than by the size of the file.
+MAX_UPLOAD_SIZE = int(os.getenv("S3_MAX_CONTENT_LENGTH", 10 * 1024 * 1024))
+UPLOAD_PART_SIZE = max(int(os.getenv("S3_UPLOAD_PART_SIZE", 5 * 1024 * 1024)), 5 * 1024 * 1024)
+ALLOWED_IMAGE_TYPES = {
+    t.strip() for t in os.getenv("S3_ALLOWED_IMAGE_TYPES", "image/jpeg,image/png,image/gif,image/webp").split(",") if t.strip()
 }
 
+# Magic numbers used to sniff the content type from the first bytes of an upload
+_CONTENT_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+]
+_SNIFF_SIZE = 512
+
+# Lifetime of presigned PUT URLs handed out for direct-to-storage uploads
+UPLOAD_URL_EXPIRES = timedelta(seconds=int(os.getenv("S3_UPLOAD_URL_EXPIRES_SECONDS", 15 * 60)))
+
+# Presigned GET URLs are cached and reused until they are within the refresh
+# window of their expiry, so repeated renders hand out the same URL.
+PRESIGNED_URL_EXPIRES = timedelta(seconds=int(os.getenv("S3_PRESIGNED_URL_EXPIRES_SECONDS", 7 * 24 * 60 * 60)))
+PRESIGNED_URL_REFRESH_WINDOW = timedelta(seconds=int(os.getenv("S3_PRESIGNED_URL_REFRESH_SECONDS", 24 * 60 * 60)))
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv("S3_PRESIGNED_URL_CACHE_SIZE", 10000))
+
+# Bulk operations: S3 accepts at most 1000 keys per multi-object delete, and
+# concurrent stat requests are capped to stay within the connection pool.
+DELETE_BATCH_SIZE = 1000
+STAT_WORKERS = int(os.getenv("S3_STAT_WORKERS", 8))
+
+# MockMinioClient keeps at most this many bytes of each object it stores
+_MOCK_MAX_STORED_BYTES = 1024 * 1024
+
+class _MockResponse(io.BytesIO):
+    """Stand-in for the urllib3 response returned by Minio.get_object."""
+    def release_conn(self):
+        pass
+
 class MockMinioClient:
     """A mock MinioClient that doesn't make real connections during tests"""
     def __init__(self, *args, **kwargs):
         self.uploaded_files = {}
+        self.buckets = set()
+        self.calls = Counter()
+        self._http = None
     def bucket_exists(self, bucket_name):
-        return True
+        self.calls["bucket_exists"] += 1
+        return bucket_name in self.buckets
     def make_bucket(self, bucket_name, *args, **kwargs):
+        self.calls["make_bucket"] += 1
+        self.buckets.add(bucket_name)
         return True
-    def put_object(self, bucket_name, object_name, data, length, content_type):
+    def put_object(self, bucket_name, object_name, data, length, content_type="application/octet-stream",
+                   metadata=None, part_size=0, num_parallel_uploads=3, **kwargs):
+        self.calls["put_object"] += 1
+        # Consume the stream the way the real client does (one part at a time)
+        # without keeping more than the first _MOCK_MAX_STORED_BYTES, so tests
+        # can exercise streaming uploads of large files.
+        chunk_size = part_size or UPLOAD_PART_SIZE
+        remaining = length
+        received = 0
+        stored = b""
+        md5 = hashlib.md5()
+        while remaining != 0:
+            chunk = data.read(chunk_size if remaining < 0 else min(chunk_size, remaining))
+            if not chunk:
+                break
+            received += len(chunk)
+            md5.update(chunk)
+            if len(stored) < _MOCK_MAX_STORED_BYTES:
+                stored += chunk[:_MOCK_MAX_STORED_BYTES - len(stored)]
+            if remaining > 0:
+                remaining -= len(chunk)
         self.uploaded_files[(bucket_name, object_name)] = {
-            "data_length": length,
-            "content_type": content_type
+            "data_length": received,
+            "content_type": content_type,
+            "metadata": metadata or {},
+            "data": stored,
+            "etag": md5.hexdigest(),
+            "last_modified": datetime.now(timezone.utc)
         }
         return True
+    def fput_object(self, bucket_name, object_name, file_path, content_type="application/octet-stream", *args, **kwargs):
+        with open(file_path, "rb") as data:
+            return self.put_object(bucket_name, object_name, data, os.path.getsize(file_path), content_type=content_type)
+    def fget_object(self, bucket_name, object_name, file_path, *args, **kwargs):
+        self.calls["fget_object"] += 1
+        with open(file_path, "wb") as output:
+            output.write(self._get_stored(bucket_name, object_name)["data"])
     def presigned_get_object(self, bucket_name, object_name, expires):
+        self.calls["presigned_get_object"] += 1
         return f"http://test-minio-server/{bucket_name}/{object_name}"
+    def presigned_put_object(self, bucket_name, object_name, expires):
+        self.calls["presigned_put_object"] += 1
+        return f"http://test-minio-server/{bucket_name}/{object_name}?upload=1"
+    def _get_stored(self, bucket_name, object_name):
+        stored = self.uploaded_files.get((bucket_name, object_name))
+        if stored is None:
+            raise S3Error("NoSuchKey", "Object does not exist", f"/{bucket_name}/{object_name}",
+                          None, None, None, bucket_name=bucket_name, object_name=object_name)
+        return stored
+    def stat_object(self, bucket_name, object_name, *args, **kwargs):
+        self.calls["stat_object"] += 1
+        stored = self._get_stored(bucket_name, object_name)
+        return Object(
+            bucket_name,
+            object_name,
+            last_modified=stored["last_modified"],
+            etag=stored["etag"],
+            size=stored["data_length"],
+            metadata=stored["metadata"],
+            content_type=stored["content_type"]
+        )
+    def get_object(self, bucket_name, object_name, offset=0, length=0, *args, **kwargs):
+        self.calls["get_object"] += 1
+        data = self._get_stored(bucket_name, object_name)["data"]
+        end = offset + length if length else None
+        return _MockResponse(data[offset:end])
+    def remove_object(self, bucket_name, object_name, *args, **kwargs):
+        self.calls["remove_object"] += 1
+        self.uploaded_files.pop((bucket_name, object_name), None)
+    def list_objects(self, bucket_name, prefix=None, recursive=False, start_after=None, *args, **kwargs):
+        self.calls["list_objects"] += 1
+        names = sorted(name for bucket, name in self.uploaded_files if bucket == bucket_name)
+        for name in names:
+            if prefix and not name.startswith(prefix):
+                continue
+            if start_after and name <= start_after:
+                continue
+            stored = self.uploaded_files[(bucket_name, name)]
+            yield Object(
+                bucket_name,
+                name,
+                last_modified=stored["last_modified"],
+                etag=stored["etag"],
+                size=stored["data_length"],
+                content_type=stored["content_type"]
+            )
+    def remove_objects(self, bucket_name, delete_object_list, *args, **kwargs):
+        self.calls["remove_objects"] += 1
+        for delete_object in delete_object_list:
+            self.uploaded_files.pop((bucket_name, delete_object._name), None)
+        return iter([])
     # Add any other mock methods as needed for tests
 
-def get_minio_client():
-    """
-    Create and return a configured MinioClient instance
-    In test mode, returns a MockMinioClient
-    """
-    if TESTING:
+# Process-wide storage client, created by init_storage() in the app lifespan
+_client = None
+_storage = None
+_client_lock = threading.Lock()
+
+def _is_testing() -> bool:
+    # Read at call time so test modules can enable the mock after import
+    return TESTING or os.getenv("TESTING", "false").lower() == "true"
+
+def _create_http_client() -> urllib3.PoolManager:
+    """Create the urllib3 pool shared by all storage requests in this process."""
+    return urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=POOL_CONFIG["connect_timeout"], read=POOL_CONFIG["read_timeout"]),
+        maxsize=POOL_CONFIG["maxsize"],
+        # Wait for a free connection instead of opening throwaway ones under load
+        block=True,
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        retries=urllib3.Retry(
+            total=POOL_CONFIG["retries"],
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
+
+def _create_client():
+    if _is_testing():
         return MockMinioClient()
     return Minio(
         endpoint=MINIO_CONFIG["endpoint"],
         access_key=MINIO_CONFIG["access_key"],
         secret_key=MINIO_CONFIG["secret_key"],
-        secure=MINIO_CONFIG["secure"]
+        secure=MINIO_CONFIG["secure"],
+        region=MINIO_CONFIG["region"],
+        http_client=_create_http_client()
+    )
+
+def get_minio_client():
+    """
+    Return the process-wide MinioClient instance, creating it on first use.
+    In test mode, returns a MockMinioClient
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+                logger.info(f"Storage client created: {type(_client).__name__}")
+    return _client
+
+class BucketRegistry:
+    """Remembers which buckets are known to exist.
+
+    Buckets are checked (and created if missing) once, normally at startup, so
+    the upload path doesn't pay a bucket_exists round trip per request.
+    """
+    def __init__(self):
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, bucket_name: str) -> None:
+        """Make sure a bucket exists, hitting storage only the first time."""
+        if bucket_name in self._known:
+            return
+        with self._lock:
+            if bucket_name in self._known:
+                return
+            client = get_minio_client()
+            if not client.bucket_exists(bucket_name):
+                client.make_bucket(bucket_name)
+                logger.info(f"Created bucket: {bucket_name}")
+            self._known.add(bucket_name)
+
+    def known_buckets(self) -> list:
+        return sorted(self._known)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._known.clear()
+
+bucket_registry = BucketRegistry()
+
+class PresignedUrlCache:
+    """Bounded LRU cache of presigned GET URLs keyed by (bucket, object).
+
+    A cached URL is returned until it is within refresh_window of its expiry,
+    after which it is re-signed. Keeping URLs stable between requests lets
+    browsers and CDNs cache the images they point to.
+    """
+    def __init__(self, maxsize: int = PRESIGNED_URL_CACHE_SIZE, expires: timedelta = PRESIGNED_URL_EXPIRES,
+                 refresh_window: timedelta = PRESIGNED_URL_REFRESH_WINDOW, clock=time.monotonic):
+        if refresh_window >= expires:
+            raise ValueError("refresh_window must be shorter than expires")
+        self.maxsize = maxsize
+        self.expires = expires
+        self._reuse_for = (expires - refresh_window).total_seconds()
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Tuple[str, str], now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or now >= entry[1]:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key: Tuple[str, str], url: str, now: float) -> None:
+        self._entries[key] = (url, now + self._reuse_for)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_url(self, bucket_name: str, object_name: str, client=None) -> str:
+        """Return a presigned GET URL for an object, signing only when needed."""
+        return self.get_urls([(bucket_name, object_name)], client=client)[(bucket_name, object_name)]
+
+    def get_urls(self, keys: Iterable[Tuple[str, str]], client=None) -> Dict[Tuple[str, str], str]:
+        """Return presigned GET URLs for many (bucket, object) keys in one call.
+
+        Cached URLs are reused and only the missing or expiring ones are signed.
+        Signing is a local HMAC computation, so no storage round trips are made.
+        """
+        client = client or get_minio_client()
+        urls = {}
+        with self._lock:
+            now = self._clock()
+            for key in keys:
+                if key in urls:
+                    continue
+                url = self._lookup(key, now)
+                if url is None:
+                    self.misses += 1
+                    url = client.presigned_get_object(key[0], key[1], expires=self.expires)
+                    self._store(key, url, now)
+                else:
+                    self.hits += 1
+                urls[key] = url
+        return urls
+
+    def invalidate(self, bucket_name: str, object_name: str) -> None:
+        with self._lock:
+            self._entries.pop((bucket_name, object_name), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+presigned_url_cache = PresignedUrlCache()
+
+def init_storage(buckets: Optional[Iterable[str]] = None):
+    """Create the shared storage client and register the application buckets.
+
+    Called once from the FastAPI lifespan.
+    """
+    client = get_minio_client()
+    for bucket_name in buckets or [IMAGE_BUCKET]:
+        bucket_registry.ensure(bucket_name)
+    logger.info(f"Storage initialized with buckets: {', '.join(bucket_registry.known_buckets())}")
+    return client
+
+def close_storage() -> None:
+    """Release the shared client's pooled connections. Called on shutdown."""
+    global _client, _storage
+    with _client_lock:
+        http = getattr(_client, "_http", None)
+        if http is not None:
+            http.clear()
+        _client = None
+        _storage = None
+    bucket_registry.clear()
+    presigned_url_cache.clear()
+    logger.info("Storage client closed")
+
+def get_pool_stats() -> dict:
+    """Report connection pool usage of the shared storage client."""
+    client = _client
+    stats = {
+        "client": type(client).__name__ if client is not None else None,
+        "maxsize": POOL_CONFIG["maxsize"],
+        "buckets": bucket_registry.known_buckets(),
+        "presigned_url_cache": presigned_url_cache.stats(),
+        "pools": []
+    }
+    http = getattr(client, "_http", None)
+    if http is None:
+        return stats
+    for key in list(http.pools.keys()):
+        pool = http.pools.get(key)
+        if pool is None:
+            continue
+        stats["pools"].append({
+            "host": pool.host,
+            "port": pool.port,
+            "connections_opened": pool.num_connections,
+            "requests": pool.num_requests,
+            "idle_connections": pool.pool.qsize() if pool.pool is not None else 0
+        })
+    return stats
+
+class UploadError(Exception):
+    """Base class for errors raised while streaming an upload to storage."""
+
+class UploadTooLargeError(UploadError):
+    """Raised when an upload exceeds the configured maximum size."""
+
+class UploadSizeMismatchError(UploadError):
+    """Raised when an uploaded object's size differs from the declared size."""
+
+class UnsupportedContentTypeError(UploadError):
+    """Raised when the content type is not allowed or contradicts the declared one."""
+
+@dataclass
+class UploadResult:
+    """Result of a streamed upload.
+
+    Attributes:
+        object_name (str): The name of the stored object.
+        size (int): Number of bytes written.
+        sha256 (str): Hex-encoded SHA-256 of the uploaded content.
+        content_type (str): The sniffed (or declared) content type.
+    """
+    object_name: str
+    size: int
+    sha256: str
+    content_type: str
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Guess a content type from the first bytes of a file using magic numbers."""
+    for signature, content_type in _CONTENT_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts bytes as they are read.
+
+    The bytes already consumed for content sniffing are replayed first, then
+    reads are delegated to the underlying file. Reading past max_size raises
+    UploadTooLargeError, which aborts the multipart upload.
+    """
+    def __init__(self, fileobj, head: bytes, max_size: int):
+        self._fileobj = fileobj
+        self._head = head
+        self._max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            if size is None or size < 0:
+                chunk, self._head = self._head + self._fileobj.read(), b""
+            else:
+                chunk, self._head = self._head[:size], self._head[size:]
+                if len(chunk) < size:
+                    chunk += self._fileobj.read(size - len(chunk))
+        else:
+            chunk = self._fileobj.read(size)
+        self.size += len(chunk)
+        if self.size > self._max_size:
+            raise UploadTooLargeError(f"Upload exceeds maximum size of {self._max_size} bytes")
+        self.sha256.update(chunk)
+        return chunk
+
+# Declared types that say nothing about the content
+_GENERIC_CONTENT_TYPES = {"application/octet-stream", "binary/octet-stream"}
+_CONTENT_TYPE_ALIASES = {"image/jpg": "image/jpeg", "image/pjpeg": "image/jpeg"}
+
+def _normalize_content_type(content_type: Optional[str]) -> Optional[str]:
+    base = (content_type or "").split(";")[0].strip().lower()
+    if not base or base in _GENERIC_CONTENT_TYPES:
+        return None
+    return _CONTENT_TYPE_ALIASES.get(base, base)
+
+def _read_head(fileobj, declared_content_type: Optional[str], allowed_content_types: Optional[Iterable[str]]):
+    head = fileobj.read(_SNIFF_SIZE)
+    sniffed = sniff_content_type(head)
+    declared = _normalize_content_type(declared_content_type)
+    if allowed_content_types is None:
+        return head, sniffed or declared or "application/octet-stream"
+    # The bytes decide; the declared type is only checked against them
+    if sniffed is None or sniffed not in allowed_content_types:
+        raise UnsupportedContentTypeError(f"Content type '{sniffed or declared or 'unknown'}' is not allowed")
+    if declared is not None and declared != sniffed:
+        raise UnsupportedContentTypeError(f"Declared content type '{declared}' does not match the content ({sniffed})")
+    return head, sniffed
+
+def inspect_upload(fileobj, declared_content_type: Optional[str] = None, max_size: int = MAX_UPLOAD_SIZE,
+                   allowed_content_types: Optional[Iterable[str]] = None, chunk_size: int = 1024 * 1024) -> UploadResult:
+    """Hash, measure and sniff a local upload without sending it anywhere.
+
+    Used to look up content-addressed blobs before deciding whether an upload
+    needs to be written to storage at all. The file is read in chunks and
+    rewound afterwards. This function blocks; call it from a worker thread.
+
+    Returns:
+        UploadResult: Size, SHA-256 and content type; object_name is empty.
+
+    Raises:
+        UploadTooLargeError: If the file is larger than max_size.
+        UnsupportedContentTypeError: If the content type is not allowed.
+    """
+    head, content_type = _read_head(fileobj, declared_content_type, allowed_content_types)
+    reader = _HashingReader(fileobj, head, max_size)
+    while reader.read(chunk_size):
+        pass
+    fileobj.seek(0)
+    return UploadResult(
+        object_name="",
+        size=reader.size,
+        sha256=reader.sha256.hexdigest(),
+        content_type=content_type
+    )
+
+def stream_upload(client, bucket_name: str, object_name: str, fileobj, declared_content_type: Optional[str] = None,
+                  max_size: int = MAX_UPLOAD_SIZE, allowed_content_types: Optional[Iterable[str]] = None,
+                  part_size: int = UPLOAD_PART_SIZE) -> UploadResult:
+    """Stream a file-like object to object storage using a multipart upload.
+
+    The file is read in part_size chunks, so memory stays bounded regardless of
+    the file size. Size and SHA-256 are computed while the data is sent, and
+    the content type is sniffed from the first bytes before the upload starts.
+    This function blocks; call it from a worker thread in async code.
+
+    Args:
+        client: The Minio (or MockMinioClient) instance to upload with.
+        bucket_name (str): The destination bucket.
+        object_name (str): The destination object name.
+        fileobj: A readable binary file object, e.g. UploadFile.file.
+        declared_content_type (str, optional): The client-supplied content type.
+            With allowed_content_types it must match the sniffed type;
+            otherwise it is used when the type can't be sniffed.
+        max_size (int, optional): Maximum number of bytes accepted.
+        allowed_content_types (Iterable[str], optional): If given, uploads whose
+            sniffed content type is not in this set are rejected before any
+            data is sent.
+        part_size (int, optional): Multipart part size in bytes.
+
+    Returns:
+        UploadResult: Size, checksum and content type of the stored object.
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than max_size.
+        UnsupportedContentTypeError: If the content type is not allowed.
+    """
+    head, content_type = _read_head(fileobj, declared_content_type, allowed_content_types)
+    reader = _HashingReader(fileobj, head, max_size)
+    logger.debug(f"Streaming upload to '{bucket_name}/{object_name}' as {content_type}")
+    client.put_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=reader,
+        length=-1,
+        content_type=content_type,
+        part_size=part_size,
+        # A single upload thread keeps at most one part in memory at a time
+        num_parallel_uploads=1
     )
+    result = UploadResult(
+        object_name=object_name,
+        size=reader.size,
+        sha256=reader.sha256.hexdigest(),
+        content_type=content_type
+    )
+    logger.info(f"Streamed {result.size} bytes to '{bucket_name}/{object_name}'")
+    return result
+
+def verify_uploaded_object(client, bucket_name: str, object_name: str, expected_size: int,
+                           expected_content_type: str, max_size: int = MAX_UPLOAD_SIZE) -> Object:
+    """Check an object uploaded directly by a client through a presigned PUT URL.
+
+    Presigned PUT URLs can't enforce size or content type themselves, so the
+    object is checked with stat_object and a ranged read of its first bytes.
+    This function blocks; call it from a worker thread in async code.
+
+    Returns:
+        Object: The stat result of the verified object.
+
+    Raises:
+        S3Error: If the object can't be found (code "NoSuchKey").
+        UploadTooLargeError: If the object is larger than allowed.
+        UploadSizeMismatchError: If the object is shorter or longer than declared.
+        UnsupportedContentTypeError: If the stored or sniffed type doesn't match.
+    """
+    stat = client.stat_object(bucket_name, object_name)
+    if stat.size > max_size:
+        raise UploadTooLargeError(f"Uploaded object is {stat.size} bytes (max {max_size})")
+    if stat.size != expected_size:
+        raise UploadSizeMismatchError(f"Uploaded object is {stat.size} bytes, expected {expected_size}")
+    if stat.content_type != expected_content_type:
+        raise UnsupportedContentTypeError(
+            f"Uploaded object has content type '{stat.content_type}', expected '{expected_content_type}'"
+        )
+    response = client.get_object(bucket_name, object_name, offset=0, length=_SNIFF_SIZE)
+    try:
+        head = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    sniffed = sniff_content_type(head)
+    if sniffed != expected_content_type:
+        raise UnsupportedContentTypeError(
+            f"Uploaded object content looks like '{sniffed}', expected '{expected_content_type}'"
+        )
+    return stat
+
+class StorageError(Exception):
+    """Raised when an object storage operation fails."""
+
+class BucketNotFoundError(StorageError):
+    """Raised when the bucket doesn't exist."""
+
+class ObjectNotFoundError(StorageError):
+    """Raised when the object doesn't exist."""
+
+class BulkDeleteError(StorageError):
+    """Raised when some objects in a bulk delete could not be removed.
+
+    Attributes:
+        errors (list): The DeleteError for each object that was not removed.
+        deleted (int): How many objects were removed.
+    """
+    def __init__(self, message: str, errors: list, deleted: int):
+        super().__init__(message)
+        self.errors = errors
+        self.deleted = deleted
+
+def _storage_error(e: Exception, message: str) -> StorageError:
+    """Translate a client exception into the matching StorageError."""
+    if isinstance(e, StorageError):
+        return e
+    code = getattr(e, "code", None)
+    if code == "NoSuchBucket":
+        return BucketNotFoundError(f"{message}: bucket does not exist")
+    if code == "NoSuchKey":
+        return ObjectNotFoundError(f"{message}: object does not exist")
+    return StorageError(f"{message}: {str(e)}")
+
+def _object_metadata(stat) -> dict:
+    return {
+        'size': stat.size,
+        'last_modified': stat.last_modified,
+        'etag': stat.etag,
+        'content_type': stat.content_type,
+        'metadata': stat.metadata
+    }
 
 class MinioStorage:
     def __init__(self, client=None):
-        self.logger = self._setup_logger()
+        # The module logger, configured once by setup_logging()
+        self.logger = logger
         self.client = client or get_minio_client()
-        self.logger.info(f"MinioStorage initialized with endpoint: {MINIO_CONFIG['endpoint']}")
-
-    def _setup_logger(self) -> logging.Logger:
-        log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
-        log_file = os.getenv("LOG_FILE", "minio_operations.log")
-        log_format = os.getenv("LOG_FORMAT", "%(asctime)s.%(msecs)03d [%(levelname)s] %(name)s - %(message)s")
-        log_date_format = os.getenv("LOG_DATE_FORMAT", "%Y-%m-%d %H:%M:%S")
-        log_max_bytes = int(os.getenv("LOG_MAX_BYTES", 10485760))
-        log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", 5))
-        log_level_map = {
-            "DEBUG": logging.DEBUG,
-            "INFO": logging.INFO,
-            "WARNING": logging.WARNING,
-            "ERROR": logging.ERROR,
-            "CRITICAL": logging.CRITICAL
-        }
-        log_level = log_level_map.get(log_level_str, logging.INFO)
-        logger = logging.getLogger("minio_storage")
-        logger.setLevel(log_level)
-        if logger.hasHandlers():
-            logger.handlers.clear()
-        file_handler = RotatingFileHandler(
-            filename=log_file,
-            maxBytes=log_max_bytes,
-            backupCount=log_backup_count
-        )
-        file_handler.setLevel(log_level)
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(log_level)
-        formatter = logging.Formatter(log_format, log_date_format)
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        logger.debug(f"Logger initialized with level: {log_level_str}, file: {log_file}")
-        return logger
+        self.logger.debug(f"MinioStorage initialized with endpoint: {MINIO_CONFIG['endpoint']}")
 
     # ...existing code from MinioClient methods, adapted to use self.client...
-    def store_file(self, bucket_name: str, source_file: str, destination_file: str) -> object:
+    def store_file(self, bucket_name: str, source_file: str, destination_file: str) -> Tuple[str, str]:
         self.logger.info(f"Attempting to store file '{source_file}' as '{destination_file}' in bucket '{bucket_name}'")
         if not self.client.bucket_exists(bucket_name):
             error_msg = f"Bucket '{bucket_name}' does not exist."
             self.logger.error(error_msg)
-            raise Exception(error_msg)
+            raise BucketNotFoundError(error_msg)
         try:
             result = self.client.fput_object(bucket_name, destination_file, source_file)
             self.logger.info(f"File '{source_file}' successfully uploaded as '{destination_file}' in bucket '{bucket_name}'")
@@ -105,7 +670,7 @@ class MinioStorage:
             return (result.object_name, result.etag)
         except Exception as e:
             self.logger.error(f"Failed to upload file '{source_file}': {str(e)}", exc_info=True)
-            return None
+            raise _storage_error(e, f"Failed to upload file '{source_file}'") from e
     def create_bucket(self, bucket_name: str) -> None:
         self.logger.info(f"Attempting to create bucket '{bucket_name}'")
         if self.client.bucket_exists(bucket_name):
@@ -116,6 +681,7 @@ class MinioStorage:
             self.logger.info(f"Bucket '{bucket_name}' created successfully")
         except Exception as e:
             self.logger.error(f"Failed to create bucket '{bucket_name}': {str(e)}", exc_info=True)
+            raise _storage_error(e, f"Failed to create bucket '{bucket_name}'") from e
     def get_bucket_names(self) -> list:
         self.logger.info("Retrieving list of all buckets")
         try:
@@ -125,7 +691,7 @@ class MinioStorage:
             return bucket_names
         except Exception as e:
             self.logger.error(f"Failed to retrieve bucket list: {str(e)}", exc_info=True)
-            return []
+            raise _storage_error(e, "Failed to retrieve bucket list") from e
     def delete_bucket(self, bucket_name: str) -> None:
         self.logger.info(f"Attempting to delete bucket '{bucket_name}'")
         try:
@@ -133,6 +699,7 @@ class MinioStorage:
             self.logger.info(f"Bucket '{bucket_name}' deleted successfully")
         except Exception as e:
             self.logger.error(f"Failed to delete bucket '{bucket_name}': {str(e)}", exc_info=True)
+            raise _storage_error(e, f"Failed to delete bucket '{bucket_name}'") from e
     def download_object(self, bucket_name: str, object_name: str, destination_file: str) -> None:
         self.logger.info(f"Attempting to download object '{object_name}' from bucket '{bucket_name}' to '{destination_file}'")
         try:
@@ -140,6 +707,7 @@ class MinioStorage:
             self.logger.info(f"File '{object_name}' successfully downloaded as '{destination_file}'")
         except Exception as e:
             self.logger.error(f"Failed to download object '{object_name}': {str(e)}", exc_info=True)
+            raise _storage_error(e, f"Failed to download object '{object_name}'") from e
     def get_object(self, bucket_name: str, object_name: str) -> object:
         self.logger.info(f"Getting object '{object_name}' from bucket '{bucket_name}'")
         try:
@@ -148,7 +716,7 @@ class MinioStorage:
             return obj
         except Exception as e:
             self.logger.error(f"Failed to get object '{object_name}': {str(e)}", exc_info=True)
-            return None
+            raise _storage_error(e, f"Failed to get object '{object_name}'") from e
     def delete_file(self, bucket_name: str, object_name: str) -> None:
         self.logger.info(f"Attempting to delete object '{object_name}' from bucket '{bucket_name}'")
         try:
@@ -156,18 +724,66 @@ class MinioStorage:
             self.logger.info(f"Object '{object_name}' deleted successfully from bucket '{bucket_name}'")
         except Exception as e:
             self.logger.error(f"Failed to delete object '{object_name}': {str(e)}", exc_info=True)
-    def get_file_names(self, bucket_name: str) -> list:
-        self.logger.info(f"Listing all objects in bucket '{bucket_name}'")
+            raise _storage_error(e, f"Failed to delete object '{object_name}'") from e
+    def delete_files(self, bucket_name: str, object_names: Iterable[str], batch_size: int = DELETE_BATCH_SIZE) -> int:
+        """Delete many objects using multi-object delete requests.
+
+        object_names may be any iterable, including a generator; it is consumed
+        batch_size names at a time. Every batch is attempted even if earlier
+        ones had failures, which are reported together at the end.
+
+        Returns:
+            int: The number of objects deleted.
+
+        Raises:
+            BulkDeleteError: If any object could not be deleted.
+        """
+        batch_size = max(1, min(batch_size, DELETE_BATCH_SIZE))
+        self.logger.info(f"Deleting objects from bucket '{bucket_name}' in batches of {batch_size}")
+        deleted = 0
+        errors = []
+        names = iter(object_names)
+        while True:
+            batch = list(islice(names, batch_size))
+            if not batch:
+                break
+            try:
+                # remove_objects is lazy; the request is only sent while its errors are iterated
+                batch_errors = list(self.client.remove_objects(bucket_name, [DeleteObject(name) for name in batch]))
+            except Exception as e:
+                self.logger.error(f"Failed to delete batch of {len(batch)} objects: {str(e)}", exc_info=True)
+                raise _storage_error(e, f"Failed to delete objects from bucket '{bucket_name}'") from e
+            for error in batch_errors:
+                self.logger.error(f"Failed to delete object '{error.name}': {error.code} {error.message}")
+            errors.extend(batch_errors)
+            deleted += len(batch) - len(batch_errors)
+            self.logger.debug(f"Deleted batch of {len(batch) - len(batch_errors)} objects from bucket '{bucket_name}'")
+        self.logger.info(f"Deleted {deleted} objects from bucket '{bucket_name}'")
+        if errors:
+            raise BulkDeleteError(f"Failed to delete {len(errors)} objects from bucket '{bucket_name}'", errors, deleted)
+        return deleted
+    def iter_objects(self, bucket_name: str, prefix: Optional[str] = None, start_after: Optional[str] = None,
+                     recursive: bool = True) -> Iterator[Object]:
+        """Lazily list the objects in a bucket, in name order.
+
+        The listing is fetched a page at a time as it is iterated, so memory
+        use doesn't grow with the size of the bucket. Pass the last name seen
+        as start_after to resume an interrupted listing.
+        """
+        self.logger.info(f"Listing objects in bucket '{bucket_name}' (prefix={prefix}, start_after={start_after})")
+        count = 0
         try:
-            file_names = []
-            objects = self.client.list_objects(bucket_name)
-            for obj in objects:
-                file_names.append(obj.object_name)
-            self.logger.debug(f"Retrieved {len(file_names)} objects from bucket '{bucket_name}'")
-            return file_names
+            for obj in self.client.list_objects(bucket_name, prefix=prefix, recursive=recursive, start_after=start_after):
+                count += 1
+                yield obj
         except Exception as e:
             self.logger.error(f"Failed to list objects in bucket '{bucket_name}': {str(e)}", exc_info=True)
-            return None
+            raise _storage_error(e, f"Failed to list objects in bucket '{bucket_name}'") from e
+        self.logger.debug(f"Listed {count} objects from bucket '{bucket_name}'")
+    def get_file_names(self, bucket_name: str, prefix: Optional[str] = None, start_after: Optional[str] = None) -> Iterator[str]:
+        """Lazily yield the object names in a bucket; see iter_objects."""
+        for obj in self.iter_objects(bucket_name, prefix=prefix, start_after=start_after):
+            yield obj.object_name
     def get_file_info(self, bucket_name: str, object_name: str) -> dict:
         self.logger.info(f"Getting info for object '{object_name}' in bucket '{bucket_name}'")
         try:
@@ -180,32 +796,62 @@ class MinioStorage:
             return info
         except Exception as e:
             self.logger.error(f"Failed to get info for object '{object_name}': {str(e)}", exc_info=True)
-            return {}
-    def get_file_url(self, bucket_name: str, object_name: str, expires=3600) -> str:
+            raise _storage_error(e, f"Failed to get info for object '{object_name}'") from e
+    def get_file_url(self, bucket_name: str, object_name: str, expires: Optional[int] = None) -> str:
         self.logger.info(f"Generating presigned URL for object '{object_name}' in bucket '{bucket_name}'")
         try:
-            url = self.client.presigned_get_object(bucket_name, object_name, expires)
+            url = get_file_url(bucket_name, object_name, expires, client=self.client)
             self.logger.debug(f"Generated presigned URL for '{object_name}'")
             return url
         except Exception as e:
             self.logger.error(f"Failed to generate presigned URL for '{object_name}': {str(e)}", exc_info=True)
-            return ""
+            raise _storage_error(e, f"Failed to generate presigned URL for '{object_name}'") from e
     def get_file_metadata(self, bucket_name: str, object_name: str) -> dict:
         self.logger.info(f"Getting metadata for object '{object_name}' in bucket '{bucket_name}'")
         try:
             stat = self.client.stat_object(bucket_name, object_name)
-            metadata = {
-                'size': stat.size,
-                'last_modified': stat.last_modified,
-                'etag': stat.etag,
-                'content_type': stat.content_type,
-                'metadata': stat.metadata
-            }
             self.logger.debug(f"Retrieved metadata for '{object_name}'")
-            return metadata
+            return _object_metadata(stat)
         except Exception as e:
             self.logger.error(f"Failed to get metadata for object '{object_name}': {str(e)}", exc_info=True)
-            return {}
+            raise _storage_error(e, f"Failed to get metadata for object '{object_name}'") from e
+    def get_files_metadata(self, bucket_name: str, object_names: Iterable[str],
+                           max_workers: int = STAT_WORKERS) -> Dict[str, Optional[dict]]:
+        """Fetch metadata for many objects concurrently.
+
+        At most max_workers stat requests are in flight at once, which keeps
+        the load within the client's connection pool.
+
+        Returns:
+            Dict[str, Optional[dict]]: Metadata by object name; None for objects that don't exist.
+
+        Raises:
+            StorageError: If a stat request fails for any other reason.
+        """
+        def stat(object_name):
+            try:
+                return object_name, _object_metadata(self.client.stat_object(bucket_name, object_name))
+            except S3Error as e:
+                if e.code == "NoSuchKey":
+                    return object_name, None
+                raise
+
+        self.logger.info(f"Getting metadata for objects in bucket '{bucket_name}' with {max_workers} workers")
+        results = {}
+        names = iter(object_names)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Submit a window at a time so a huge iterable isn't queued up front
+                while True:
+                    window = list(islice(names, max_workers * 4))
+                    if not window:
+                        break
+                    results.update(executor.map(stat, window))
+        except Exception as e:
+            self.logger.error(f"Failed to get metadata for objects in bucket '{bucket_name}': {str(e)}", exc_info=True)
+            raise _storage_error(e, f"Failed to get metadata for objects in bucket '{bucket_name}'") from e
+        self.logger.debug(f"Retrieved metadata for {len(results)} objects from bucket '{bucket_name}'")
+        return results
     def get_file_tags(self, bucket_name: str, object_name: str) -> dict:
         self.logger.info(f"Getting tags for object '{object_name}' in bucket '{bucket_name}'")
         try:
@@ -214,7 +860,7 @@ class MinioStorage:
             return tags
         except Exception as e:
             self.logger.error(f"Failed to get tags for object '{object_name}': {str(e)}", exc_info=True)
-            return {}
+            raise _storage_error(e, f"Failed to get tags for object '{object_name}'") from e
     def set_file_tags(self, bucket_name: str, object_name: str, tags: dict) -> None:
         self.logger.info(f"Setting tags for object '{object_name}' in bucket '{bucket_name}'")
         try:
@@ -222,8 +868,26 @@ class MinioStorage:
             self.logger.debug(f"Tags set for '{object_name}': {tags}")
         except Exception as e:
             self.logger.error(f"Failed to set tags for object '{object_name}': {str(e)}", exc_info=True)
+            raise _storage_error(e, f"Failed to set tags for object '{object_name}'") from e
+
+def get_storage() -> MinioStorage:
+    """Return the process-wide MinioStorage around the shared client, creating it on first use."""
+    global _storage
+    if _storage is None:
+        client = get_minio_client()
+        with _client_lock:
+            if _storage is None:
+                _storage = MinioStorage(client)
+    return _storage
 
 # Utility function for direct URL access (for compatibility)
-def get_file_url(bucket_name, object_name, expires=3600):
-    client = get_minio_client()
-    return client.presigned_get_object(bucket_name, object_name, expires)
+def get_file_url(bucket_name, object_name, expires=None, client=None):
+    """Return a presigned GET URL for an object.
+
+    Without an explicit expires (in seconds) the URL comes from the shared
+    presigned URL cache, so the same URL is returned until it nears expiry.
+    """
+    if expires is None:
+        return presigned_url_cache.get_url(bucket_name, object_name, client=client)
+    client = client or get_minio_client()
+    return client.presigned_get_object(bucket_name, object_name, timedelta(seconds=expires))
@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page ends with an opaque cursor encoding the sort value and _id of its last
+document; the next page asks for documents after that pair. Unlike skip,
+each page costs the same index range scan however deep it is, and documents
+inserted meanwhile don't shift later pages.
+"""
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+from bson import json_util
+from bson.objectid import ObjectId
+
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True)
+
+def encode_cursor(sort_value: Any, document_id: ObjectId) -> str:
+    # json_util keeps datetimes and ObjectIds intact through the round trip
+    return base64.urlsafe_b64encode(json_util.dumps([sort_value, document_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Decode a cursor from encode_cursor; ValueError if it is malformed."""
+    try:
+        sort_value, document_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()), json_options=_JSON_OPTIONS)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(document_id, ObjectId):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return sort_value, document_id
+
+def keyset_filter(sort_field: str, direction: int, after: Optional[Tuple[Any, ObjectId]]) -> Dict[str, Any]:
+    """The filter selecting documents after the cursor position in (sort_field, _id) order."""
+    if after is None:
+        return {}
+    sort_value, document_id = after
+    op = "$gt" if direction > 0 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: document_id}}
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, "_id": {op: document_id}},
+    ]}
+
+def keyset_sort(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    if sort_field == "_id":
+        return [("_id", direction)]
+    # _id breaks ties so the order, and so the cursor, is total
+    return [(sort_field, direction), ("_id", direction)]
+
+def cursor_after(document: Dict[str, Any], sort_field: str) -> str:
+    """The cursor pointing just after a raw document."""
+    return encode_cursor(document.get(sort_field) if sort_field != "_id" else None, document["_id"])
@@ -0,0 +1,96 @@
+"""
+In-process TTL cache of public user profiles.
+
+List endpoints that embed authors (include=author) resolve them through
+crud.get_public_profiles, which serves repeat authors from here and fetches
+the rest with one batched query. crud invalidates a user's entry whenever a
+public field changes or the user is deleted.
+
+Like the response cache, invalidation is per process; other workers may
+serve a changed profile until its TTL expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+from dotenv import load_dotenv
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 60))
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
+
+# The user fields exposed by UserPublicResponse
+PUBLIC_PROFILE_FIELDS = ("email", "created_at")
+
+class ProfileCache:
+    """TTL + LRU cache of public profile dicts keyed by user ID."""
+
+    def __init__(self, ttl: float = PROFILE_CACHE_TTL, max_entries: int = PROFILE_CACHE_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # Readers run in worker threads
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get_many(self, user_ids: Iterable[str]) -> Tuple[Dict[str, dict], List[str]]:
+        """Split user IDs into cached profiles and the IDs still to be fetched."""
+        found, missing = {}, []
+        now = self._clock()
+        with self._lock:
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[user_id]
+                    missing.append(user_id)
+            self._hits += len(found)
+            self._misses += len(missing)
+        return found, missing
+
+    def set_many(self, profiles: Dict[str, dict]) -> None:
+        if self.ttl <= 0:
+            return
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            for user_id, profile in profiles.items():
+                self._entries[user_id] = (expires_at, profile)
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._invalidations += 1
+        logger.debug(f"Invalidated cached profile: {user_id}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else None,
+            "invalidations": self._invalidations,
+        }
+
+profile_cache = ProfileCache()
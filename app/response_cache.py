@@ -0,0 +1,217 @@
+"""
+In-process micro-cache for anonymous responses of hot read endpoints.
+
+Entries hold the serialized response bytes for a short TTL in a size-bounded
+LRU. Concurrent misses for the same key are coalesced: the first request
+starts a load task and every request, including the first, awaits its
+result, so a burst of identical requests runs one query and a client that
+disconnects doesn't cancel the load for the others. crud write functions invalidate entries by tag.
+
+Invalidation is per process; with several workers, other processes may serve
+an entry until its TTL expires, which is why the TTL is kept short.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from . import http_cache
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 2))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+POSTS_TAG = "posts"
+# Carried by responses that embed author profiles
+AUTHORS_TAG = "authors"
+
+def post_tag(post_id: str) -> str:
+    return f"post:{post_id.lower()}"
+
+@dataclass
+class CachedResponse:
+    """A serialized JSON response and its validators."""
+    body: bytes
+    etag: Optional[str] = None
+    modified_at: Optional[datetime] = None
+    expires_at: float = 0.0
+    tags: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_content(cls, content, etag: Optional[str] = None, modified_at: Optional[datetime] = None) -> "CachedResponse":
+        # Rendered the same way as JSONResponse
+        body = json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+        return cls(body=body, etag=etag, modified_at=modified_at)
+
+    def to_response(self, request: Request, cache_status: str) -> Response:
+        """Build the response for a request, answering revalidations with a 304."""
+        if self.etag and http_cache.is_not_modified(request, self.etag, self.modified_at):
+            response = http_cache.not_modified(self.etag, self.modified_at)
+        else:
+            response = Response(content=self.body, media_type="application/json")
+            if self.etag:
+                http_cache.set_validators(response, self.etag, self.modified_at)
+        response.headers["X-Cache"] = cache_status
+        return response
+
+def is_cacheable(request: Request) -> bool:
+    """Only anonymous requests share cached responses."""
+    return RESPONSE_CACHE_TTL > 0 and "authorization" not in request.headers
+
+def cache_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+class ResponseCache:
+    """TTL + LRU cache of CachedResponse entries with single-flight loading."""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Incremented by every invalidation, so a load that started before a
+        # write never stores its (possibly stale) result afterwards
+        self._generation = 0
+        # Writes invalidate from worker threads as well as the event loop
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= self._clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    async def get_or_load(self, key: str, tags: Iterable[str],
+                          loader: Callable[[], Awaitable[Optional[CachedResponse]]]) -> Tuple[Optional[CachedResponse], str]:
+        """Return a cached entry, loading it once for all concurrent callers on a miss.
+
+        The loader returns None for responses that must not be cached, such
+        as a missing document. Returns the entry and "HIT", "COALESCED" or "MISS".
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self._hits += 1
+            return entry, "HIT"
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._coalesced += 1
+            # Shielded so a cancelled waiter doesn't cancel the shared load
+            return await asyncio.shield(pending), "COALESCED"
+
+        self._misses += 1
+        # The load runs in its own task, so cancelling the request that
+        # started it (e.g. a disconnected client) doesn't fail the waiters
+        task = asyncio.ensure_future(self._load(key, tuple(tags), loader, self._generation))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish_load(key, done))
+        return await asyncio.shield(task), "MISS"
+
+    async def _load(self, key: str, tags: Tuple[str, ...],
+                    loader: Callable[[], Awaitable[Optional[CachedResponse]]], generation: int) -> Optional[CachedResponse]:
+        entry = await loader()
+        if entry is not None:
+            self._store(key, entry, tags, generation)
+        return entry
+
+    def _finish_load(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark a failure retrieved even if every caller went away; callers re-raise it themselves
+        if not task.cancelled():
+            task.exception()
+
+    def _store(self, key: str, entry: CachedResponse, tags: Tuple[str, ...], generation: int) -> None:
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                logger.debug(f"Not caching {key}: invalidated while loading")
+                return
+            if key in self._entries:
+                self._remove(key)
+            entry.expires_at = self._clock() + self.ttl
+            entry.tags = tags
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of the tags."""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+        logger.debug(f"Invalidated response cache tags: {tags}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses + self._coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "hit_ratio": (self._hits + self._coalesced) / lookups if lookups else None,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "inflight": len(self._inflight),
+        }
+
+response_cache = ResponseCache()
@@ -1,6 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from .. import auth, crud, schemas
-from ..models import UserModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+import zlib
+from datetime import datetime
+from typing import Optional
+from .. import auth, bulk, crud, schemas, cascade, comment_migration, token_pruning
+from ..models import UserSession
+from ..object_storage import get_pool_stats
+from ..image_pipeline import image_pipeline
+from ..image_serving import image_proxy
+from ..response_cache import response_cache
+from ..profile_cache import profile_cache
+from ..negative_cache import missing_posts
+from ..jobs import job_runner
+from ..leader import leader
+from ..pagination import decode_cursor
+from starlette.concurrency import run_in_threadpool
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -10,16 +24,236 @@ router = APIRouter(
     tags=["admin"]
 )
 
-# Admin: Get All Users
+# Admin: List users, a page at a time or streamed as NDJSON
 @router.get("/users", response_model=list[schemas.UserResponse])
-async def admin_get_users(current_user: UserModel = Depends(auth.get_current_user)):
-    logger.info(f"Admin request to get all users from: {current_user.email}")
+async def admin_get_users(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of users per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    sort_by: str = Query("created_at", description="Field to sort by (created_at, email or _id)"),
+    order: str = Query("desc", description="Sort order (asc or desc)"),
+    is_active: Optional[bool] = Query(None, description="Filter by active status"),
+    is_admin: Optional[bool] = Query(None, description="Filter by admin status"),
+    created_after: Optional[datetime] = Query(None, description="Only users created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only users created before this time"),
+    format: str = Query("json", description="json for one page, ndjson to stream every matching user"),
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    logger.info(f"Admin request to list users from: {current_user.email}")
     if not current_user.is_admin:
         logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
         raise HTTPException(status_code=403, detail="Not authorized")
-    users = crud.get_all_users()
-    
+    if sort_by not in crud.USER_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by {sort_by}; use one of {', '.join(crud.USER_SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Order must be asc or desc")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be json or ndjson")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    direction = 1 if order == "asc" else -1
+    filters = crud.user_filters(is_active, is_admin, created_after, created_before)
+
+    if format == "ndjson":
+        # Serialized one user at a time from a batched cursor, so memory stays flat
+        users = crud.iter_users(filters, sort_by, direction, after)
+        lines = (schemas.UserResponse.model_validate(user, from_attributes=True).model_dump_json() + "\n" for user in users)
+        return StreamingResponse(lines, media_type=bulk.NDJSON_MEDIA_TYPE)
+
+    users, next_cursor = await run_in_threadpool(crud.get_users_page, filters, sort_by, direction, after, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     logger.info(f"Returning data for {len(users)} users")
-    logger.debug(f"Type of users: {type(users)}")
+    return users
+
+# Admin: Stream an export of posts and their comments
+@router.get("/export")
+async def admin_export(
+    format: str = Query("ndjson", description="ndjson, or ndjson.gz for a gzip-compressed stream"),
+    author_id: Optional[str] = Query(None, description="Only posts by this author"),
+    created_after: Optional[datetime] = Query(None, description="Only posts created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only posts created before this time"),
+    is_published: Optional[bool] = Query(None, description="Filter by published status"),
+    after_id: Optional[str] = Query(None, description="Resume after this post ID (last_post_id of an earlier export)"),
+    before_id: Optional[str] = Query(None, description="Stop before this post ID"),
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    logger.info(f"Admin request to export posts from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if format not in ("ndjson", "ndjson.gz"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or ndjson.gz")
+    try:
+        filters = crud.export_post_filters(author_id, created_after, created_before, is_published, after_id, before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    compress = format == "ndjson.gz"
+    # The blocking generator is iterated in the threadpool, one chunk at a time
+    return StreamingResponse(
+        bulk.export_stream(filters, compress),
+        media_type=bulk.GZIP_MEDIA_TYPE if compress else bulk.NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="posts.{format}"'}
+    )
+
+# Admin: Import posts and comments from a streamed export
+@router.post("/import")
+async def admin_import(
+    request: Request,
+    batch_size: int = Query(bulk.IMPORT_BATCH_SIZE, ge=1, le=10000, description="Lines per validated, bulk-written batch"),
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    logger.info(f"Admin request to import posts from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    compressed = (
+        request.headers.get("content-encoding") == "gzip"
+        or request.headers.get("content-type", "").startswith(bulk.GZIP_MEDIA_TYPE)
+    )
+    importer = bulk.BulkImporter(batch_size, compressed)
+    try:
+        # The body is read as it arrives; inflating, parsing and writing happen off the event loop
+        async for chunk in request.stream():
+            await run_in_threadpool(importer.import_chunk, chunk)
+        await run_in_threadpool(importer.import_rest)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Body is not valid gzip")
+    except bulk.LineTooLongError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return importer.finish().as_dict()
+
+# Admin: Delete a user and, in the background, their posts and comments
+@router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def admin_delete_user(user_id: str, current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request to delete user {user_id} from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if user_id == str(current_user.id):
+        raise HTTPException(status_code=400, detail="Admins cannot delete themselves")
+    if crud.get_user_by_id(user_id, crud.UserProfile.PUBLIC) is None:
+        logger.warning(f"User not found with ID: {user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
+    cascade.delete_user(user_id)
+    logger.info(f"User deleted: {user_id}")
+
+# Admin: Cascade deletions still in progress
+@router.get("/deletions")
+async def admin_get_deletions(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for deletions from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    jobs = await run_in_threadpool(crud.get_jobs, cascade.CASCADE_JOB, ["queued", "running"])
+    return [
+        {"id": str(job["_id"]), **job["payload"], "status": job["status"], "attempts": job["attempts"],
+         "progress": job.get("progress", {}), "created_at": job["created_at"], "last_error": job.get("last_error")}
+        for job in jobs
+    ]
+
+# Admin: Background job queue depth and throughput
+@router.get("/jobs")
+async def admin_get_jobs(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for job stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    queue = await run_in_threadpool(job_runner.get_queue_stats)
+    return {"queue": queue, "workers": job_runner.get_stats()}
+
+# Admin: Which worker is leader, and the periodic tasks it runs
+@router.get("/leader")
+async def admin_get_leader(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for leader status from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    lease = await run_in_threadpool(crud.get_lease, leader.name)
+    if lease is not None:
+        lease.pop("_id")
+    return {"lease": lease, "this_worker": leader.get_stats()}
 
-    return users
\ No newline at end of file
+# Admin: Progress of expired token pruning
+@router.get("/tokens/pruning")
+async def admin_get_token_pruning(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for token pruning stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    checkpoint = await run_in_threadpool(crud.get_checkpoint, token_pruning.PRUNE_JOB) or {}
+    return {
+        "next_user_id": checkpoint.get("position"),
+        "totals": checkpoint.get("totals", {}),
+        "updated_at": checkpoint.get("updated_at"),
+        "interval_seconds": token_pruning.TOKEN_PRUNE_INTERVAL,
+    }
+
+# Admin: Progress of the migration of embedded comments
+@router.get("/migrations/comments")
+async def admin_get_comment_migration(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for comment migration stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    checkpoint = await run_in_threadpool(crud.get_checkpoint, comment_migration.MIGRATION_JOB) or {}
+    return {
+        "next_post_id": checkpoint.get("position"),
+        "totals": checkpoint.get("totals", {}),
+        "updated_at": checkpoint.get("updated_at"),
+    }
+
+# Admin: Start, or resume, the migration of embedded comments
+@router.post("/migrations/comments", status_code=status.HTTP_202_ACCEPTED)
+async def admin_start_comment_migration(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request to migrate embedded comments from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    job_id = await run_in_threadpool(comment_migration.start_migration)
+    return {"job_id": job_id}
+
+# Admin: Object storage connection pool metrics
+@router.get("/storage/stats")
+async def admin_get_storage_stats(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for storage stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    stats = get_pool_stats()
+    stats["image_proxy"] = image_proxy.get_stats()
+    return stats
+
+# Admin: In-process cache metrics
+@router.get("/cache/stats")
+async def admin_get_cache_stats(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for cache stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {
+        "response_cache": response_cache.stats(),
+        "profile_cache": profile_cache.stats(),
+        "missing_posts": missing_posts.stats(),
+    }
+
+# Admin: Image variant pipeline metrics
+@router.get("/images/pipeline")
+async def admin_get_image_pipeline_stats(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for image pipeline stats from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return image_pipeline.get_stats()
+
+# Admin: Storage saved by image deduplication
+@router.get("/images/storage-report")
+async def admin_get_image_storage_report(current_user: UserSession = Depends(auth.get_current_user)):
+    logger.info(f"Admin request for image storage report from: {current_user.email}")
+    if not current_user.is_admin:
+        logger.warning(f"Unauthorized admin access attempt by: {current_user.email}")
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return await run_in_threadpool(crud.get_image_storage_report)
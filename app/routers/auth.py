@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from .. import auth, crud, schemas
-from ..models import UserModel
+from ..models import UserModel, UserSession
 from datetime import timedelta, datetime, timezone
 from ..logger import get_logger
 from ..password_validation import PasswordPolicy
@@ -16,7 +16,7 @@ router = APIRouter(
 @router.post("/register", response_model=schemas.UserResponse)
 def register_user(user: schemas.UserCreateRequest):
     logger.info(f"Registration attempt for email: {user.email}")
-    existing_user = crud.get_user_by_email(user.email)
+    existing_user = crud.get_user_by_email(user.email, crud.UserProfile.PUBLIC)
     if existing_user:
         logger.warning(f"Registration failed: Email already registered: {user.email}")
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -62,7 +62,7 @@ def login_user(login_data: schemas.LoginRequest):
     
     # Create both access and refresh tokens
     access_token, refresh_token = auth.create_token_pair(
-        data={"id": str(user.id)}
+        data={"id": str(user.id), auth.TOKEN_GENERATION_CLAIM: user.token_generation}
     )
     
     logger.debug(f">>>>>Access token created: {access_token}")
@@ -89,7 +89,7 @@ def refresh_token(refresh_data: schemas.RefreshTokenRequest):
     user_id = payload.get("id")
     
     # Check if user exists
-    user = crud.get_user_by_id(user_id)
+    user = crud.get_user_by_id(user_id, crud.UserProfile.PUBLIC)
     if not user:
         logger.warning(f"User not found for refresh token, ID: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
@@ -97,7 +97,7 @@ def refresh_token(refresh_data: schemas.RefreshTokenRequest):
     # Generate new access token
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = auth.create_access_token(
-        data={"id": user_id},
+        data={"id": user_id, auth.TOKEN_GENERATION_CLAIM: payload.get(auth.TOKEN_GENERATION_CLAIM, 0)},
         expires_delta=access_token_expires
     )
     
@@ -190,11 +190,20 @@ def logout_user(logout_data: schemas.LogoutRequest):
     logger.info(f"User logged out successfully, ID: {payload.get('id')}")
     return None
 
+# Logout everywhere
+@router.post("/logout-all", status_code=204)
+def logout_all(current_user: UserSession = Depends(auth.get_current_user)):
+    """Revoke every access and refresh token of the current user."""
+    logger.info(f"Logout from all sessions requested by user: {current_user.email}")
+    if auth.revoke_all_tokens(str(current_user.id)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return None
+
 # Change password endpoint
 @router.post("/change-password", response_model=schemas.TokenResponse)
 async def change_password(
     password_data: schemas.PasswordChangeRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     """Change the password for the current user.
     This endpoint verifies the current password, checks for password reuse,
@@ -202,9 +211,14 @@ async def change_password(
     """
     logger.info(f"Password change requested for user: {current_user}")
     logger.debug(f"Password change data: {password_data}")
+
+    # The session user has no password hash or history; load the credentials
+    credentials = crud.get_user_by_id(str(current_user.id), crud.UserProfile.CREDENTIAL)
+    if credentials is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
     # Verify current password
-    if not auth.verify_password(password_data.current_password, current_user.hashed_password):
+    if not auth.verify_password(password_data.current_password, credentials.hashed_password):
         logger.warning(f"Password change failed: Current password incorrect for user: {current_user.email}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -224,7 +238,7 @@ async def change_password(
     # Check if password is being reused
     is_reused, reuse_error = password_policy.check_password_reuse(
         password_data.new_password, 
-        current_user.password_history
+        credentials.password_history
     )
     
     if is_reused:
@@ -251,11 +265,11 @@ async def change_password(
     max_history_size = password_policy.config["password_history_count"]
     
     # Prepare password history update
-    password_history = current_user.password_history.copy() if current_user.password_history else []
+    password_history = credentials.password_history.copy() if credentials.password_history else []
     
     # Add current password to history
-    if current_user.hashed_password not in password_history:
-        password_history.append(current_user.hashed_password)
+    if credentials.hashed_password not in password_history:
+        password_history.append(credentials.hashed_password)
     
     # Trim history if it exceeds the maximum size
     if len(password_history) > max_history_size:
@@ -276,16 +290,12 @@ async def change_password(
             detail="Failed to update password"
         )
 
-    # Store current tokens for invalidation
-    current_tokens = current_user.tokens.copy() if current_user.tokens else []
-    
-    # Invalidate all existing tokens
-    if current_tokens:
-        auth.invalidate_tokens(current_tokens)
-        logger.debug(f"All tokens invalidated for user: {current_user.email}")
+    # Invalidate all existing tokens with one write
+    generation = auth.revoke_all_tokens(str(current_user.id))
+    logger.debug(f"All tokens invalidated for user: {current_user.email}")
     
     # Create new tokens
-    token_data = {"id": str(current_user.id), "email": current_user.email}
+    token_data = {"id": str(current_user.id), "email": current_user.email, auth.TOKEN_GENERATION_CLAIM: generation}
     access_token, refresh_token = auth.create_token_pair(token_data)
     
     logger.info(f"Password changed successfully for user: {current_user.email}")
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from .. import auth, crud, schemas
-from ..models import UserModel, CommentModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from .. import auth, crud, schemas, http_cache
+from ..models import UserSession, CommentModel
 from datetime import datetime, timezone
 from ..logger import get_logger
+from ..loaders import Loaders, get_loaders
 from typing import List, Optional
 from bson.objectid import ObjectId
 
@@ -16,17 +17,35 @@ router = APIRouter(
 # GET /comments/{comment_id}
 @router.get("/{comment_id}", response_model=schemas.CommentResponse)
 async def get_comment(
-    comment_id: str
+    comment_id: str,
+    request: Request,
+    response: Response
 ):
     logger.info(f"Retrieving comment with ID: {comment_id}")
     
+    if http_cache.has_validators(request):
+        # Revalidation only needs the timestamps and post, not the whole comment
+        post_id, modified_at = crud.get_comment_validators(comment_id)
+        etag = http_cache.document_etag(comment_id, modified_at)
+        if modified_at and http_cache.is_not_modified(request, etag, modified_at) and crud.post_exists(post_id):
+            logger.debug(f"Comment not modified: {comment_id}")
+            return http_cache.not_modified(etag, modified_at)
+    
     comment = crud.get_comment_by_id(comment_id)
     
     if not comment:
         logger.warning(f"Comment not found with ID: {comment_id}")
         raise HTTPException(status_code=404, detail="Comment not found")
     
+    # Comments of a deleted post stay until the cascade removes them; a deleted
+    # post is in the negative cache, so this is answered from memory
+    if not crud.post_exists(comment.post_id):
+        logger.warning(f"Comment {comment_id} belongs to deleted post: {comment.post_id}")
+        raise HTTPException(status_code=404, detail="Comment not found")
+    
     logger.info(f"Comment retrieved: {comment_id}")
+    modified_at = comment.updated_at or comment.created_at
+    http_cache.set_validators(response, http_cache.document_etag(comment_id, modified_at), modified_at)
     return comment
 
 # PUT /comments/{comment_id}
@@ -34,56 +53,44 @@ async def get_comment(
 async def update_comment(
     comment_id: str,
     comment_data: schemas.CommentUpdateRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Updating comment with ID: {comment_id}")
     
-    # Get the comment
-    comment = crud.get_comment_by_id(comment_id)
-    
-    if not comment:
-        logger.warning(f"Comment not found with ID: {comment_id}")
-        raise HTTPException(status_code=404, detail="Comment not found")
-        
-    # Check if user is the author or admin
-    if comment.author_id != str(current_user.id) and not current_user.is_admin:
-        logger.warning(f"Unauthorized update attempt by user: {current_user.email}")
-        raise HTTPException(status_code=403, detail="You can only update your own comments")
-    
     # Update comment with only provided fields
-    updates = {}
-    updates["updated_at"] = datetime.now(timezone.utc)
+    changes = {}
     
     if comment_data.body is not None:
-        updates["body"] = comment_data.body
+        changes["body"] = comment_data.body
     
     # Optional fields
     if comment_data.is_published is not None:
-        updates["is_published"] = comment_data.is_published
-    
-    # Update the comment in the database
-    crud.update_comment_v2(comment_id, updates)
-    
-    # Get updated comment
-    updated_comment = crud.get_comment_by_id(comment_id)
+        changes["is_published"] = comment_data.is_published
     
-    if not updated_comment:
-        logger.error(f"Failed to retrieve updated comment: {comment_id}")
-        raise HTTPException(status_code=500, detail="Failed to update comment")
+    # Ownership is enforced by the update itself, which also returns the updated comment
+    owner_id = None if current_user.is_admin else str(current_user.id)
+    updated_comment, outcome = crud.update_comment_owned(comment_id, changes, owner_id)
+    if outcome == crud.UpdateOutcome.NOT_FOUND:
+        logger.warning(f"Comment not found with ID: {comment_id}")
+        raise HTTPException(status_code=404, detail="Comment not found")
+    if outcome == crud.UpdateOutcome.FORBIDDEN:
+        logger.warning(f"Unauthorized update attempt by user: {current_user.email}")
+        raise HTTPException(status_code=403, detail="You can only update your own comments")
     
-    logger.info(f"Comment updated: {comment_id}")
+    logger.info(f"Comment updated: {comment_id} ({outcome.value})")
     return updated_comment
 
 # DELETE /comments/{comment_id}
 @router.delete("/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_comment(
     comment_id: str,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     logger.info(f"Deleting comment with ID: {comment_id}")
     
     # Get the comment
-    comment = crud.get_comment_by_id(comment_id)
+    comment = await loaders.comments.load(comment_id)
     
     if not comment:
         logger.warning(f"Comment not found with ID: {comment_id}")
@@ -96,6 +103,7 @@ async def delete_comment(
     
     # Delete the comment
     crud.delete_comment_v2(comment_id)
+    loaders.comments.clear(comment_id)
     logger.info(f"Comment deleted: {comment_id}")
     # Return nothing for 204 No Content
 
@@ -105,12 +113,13 @@ async def delete_comment(
 async def create_comment_reply(
     comment_id: str,
     comment_data: schemas.CommentCreateRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     logger.info(f"Creating reply for comment ID: {comment_id}")
     
     # Check if parent comment exists
-    parent_comment = crud.get_comment_by_id(comment_id)
+    parent_comment = await loaders.comments.load(comment_id)
     
     if not parent_comment:
         logger.warning(f"Parent comment not found with ID: {comment_id}")
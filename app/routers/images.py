@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from minio.error import S3Error
+from starlette.concurrency import run_in_threadpool
+from .. import crud
+from ..logger import get_logger
+from ..image_pipeline import select_variant
+from ..image_serving import (
+    image_proxy, stat, parse_range, is_not_modified, range_applies, RangeNotSatisfiable,
+    IMMUTABLE_CACHE_CONTROL, SHORT_CACHE_CONTROL
+)
+from ..object_storage import get_minio_client, IMAGE_BUCKET
+
+logger = get_logger(__name__)
+
+router = APIRouter(
+    prefix="/images",
+    tags=["images"],
+)
+
+@router.api_route("/{image_id}", methods=["GET", "HEAD"])
+async def serve_image(
+    image_id: str,
+    request: Request,
+    width: Optional[int] = Query(None, description="Desired display width in pixels; serves the best variant")
+):
+    """Stream an image (or its best variant for a width) from object storage.
+
+    Supports single byte ranges, and ETag / Last-Modified validators taken
+    from the stored object. Stored objects never change, so responses may be
+    cached indefinitely, except when the original stands in for variants
+    that haven't been generated yet.
+    """
+    logger.info(f"Serving image {image_id} (width={width}, range={request.headers.get('range')})")
+    image = await run_in_threadpool(crud.get_image_by_id, image_id)
+    if not image or image.status != "ready":
+        logger.warning(f"Image not found with ID: {image_id}")
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    object_name = image.filepath
+    if width is not None:
+        # The chosen variant depends on the Accept header
+        headers["Vary"] = "Accept"
+        variant = select_variant(image, width=width, accept=request.headers.get("accept", ""))
+        if variant is not None:
+            object_name = variant.object_name
+        elif not image.variants:
+            headers["Cache-Control"] = SHORT_CACHE_CONTROL
+
+    client = get_minio_client()
+    try:
+        info = await run_in_threadpool(stat, client, image.bucket_name or IMAGE_BUCKET, object_name)
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            logger.error(f"Image {image_id} is missing its object: {object_name}")
+            raise HTTPException(status_code=404, detail="Image not found")
+        logger.error(f"Failed to stat image object {object_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve image")
+
+    headers["ETag"] = info.etag_header
+    if info.last_modified_header:
+        headers["Last-Modified"] = info.last_modified_header
+    if is_not_modified(request.headers, info):
+        logger.debug(f"Image {image_id} not modified")
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), info.size) if range_applies(request.headers, info) else None
+    except RangeNotSatisfiable:
+        logger.warning(f"Unsatisfiable range for image {image_id}: {request.headers.get('range')}")
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{info.size}", "Accept-Ranges": "bytes"})
+
+    status_code = 200
+    start, end = 0, info.size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD" or length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=info.content_type)
+    return StreamingResponse(
+        image_proxy.stream(client, info, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=info.content_type
+    )
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
 
 from app.routers.utils import store_image_reference
 from .. import auth, crud, schemas
-from ..models import UserModel, PostModel, CommentModel
+from ..models import UserSession, PostModel, CommentModel, ImageModel
 from datetime import datetime, timezone
 from ..logger import get_logger
 from typing import List, Optional
+import asyncio
 import os
 import uuid
-from bson.objectid import ObjectId
-from ..object_storage import get_minio_client, get_file_url
-import io
+from ..object_storage import (
+    get_minio_client, presigned_url_cache, bucket_registry, IMAGE_BUCKET, MAX_UPLOAD_SIZE, ALLOWED_IMAGE_TYPES,
+    UploadTooLargeError, UploadSizeMismatchError, UnsupportedContentTypeError, UPLOAD_URL_EXPIRES, verify_uploaded_object
+)
+from minio.error import S3Error
+from ..image_pipeline import image_pipeline, select_variant
+from .. import image_store, http_cache, cascade
+from starlette.concurrency import run_in_threadpool
+from ..loaders import Loaders, get_loaders
+from ..response_cache import response_cache, CachedResponse, is_cacheable, cache_key, POSTS_TAG, AUTHORS_TAG, post_tag
+from ..authors import parse_include, embed_authors, INCLUDE_AUTHOR
 
 logger = get_logger(__name__)
 
@@ -19,10 +28,17 @@ router = APIRouter(
     tags=["posts"],
 )
 
+# Status for each way a presigned upload can fail verification
+UPLOAD_VERIFICATION_STATUS = {
+    UploadTooLargeError: status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    UploadSizeMismatchError: status.HTTP_422_UNPROCESSABLE_ENTITY,
+    UnsupportedContentTypeError: status.HTTP_422_UNPROCESSABLE_ENTITY,
+}
+
 @router.post("", response_model=schemas.PostResponse, status_code=status.HTTP_201_CREATED)
 async def create_post(
     post_data: schemas.PostCreateRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Creating new post for user: {current_user.email}")
     # Create a new post model
@@ -42,15 +58,53 @@ async def create_post(
 
 @router.get("", response_model=List[schemas.PostResponse])
 async def get_all_posts(
+    request: Request,
+    response: Response,
     skip: int = Query(0, description="Number of posts to skip", alias="page"),
     limit: int = Query(10, description="Maximum number of posts to return"),
     sort_by: str = Query("created_at", description="Field to sort by"),
     order: str = Query("desc", description="Sort order (asc or desc)"),
     category: Optional[int] = Query(None, description="Filter by category ID"),
-    is_published: Optional[bool] = Query(True, description="Filter by publication status")
+    is_published: Optional[bool] = Query(True, description="Filter by publication status"),
+    include: Optional[str] = Query(None, description="Related data to embed (author)")
 ):
     logger.info(f"Retrieving posts with skip={skip}, limit={limit}, category={category}, is_published={is_published}")
+    with_author = INCLUDE_AUTHOR in parse_include(include)
+    query = (skip, limit, sort_by, order, category, is_published)
+    
+    # Anonymous requests share a short-lived serialized copy of the page
+    if is_cacheable(request):
+        async def load():
+            etag = await run_in_threadpool(_posts_list_etag, *query, with_author=with_author)
+            posts = await run_in_threadpool(_query_posts, *query)
+            if with_author:
+                posts = await run_in_threadpool(embed_authors, posts, schemas.PostResponse)
+            return CachedResponse.from_content([schemas.PostResponse.model_validate(post, from_attributes=True) for post in posts], etag=etag)
+        tags = [POSTS_TAG, AUTHORS_TAG] if with_author else [POSTS_TAG]
+        entry, cache_status = await response_cache.get_or_load(cache_key(request), tags, load)
+        return entry.to_response(request, cache_status)
+    
+    etag = _posts_list_etag(*query, with_author=with_author)
+    if http_cache.is_not_modified(request, etag):
+        logger.debug("Posts list not modified")
+        return http_cache.not_modified(etag)
     
+    posts = _query_posts(*query)
+    if with_author:
+        posts = await run_in_threadpool(embed_authors, posts, schemas.PostResponse)
+    http_cache.set_validators(response, etag)
+    return posts
+
+def _posts_list_etag(skip, limit, sort_by, order, category, is_published, with_author: bool = False) -> str:
+    # Read the list version before querying, so a concurrent write can only make the ETag stale, never wrong
+    version = crud.get_version(crud.POSTS_VERSION_KEY)
+    parts = [crud.POSTS_VERSION_KEY, version, skip, limit, sort_by, order, category, is_published]
+    if with_author:
+        # Embedded profiles change without the posts changing
+        parts += [crud.AUTHORS_VERSION_KEY, crud.get_version(crud.AUTHORS_VERSION_KEY)]
+    return http_cache.make_etag(*parts)
+
+def _query_posts(skip, limit, sort_by, order, category, is_published) -> List[PostModel]:
     # Build filter dict for MongoDB query
     filters = {}
     if category is not None:
@@ -61,80 +115,100 @@ async def get_all_posts(
     # Determine sort direction
     sort_direction = -1 if order.lower() == "desc" else 1
     
-    posts = crud.get_filtered_posts(
+    return crud.get_filtered_posts(
         skip=skip, 
         limit=limit, 
         filters=filters, 
         sort_by=sort_by, 
         sort_direction=sort_direction
     )
-    return posts
 
 @router.get("/{post_id}", response_model=schemas.PostResponse)
-async def get_post_by_id(post_id: str):
+async def get_post_by_id(post_id: str, request: Request, response: Response):
     logger.info(f"Retrieving post by ID: {post_id}")
+    if is_cacheable(request):
+        async def load():
+            post = await run_in_threadpool(crud.get_post_by_id, post_id)
+            if not post:
+                return None
+            modified_at = post.updated_at or post.created_at
+            return CachedResponse.from_content(
+                schemas.PostResponse.model_validate(post, from_attributes=True),
+                etag=http_cache.document_etag(post_id, modified_at),
+                modified_at=modified_at
+            )
+        entry, cache_status = await response_cache.get_or_load(cache_key(request), [post_tag(post_id)], load)
+        if entry is None:
+            logger.warning(f"Post not found with ID: {post_id}")
+            raise HTTPException(status_code=404, detail="Post not found")
+        return entry.to_response(request, cache_status)
+    
+    if http_cache.has_validators(request):
+        # Revalidation only needs the timestamps, not the whole post
+        modified_at = crud.get_post_modified_at(post_id)
+        etag = http_cache.document_etag(post_id, modified_at)
+        if modified_at and http_cache.is_not_modified(request, etag, modified_at):
+            logger.debug(f"Post not modified: {post_id}")
+            return http_cache.not_modified(etag, modified_at)
     post = crud.get_post_by_id(post_id)
     if not post:
         logger.warning(f"Post not found with ID: {post_id}")
         raise HTTPException(status_code=404, detail="Post not found")
+    modified_at = post.updated_at or post.created_at
+    http_cache.set_validators(response, http_cache.document_etag(post_id, modified_at), modified_at)
     return post
 
 @router.put("/{post_id}", response_model=schemas.PostResponse)
 async def update_post(
     post_id: str,
     post_data: schemas.PostUpdateRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Updating post with ID: {post_id}")
-    # Check if post exists
-    existing_post = crud.get_post_by_id(post_id)
-    if not existing_post:
-        logger.warning(f"Post not found with ID: {post_id}")
-        raise HTTPException(status_code=404, detail="Post not found")
-        
-    # Check if user is the author
-    if existing_post.author_id != str(current_user.id) and not current_user.is_admin:
-        logger.warning(f"Unauthorized update attempt by user: {current_user.email}")
-        raise HTTPException(status_code=403, detail="You can only update your own posts")
-        
     # Update post with only provided fields
-    updates = {"updated_at": datetime.now(timezone.utc)}
+    changes = {}
     
     if post_data.title is not None:
-        updates["title"] = post_data.title
+        changes["title"] = post_data.title
     if post_data.body is not None:
-        updates["body"] = post_data.body
+        changes["body"] = post_data.body
     if post_data.categories is not None:
-        updates["categories"] = post_data.categories
+        changes["categories"] = post_data.categories
     if post_data.is_published is not None:
-        updates["is_published"] = post_data.is_published
+        changes["is_published"] = post_data.is_published
     
-    crud.update_post(post_id, updates)
+    # Ownership is enforced by the update itself, which also returns the updated post
+    owner_id = None if current_user.is_admin else str(current_user.id)
+    updated_post, outcome = crud.update_post_owned(post_id, changes, owner_id)
+    if outcome == crud.UpdateOutcome.NOT_FOUND:
+        logger.warning(f"Post not found with ID: {post_id}")
+        raise HTTPException(status_code=404, detail="Post not found")
+    if outcome == crud.UpdateOutcome.FORBIDDEN:
+        logger.warning(f"Unauthorized update attempt by user: {current_user.email}")
+        raise HTTPException(status_code=403, detail="You can only update your own posts")
     
-    # Get updated post
-    updated_post = crud.get_post_by_id(post_id)
-    logger.info(f"Post updated: {post_id}")
+    logger.info(f"Post updated: {post_id} ({outcome.value})")
     return updated_post
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
     post_id: str,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Deleting post with ID: {post_id}")
     # Check if post exists
-    existing_post = crud.get_post_by_id(post_id)
-    if not existing_post:
+    author_id = crud.get_post_author_id(post_id)
+    if author_id is None:
         logger.warning(f"Post not found with ID: {post_id}")
         raise HTTPException(status_code=404, detail="Post not found")
         
     # Check if user is the author or admin
-    if existing_post.author_id != str(current_user.id) and not current_user.is_admin:
+    if author_id != str(current_user.id) and not current_user.is_admin:
         logger.warning(f"Unauthorized delete attempt by user: {current_user.email}")
         raise HTTPException(status_code=403, detail="You can only delete your own posts")
     
-    # Delete post
-    crud.delete_post(post_id)
+    # Delete the post now; its comments and images are removed in the background
+    cascade.delete_post(post_id)
     logger.info(f"Post deleted: {post_id}")
     # Return nothing for 204 No Content
 
@@ -155,137 +229,349 @@ async def get_posts_by_author(
 async def upload_post_image(
     post_id: str,
     file: UploadFile = File(...),
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Image upload requested for post ID: {post_id}")
     
-    # Check if post exists
-    existing_post = crud.get_post_by_id(post_id)
-    if not existing_post:
+    # Check if post exists; only its author is needed, not the whole document
+    author_id = crud.get_post_author_id(post_id)
+    if author_id is None:
         logger.warning(f"Post not found with ID: {post_id}")
         raise HTTPException(status_code=404, detail="Post not found")
         
     # Check if user is the author
-    if existing_post.author_id != str(current_user.id) and not current_user.is_admin:
+    if author_id != str(current_user.id) and not current_user.is_admin:
         logger.warning(f"Unauthorized image upload attempt by user: {current_user.email}")
         raise HTTPException(status_code=403, detail="You can only upload images to your own posts")
     
-    # Create a unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    
-    # Read file content
-    content = await file.read()
-    
-    # Set the bucket name - assuming a standard bucket for images
-    bucket_name = "blog-images"
-    
-    # Get the Minio client
-    minio_client = get_minio_client()
-    
-    # Make sure the bucket exists
+    # Make sure the bucket exists (checked once per process, normally at startup)
     try:
-        if not minio_client.bucket_exists(bucket_name):
-            minio_client.make_bucket(bucket_name)
-            logger.info(f"Created bucket: {bucket_name}")
+        await run_in_threadpool(bucket_registry.ensure, IMAGE_BUCKET)
     except Exception as e:
         logger.error(f"Failed to create or check bucket: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to prepare storage")
     
-    # Upload file to S3/Minio
-    object_name = f"posts/{post_id}/images/{unique_filename}"
+    # Hash the spooled upload and store it content-addressed, off the event loop.
+    # Identical content already in storage only gains a reference.
     try:
-        minio_client.put_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            data=io.BytesIO(content),
-            length=len(content),
-            content_type=file.content_type
+        image = await run_in_threadpool(
+            image_store.store_image_upload,
+            file.file,
+            file.filename,
+            file.content_type,
+            post_id,
+            str(current_user.id)
         )
-        logger.info(f"File uploaded to S3: {object_name}")
+        logger.info(f"Image stored as {image.filepath} ({image.file_size} bytes) with ID: {image.id}")
+    except UploadTooLargeError as e:
+        logger.warning(f"Image upload rejected: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except UnsupportedContentTypeError as e:
+        logger.warning(f"Image upload rejected: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
     except Exception as e:
-        logger.error(f"Failed to upload file to S3: {str(e)}")
+        logger.error(f"Failed to upload image: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload image")
     
-    # Generate a URL for the uploaded file
+    await run_in_threadpool(image_pipeline.enqueue, image.id)
+    
+    logger.info(f"Image uploaded successfully: {image.filename}")
+    
     try:
-        image_url = minio_client.presigned_get_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            expires=7*24*60*60  # URL valid for 7 days
-        )
+        image_url = presigned_url_cache.get_url(image.bucket_name, image.filepath)
     except Exception as e:
         logger.error(f"Failed to generate URL for uploaded file: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate image URL")
     
-    # Create image reference in database
-    image_id = str(ObjectId())
-    image_data = {
-        "_id": ObjectId(image_id),
-        "filename": unique_filename,
-        "object_name": object_name,
-        "bucket_name": bucket_name,
-        "content_type": file.content_type,
-        "post_id": post_id,
-        "author_id": str(current_user.id),
-        "upload_date": datetime.now(timezone.utc)
-    }
-    
-    # Store the image reference in the database
+    return schemas.ImageResponse(
+        id=image.id,
+        filename=image.filename,
+        url=image_url,
+        uploaded_by=image.uploaded_by,
+        upload_date=image.upload_date,
+        file_size=image.file_size,
+        content_type=image.content_type
+    )
+
+@router.post("/{post_id}/images/upload-url", response_model=schemas.ImageUploadUrlResponse)
+async def create_post_image_upload_url(
+    post_id: str,
+    upload_data: schemas.ImageUploadUrlRequest,
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    """Start a direct-to-storage image upload.
+
+    Reserves a pending image record and returns a presigned PUT URL. The client
+    uploads the bytes straight to object storage and then calls the completion
+    endpoint, so the API worker never handles the image data.
+    """
+    logger.info(f"Upload URL requested for post ID: {post_id}")
+    
+    # Check if post exists; only its author is needed, not the whole document
+    author_id = crud.get_post_author_id(post_id)
+    if author_id is None:
+        logger.warning(f"Post not found with ID: {post_id}")
+        raise HTTPException(status_code=404, detail="Post not found")
+        
+    # Check if user is the author
+    if author_id != str(current_user.id) and not current_user.is_admin:
+        logger.warning(f"Unauthorized image upload attempt by user: {current_user.email}")
+        raise HTTPException(status_code=403, detail="You can only upload images to your own posts")
+    
+    # Validate the declared upload before handing out a URL
+    if upload_data.content_type not in ALLOWED_IMAGE_TYPES:
+        logger.warning(f"Upload URL rejected: content type {upload_data.content_type} not allowed")
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Content type not allowed")
+    if upload_data.file_size <= 0:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="File size must be positive")
+    if upload_data.file_size > MAX_UPLOAD_SIZE:
+        logger.warning(f"Upload URL rejected: {upload_data.file_size} bytes exceeds {MAX_UPLOAD_SIZE}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds maximum size of {MAX_UPLOAD_SIZE} bytes"
+        )
+    
+    file_extension = os.path.splitext(upload_data.filename)[1]
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    bucket_name = IMAGE_BUCKET
+    object_name = f"posts/{post_id}/images/{unique_filename}"
+    minio_client = get_minio_client()
+    
     try:
-        # Assuming crud has a method to store image references
-        crud.create_image_reference(image_data)
-        logger.info(f"Image reference stored in database with ID: {image_id}")
+        await run_in_threadpool(bucket_registry.ensure, bucket_name)
+        upload_url = await run_in_threadpool(
+            minio_client.presigned_put_object, bucket_name, object_name, UPLOAD_URL_EXPIRES
+        )
     except Exception as e:
-        logger.error(f"Failed to store image reference: {str(e)}")
-        # We won't raise an exception here since the file is already uploaded
+        logger.error(f"Failed to generate upload URL: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate upload URL")
+    
+    # Reserve the image record; it stays pending until the upload is completed
+    image = crud.store_image_reference(ImageModel(
+        filename=unique_filename,
+        filepath=object_name,
+        url="",
+        uploaded_by=str(current_user.id),
+        upload_date=datetime.now(timezone.utc),
+        file_size=upload_data.file_size,
+        content_type=upload_data.content_type,
+        post_id=post_id,
+        bucket_name=bucket_name,
+        status="pending"
+    ))
+    logger.info(f"Pending image reserved with ID: {image.id}")
+    
+    return schemas.ImageUploadUrlResponse(
+        image_id=image.id,
+        upload_url=upload_url,
+        object_name=object_name,
+        headers={"Content-Type": upload_data.content_type},
+        max_size=upload_data.file_size,
+        expires_at=datetime.now(timezone.utc) + UPLOAD_URL_EXPIRES
+    )
+
+@router.post("/{post_id}/images/{image_id}/complete", response_model=schemas.ImageResponse)
+async def complete_post_image_upload(
+    post_id: str,
+    image_id: str,
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    """Finish a direct-to-storage image upload.
+
+    Verifies the uploaded object against the reserved record with stat_object
+    and marks the image ready. Completing an already finished upload returns
+    the existing image.
+    """
+    logger.info(f"Completing image upload {image_id} for post ID: {post_id}")
+    
+    image = crud.get_image_by_id(image_id)
+    if not image or image.post_id != post_id:
+        logger.warning(f"Image not found with ID: {image_id} for post: {post_id}")
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if image.uploaded_by != str(current_user.id) and not current_user.is_admin:
+        logger.warning(f"Unauthorized image completion attempt by user: {current_user.email}")
+        raise HTTPException(status_code=403, detail="You can only complete your own uploads")
+    
+    if image.status == "pending":
+        minio_client = get_minio_client()
+        try:
+            stat = await run_in_threadpool(
+                verify_uploaded_object,
+                minio_client,
+                image.bucket_name,
+                image.filepath,
+                image.file_size,
+                image.content_type
+            )
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                logger.warning(f"Upload not found in storage for image: {image_id}")
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload has not been received")
+            logger.error(f"Failed to verify uploaded image {image_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to verify upload")
+        except (UploadTooLargeError, UploadSizeMismatchError, UnsupportedContentTypeError) as e:
+            logger.warning(f"Uploaded image {image_id} failed verification: {str(e)}")
+            await run_in_threadpool(minio_client.remove_object, image.bucket_name, image.filepath)
+            crud.finalize_image_reference(image_id, {"status": "failed"})
+            raise HTTPException(status_code=UPLOAD_VERIFICATION_STATUS[type(e)], detail=str(e))
+        
+        crud.finalize_image_reference(image_id, {
+            "status": "ready",
+            "file_size": stat.size,
+            "etag": stat.etag
+        })
+        image = crud.get_image_by_id(image_id)
+        await run_in_threadpool(image_pipeline.enqueue, image_id)
+    
+    if image.status != "ready":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Image upload is {image.status}")
     
-    logger.info(f"Image uploaded successfully: {unique_filename}")
+    try:
+        image_url = presigned_url_cache.get_url(image.bucket_name, image.filepath)
+    except Exception as e:
+        logger.error(f"Failed to generate URL for uploaded file: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate image URL")
     
+    logger.info(f"Image upload completed: {image_id}")
     return schemas.ImageResponse(
-        id=image_id,
-        filename=unique_filename,
-        url=image_url
+        id=image.id,
+        filename=image.filename,
+        url=image_url,
+        uploaded_by=image.uploaded_by,
+        upload_date=image.upload_date,
+        file_size=image.file_size,
+        content_type=image.content_type
+    )
+
+@router.get("/{post_id}/images/{image_id}", response_model=schemas.ImageResponse)
+async def get_post_image(
+    post_id: str,
+    image_id: str,
+    request: Request,
+    response: Response,
+    width: Optional[int] = Query(None, description="Desired display width in pixels")
+):
+    """Return an image URL, using the best generated variant for the requested width.
+
+    WebP variants are chosen when the Accept header allows them; the original
+    is returned when no variant is a good match.
+    """
+    logger.info(f"Retrieving image {image_id} for post ID: {post_id} (width={width})")
+    image = crud.get_image_by_id(image_id)
+    if not image or image.post_id != post_id or image.status != "ready":
+        logger.warning(f"Image not found with ID: {image_id} for post: {post_id}")
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # The chosen variant depends on the Accept header
+    response.headers["Vary"] = "Accept"
+    variant = select_variant(image, width=width, accept=request.headers.get("accept", ""))
+    if variant is None:
+        url = presigned_url_cache.get_url(image.bucket_name, image.filepath)
+        return schemas.ImageResponse(
+            id=image.id,
+            filename=image.filename,
+            url=url,
+            uploaded_by=image.uploaded_by,
+            upload_date=image.upload_date,
+            file_size=image.file_size,
+            content_type=image.content_type
+        )
+    
+    url = presigned_url_cache.get_url(image.bucket_name, variant.object_name)
+    return schemas.ImageResponse(
+        id=image.id,
+        filename=image.filename,
+        url=url,
+        uploaded_by=image.uploaded_by,
+        upload_date=image.upload_date,
+        file_size=variant.file_size,
+        content_type=variant.content_type,
+        width=variant.width,
+        height=variant.height
     )
 
+@router.delete("/{post_id}/images/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_post_image(
+    post_id: str,
+    image_id: str,
+    current_user: UserSession = Depends(auth.get_current_user)
+):
+    logger.info(f"Deleting image {image_id} from post ID: {post_id}")
+    image = crud.get_image_by_id(image_id)
+    if not image or image.post_id != post_id:
+        logger.warning(f"Image not found with ID: {image_id} for post: {post_id}")
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if image.uploaded_by != str(current_user.id) and not current_user.is_admin:
+        logger.warning(f"Unauthorized image delete attempt by user: {current_user.email}")
+        raise HTTPException(status_code=403, detail="You can only delete your own images")
+    
+    # Shared content is only removed from storage with its last reference
+    await run_in_threadpool(image_store.delete_image, image_id)
+    logger.info(f"Image deleted: {image_id}")
+    # Return nothing for 204 No Content
+
 @router.get("/{post_id}/comments", response_model=List[schemas.CommentResponse])
 async def get_post_comments(
     post_id: str,
+    request: Request,
+    response: Response,
     skip: int = Query(0, description="Number of comments to skip", alias="page"),
-    limit: int = Query(10, description="Maximum number of comments to return")
+    limit: int = Query(10, description="Maximum number of comments to return"),
+    include: Optional[str] = Query(None, description="Related data to embed (author)")
 ):
     logger.info(f"Retrieving comments for post ID: {post_id}")
+    with_author = INCLUDE_AUTHOR in parse_include(include)
     
-    # Check if post exists
-    post = crud.get_post_by_id(post_id)
-    if not post:
+    # Check if post exists (answered from memory for recently missed IDs)
+    if not crud.post_exists(post_id):
         logger.warning(f"Post not found with ID: {post_id}")
         raise HTTPException(status_code=404, detail="Post not found")
     
+    version_key = crud.comments_version_key(post_id)
+    version = crud.get_version(version_key)
+    if with_author:
+        authors_version = crud.get_version(crud.AUTHORS_VERSION_KEY)
+        etag = http_cache.make_etag(version_key, version, skip, limit, crud.AUTHORS_VERSION_KEY, authors_version)
+    else:
+        etag = http_cache.make_etag(version_key, version, skip, limit)
+    
+    if http_cache.is_not_modified(request, etag):
+        logger.debug(f"Comments for post {post_id} not modified (version {version})")
+        return http_cache.not_modified(etag)
+    
     # Get comments for post from separate collection
     comments = crud.get_comments_for_post_v2(post_id, limit=limit, skip=skip)
+    if with_author:
+        comments = await run_in_threadpool(embed_authors, comments, schemas.CommentResponse)
     
     logger.info(f"Returning {len(comments)} comments for post: {post_id}")
+    http_cache.set_validators(response, etag)
     return comments
 
 @router.post("/{post_id}/comments", response_model=schemas.CommentResponse, status_code=status.HTTP_201_CREATED)
 async def create_post_comment(
     post_id: str,
     comment_data: schemas.CommentCreateRequest,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user),
+    loaders: Loaders = Depends(get_loaders)
 ):
     logger.info(f"Creating comment for post ID: {post_id} by user: {current_user.email}")
     
+    # Check the post exists and fetch the parent comment (if specified) concurrently
+    post_found, parent_comment = await asyncio.gather(
+        run_in_threadpool(crud.post_exists, post_id),
+        loaders.comments.load(comment_data.parent_id)
+    )
+    
     # Check if post exists
-    post = crud.get_post_by_id(post_id)
-    if not post:
+    if not post_found:
         logger.warning(f"Post not found with ID: {post_id}")
         raise HTTPException(status_code=404, detail="Post not found")
     
     # Check if parent comment exists (if specified)
     if comment_data.parent_id:
-        parent_comment = crud.get_comment_by_id(comment_data.parent_id)
-        
         if not parent_comment:
             logger.warning(f"Parent comment not found with ID: {comment_data.parent_id}")
             raise HTTPException(status_code=404, detail="Parent comment not found")
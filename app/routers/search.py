@@ -2,6 +2,7 @@ from fastapi import APIRouter, Query, HTTPException
 from typing import List, Optional
 from enum import Enum
 from .. import crud, schemas
+from ..authors import parse_include, embed_authors, INCLUDE_AUTHOR
 from ..logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,7 +24,8 @@ async def search(
     page: int = Query(0, description="Page number (pagination)"),
     limit: int = Query(10, description="Maximum number of results to return"),
     type: SearchType = Query(SearchType.ALL, description="Type of content to search"),
-    sort_by: str = Query("relevance", description="Field to sort by (relevance, created_at)")
+    sort_by: str = Query("relevance", description="Field to sort by (relevance, created_at)"),
+    include: Optional[str] = Query(None, description="Related data to embed (author)")
 ):
     """
     Perform a full-text search across posts and comments.
@@ -37,11 +39,13 @@ async def search(
         limit: Maximum number of results per page
         type: Type of content to search (posts, comments, or all)
         sort_by: Field to sort results by (relevance or created_at)
+        include: Set to "author" to embed each result's author profile
     
     Returns:
         SearchResponse object containing search results and pagination metadata
     """
     logger.info(f"Search request with query: '{q}', type: {type}, page: {page}, limit: {limit}")
+    with_author = INCLUDE_AUTHOR in parse_include(include)
     
     # Initialize variables for result collection
     results = []
@@ -143,6 +147,10 @@ async def search(
         if sort_by == "created_at":
             results.sort(key=lambda x: x.created_at, reverse=(sort_direction == -1))
     
+    # Resolve the authors of posts and comments together, in one batch
+    if with_author:
+        results = embed_authors(results)
+    
     # Prepare the response
     response = schemas.SearchResponse(
         total=total_results,
@@ -2,10 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 from app.password_validation import PasswordPolicy
 from .. import auth, crud, schemas
-from ..models import UserModel
+from ..models import UserSession
 from ..logger import get_logger
 from typing import List
-from datetime import datetime, timezone
 
 logger = get_logger(__name__)
 
@@ -16,7 +15,7 @@ router = APIRouter(
 
 # Get Current User
 @router.get("/me", response_model=schemas.UserResponse)
-async def get_current_user(current_user: UserModel = Depends(auth.get_current_user)):
+async def get_current_user(current_user: UserSession = Depends(auth.get_current_user)):
     logger.debug(f"Current user info requested: {current_user.email}")
     return current_user
 
@@ -24,7 +23,7 @@ async def get_current_user(current_user: UserModel = Depends(auth.get_current_us
 @router.get("/{user_id}", response_model=schemas.UserPublicResponse)
 async def get_user_by_id(user_id: str):
     logger.info(f"User info requested for ID: {user_id}")
-    user = crud.get_user_by_id(user_id)
+    user = crud.get_user_by_id(user_id, crud.UserProfile.PUBLIC)
     if not user:
         logger.warning(f"User not found with ID: {user_id}")
         raise HTTPException(status_code=404, detail="User not found")
@@ -34,38 +33,38 @@ async def get_user_by_id(user_id: str):
 @router.put("/me", response_model=schemas.UserResponse)
 async def update_current_user(
     user_data: schemas.UserUpdate,
-    current_user: UserModel = Depends(auth.get_current_user)
+    current_user: UserSession = Depends(auth.get_current_user)
 ):
     logger.info(f"Update requested for user: {current_user.email}")
     
-    # Prepare updates dictionary
-    updates = {"updated_at": datetime.now(timezone.utc)}
+    # Prepare changes dictionary
+    changes = {}
     
     # Update email if provided
     if user_data.email is not None and user_data.email != current_user.email:
         # Check if email is already taken
-        existing_user = crud.get_user_by_email(user_data.email)
+        existing_user = crud.get_user_by_email(user_data.email, crud.UserProfile.PUBLIC)
         if existing_user and str(existing_user.id) != str(current_user.id):
             logger.warning(f"Email already taken: {user_data.email}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-        updates["email"] = user_data.email
+        changes["email"] = user_data.email
     
     # Update password if provided
     if user_data.password is not None:
         hashed_password = auth.get_password_hash(user_data.password)
-        updates["hashed_password"] = hashed_password
+        changes["hashed_password"] = hashed_password
     
-    # Only update if there are changes
-    if len(updates) > 1:  # More than just updated_at
-        result = crud.update_user(str(current_user.id), updates)
-        if result.modified_count == 0:
-            logger.warning(f"No changes made to user: {current_user.id}")
-    
-    # Get and return the updated user
-    updated_user = crud.get_user_by_id(str(current_user.id))
+    # Only write if there are changes; the update returns the updated user
+    if not changes:
+        logger.info(f"No changes requested for user: {current_user.email}")
+        return current_user
+    updated_user = crud.update_user_fields(str(current_user.id), changes)
+    if updated_user is None:
+        logger.warning(f"User disappeared during update: {current_user.id}")
+        raise HTTPException(status_code=404, detail="User not found")
     logger.info(f"User updated successfully: {updated_user.email}")
     return updated_user
 
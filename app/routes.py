@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from .logger import get_logger
-from .routers import auth, users, admin, posts, comments, search
+from .routers import auth, users, admin, posts, comments, search, images
 
 logger = get_logger(__name__)
 
@@ -19,4 +19,5 @@ router.include_router(users.router)
 router.include_router(admin.router)
 router.include_router(posts.router)
 router.include_router(comments.router)
-router.include_router(search.router)
\ No newline at end of file
+router.include_router(search.router)
+router.include_router(images.router)
\ No newline at end of file
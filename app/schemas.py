@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 
@@ -161,6 +161,7 @@ class PostResponse(BaseModel):
     updated_at: Optional[datetime] = None
     categories: Optional[List[int]] = None
     is_published: Optional[bool] = True
+    author: Optional[UserPublicResponse] = None  # Only set with include=author
     
     class Config:
         orm_mode = True
@@ -203,6 +204,7 @@ class CommentResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     is_published: bool = True
+    author: Optional[UserPublicResponse] = None  # Only set with include=author
     # is_edited: bool = False
     # is_deleted: bool = False
     # is_approved: bool = False
@@ -252,10 +254,34 @@ class ImageResponse(BaseModel):
     upload_date: datetime
     file_size: int
     content_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
     
     class Config:
         orm_mode = True
 
+class ImageUploadUrlRequest(BaseModel):
+    """Schema for requesting a presigned upload URL.
+    
+    This schema is used to parse the request body for the first step of a direct-to-storage upload.
+    The declared size and content type are checked again when the upload is completed."""
+    filename: str
+    content_type: str
+    file_size: int
+
+class ImageUploadUrlResponse(BaseModel):
+    """Schema for a presigned upload URL response.
+    
+    The client uploads the file with an HTTP PUT to upload_url, sending the given headers,
+    and then calls the completion endpoint with image_id."""
+    image_id: str
+    upload_url: str
+    object_name: str
+    method: str = "PUT"
+    headers: Dict[str, str]
+    max_size: int
+    expires_at: datetime
+
 # Search Schemas
 class SearchItem(BaseModel):
     """Base schema for search results.
@@ -268,6 +294,7 @@ class SearchItem(BaseModel):
     updated_at: Optional[datetime] = None
     body_preview: str
     author_id: str
+    author: Optional[UserPublicResponse] = None  # Only set with include=author
     
     class Config:
         orm_mode = True
@@ -0,0 +1,141 @@
+"""
+Garbage collector for orphaned objects in the image bucket.
+
+Objects can outlive their database references: posts deleted before cascade
+deletion existed left their images behind, and a crash between an upload
+and its database insert leaves an object nobody points at. This tool walks
+the bucket listing and the database references side by side, both sorted by
+name, so it needs constant memory however many objects there are. Orphans
+older than a grace period (which protects uploads that are still in flight)
+are deleted in batches through the multi-object delete API.
+
+Usage:
+    python -m app.storage_gc --dry-run
+    python -m app.storage_gc --grace-hours 48 --prefix posts/
+"""
+import argparse
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+from . import crud
+from .logger import get_logger, setup_logging
+from .object_storage import MinioStorage, get_storage, BulkDeleteError, IMAGE_BUCKET, DELETE_BATCH_SIZE
+
+logger = get_logger(__name__)
+
+DEFAULT_GRACE_PERIOD = timedelta(hours=24)
+
+@dataclass
+class GCStats:
+    """Counters reported by a garbage collection run."""
+    scanned: int = 0
+    referenced: int = 0
+    orphaned: int = 0
+    orphaned_bytes: int = 0
+    within_grace: int = 0
+    deleted: int = 0
+    delete_errors: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def objects_per_second(self) -> float:
+        return self.scanned / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        stats["objects_per_second"] = round(self.objects_per_second, 1)
+        return stats
+
+def find_orphans(objects: Iterable, references: Iterator[str], stats: GCStats) -> Iterator:
+    """Yield listed objects whose names are missing from the reference stream.
+
+    Both inputs must be sorted by name in ascending order. This is a single
+    pass merge, so only the current item of each stream is held in memory.
+    """
+    reference = next(references, None)
+    for obj in objects:
+        stats.scanned += 1
+        while reference is not None and reference < obj.object_name:
+            reference = next(references, None)
+        if reference == obj.object_name:
+            stats.referenced += 1
+            continue
+        yield obj
+
+def collect_garbage(bucket_name: str = IMAGE_BUCKET, prefix: Optional[str] = None,
+                    grace_period: timedelta = DEFAULT_GRACE_PERIOD, dry_run: bool = False,
+                    batch_size: int = DELETE_BATCH_SIZE, client=None, references: Optional[Iterator[str]] = None) -> GCStats:
+    """Find and delete objects in a bucket that no database record references.
+
+    Args:
+        bucket_name (str, optional): The bucket to clean up.
+        prefix (str, optional): Only consider objects under this prefix.
+        grace_period (timedelta, optional): Orphans modified more recently than
+            this are kept, so in-flight uploads are never removed.
+        dry_run (bool, optional): Report orphans without deleting them.
+        batch_size (int, optional): Objects per delete request (max 1000).
+        client (optional): Storage client for MinioStorage; defaults to the shared client.
+        references (Iterator[str], optional): Sorted referenced names; defaults
+            to streaming them from MongoDB.
+
+    Returns:
+        GCStats: What was scanned, found and deleted, with throughput.
+    """
+    storage = MinioStorage(client) if client is not None else get_storage()
+    references = references if references is not None else crud.iter_referenced_object_names(bucket_name)
+    cutoff = datetime.now(timezone.utc) - grace_period
+    stats = GCStats()
+    started = time.perf_counter()
+
+    logger.info(f"Storage GC started for bucket '{bucket_name}' (prefix={prefix}, grace={grace_period}, dry_run={dry_run})")
+    objects = storage.iter_objects(bucket_name, prefix=prefix)
+
+    def deletable():
+        for obj in find_orphans(objects, iter(references), stats):
+            stats.orphaned += 1
+            stats.orphaned_bytes += obj.size or 0
+            if obj.last_modified and obj.last_modified > cutoff:
+                stats.within_grace += 1
+                continue
+            logger.debug(f"Orphaned object: {obj.object_name} ({obj.size} bytes, modified {obj.last_modified})")
+            yield obj.object_name
+
+    if dry_run:
+        for _ in deletable():
+            pass
+    else:
+        try:
+            stats.deleted = storage.delete_files(bucket_name, deletable(), batch_size=batch_size)
+        except BulkDeleteError as e:
+            stats.deleted = e.deleted
+            stats.delete_errors = len(e.errors)
+            logger.error(f"Storage GC could not delete {len(e.errors)} orphaned objects")
+
+    stats.elapsed_seconds = time.perf_counter() - started
+    logger.info(f"Storage GC finished: {stats.as_dict()}")
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete orphaned objects from the image bucket.")
+    parser.add_argument("--bucket", default=IMAGE_BUCKET, help="Bucket to clean up")
+    parser.add_argument("--prefix", default=None, help="Only consider objects under this prefix")
+    parser.add_argument("--grace-hours", type=float, default=DEFAULT_GRACE_PERIOD.total_seconds() / 3600,
+                        help="Keep orphans modified within this many hours")
+    parser.add_argument("--batch-size", type=int, default=DELETE_BATCH_SIZE, help="Objects per delete request")
+    parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting them")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    stats = collect_garbage(
+        bucket_name=args.bucket,
+        prefix=args.prefix,
+        grace_period=timedelta(hours=args.grace_hours),
+        dry_run=args.dry_run,
+        batch_size=args.batch_size
+    )
+    for key, value in stats.as_dict().items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
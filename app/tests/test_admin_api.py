@@ -70,4 +70,79 @@ def test_unauthorized_admin_access():
         "/api/v1/admin/users",
         headers={"Authorization": f"Bearer {invalid_token}"}
     )
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_admin_delete_user_cascades(mock_admin_user, mock_user):
+    """Test that deleting a user removes the user at once and their posts in the background"""
+    from app.database import db
+    from app.tests.test_posts import run_pending_deletions
+    post_id = db['posts'].insert_one({"title": "Doomed", "body": "Body", "author_id": mock_user}).inserted_id
+    headers = {"Authorization": f"Bearer {mock_admin_user['token']}"}
+
+    assert client.delete(f"/api/v1/admin/users/{mock_user}", headers=headers).status_code == 204
+    assert db['users'].find_one({"_id": ObjectId(mock_user)}) is None
+
+    run_pending_deletions()
+    assert db['posts'].find_one({"_id": post_id}) is None
+    assert client.delete(f"/api/v1/admin/users/{mock_user}", headers=headers).status_code == 404
+
+def test_non_admin_cannot_delete_users(mock_user, mock_user_with_tokens):
+    """Test that non-admin users cannot delete users"""
+    response = client.delete(
+        f"/api/v1/admin/users/{mock_user}",
+        headers={"Authorization": f"Bearer {mock_user_with_tokens['access_token']}"}
+    )
+    assert response.status_code == 403
+
+
+@pytest.fixture
+def listed_users():
+    """Five users created at distinct times in a window no other test uses"""
+    from app.database import db
+    from datetime import datetime, timedelta, timezone
+    start = datetime(1990, 1, 1, tzinfo=timezone.utc)
+    ids = db['users'].insert_many([
+        {"email": f"listed{n}@example.com", "hashed_password": "x", "is_active": n != 2, "is_admin": False,
+         "created_at": start + timedelta(minutes=n), "tokens": ["secret"]}
+        for n in range(5)
+    ]).inserted_ids
+    yield {"created_after": start.isoformat(), "created_before": (start + timedelta(days=1)).isoformat()}
+    db['users'].delete_many({"_id": {"$in": ids}})
+
+def test_admin_users_cursor_pagination(mock_admin_user, listed_users):
+    """Test that following X-Next-Cursor walks every matching user once, in order"""
+    headers = {"Authorization": f"Bearer {mock_admin_user['token']}"}
+    params = {**listed_users, "limit": 2, "order": "asc"}
+    emails, pages = [], 0
+    while True:
+        response = client.get("/api/v1/admin/users", headers=headers, params=params)
+        assert response.status_code == 200
+        emails += [user["email"] for user in response.json()]
+        pages += 1
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert emails == [f"listed{n}@example.com" for n in range(5)]
+    assert pages == 3
+
+    response = client.get("/api/v1/admin/users", headers=headers, params={**listed_users, "is_active": False})
+    assert [user["email"] for user in response.json()] == ["listed2@example.com"]
+
+def test_admin_users_ndjson_export(mock_admin_user, listed_users):
+    """Test that format=ndjson streams every matching user without tokens or hashes"""
+    import json
+    response = client.get(
+        "/api/v1/admin/users",
+        headers={"Authorization": f"Bearer {mock_admin_user['token']}"},
+        params={**listed_users, "format": "ndjson", "sort_by": "email", "order": "desc"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert [user["email"] for user in users] == [f"listed{n}@example.com" for n in reversed(range(5))]
+    assert all(user["tokens"] is None and "hashed_password" not in user for user in users)
+
+def test_admin_users_rejects_bad_cursor_and_sort(mock_admin_user):
+    headers = {"Authorization": f"Bearer {mock_admin_user['token']}"}
+    assert client.get("/api/v1/admin/users", headers=headers, params={"cursor": "bogus"}).status_code == 400
+    assert client.get("/api/v1/admin/users", headers=headers, params={"sort_by": "hashed_password"}).status_code == 400
@@ -5,7 +5,7 @@ import jwt
 
 from app.main import app
 from app.tests.test_utils import mock_user, mock_user_with_tokens, create_test_token
-from app.auth import SECRET_KEY, verify_token
+from app.auth import SECRET_KEY, verify_token, invalidate_tokens
 from app.database import db
 from app.logger import setup_logging, get_logger
 from bson.objectid import ObjectId
@@ -296,6 +296,48 @@ class TestLogout:
         assert refresh_token not in token_values
         assert access_token not in token_values
 
+class TestLogoutAll:
+    """Test revoking every token of a user at once"""
+
+    def test_logout_all_revokes_every_token(self, mock_user_with_tokens):
+        """Test that logout-all clears stored tokens and rejects older tokens even if stored again"""
+        access_token = mock_user_with_tokens["access_token"]
+        refresh_token = mock_user_with_tokens["refresh_token"]
+        user_id = mock_user_with_tokens["user_id"]
+
+        response = client.post(
+            "/api/v1/auth/logout-all",
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        assert response.status_code == 204
+
+        user = db['users'].find_one({"_id": ObjectId(user_id)})
+        assert user["tokens"] == []
+        assert user["token_generation"] == 1
+
+        # The generation check rejects old tokens without relying on the stored list
+        db['users'].update_one({"_id": ObjectId(user_id)}, {"$push": {"tokens": refresh_token}})
+        assert verify_token(refresh_token, token_type="refresh") is None
+
+        # Tokens issued for the new generation work
+        new_token = create_test_token({"id": user_id, "gen": 1}, token_type="access")
+        db['users'].update_one({"_id": ObjectId(user_id)}, {"$push": {"tokens": new_token}})
+        assert verify_token(new_token, token_type="access") is not None
+
+    def test_invalidate_tokens_groups_by_user(self, mock_user_with_tokens, mock_user):
+        """Test that tokens of several users are removed together"""
+        other_token = create_test_token({"id": mock_user}, token_type="access")
+        db['users'].update_one({"_id": ObjectId(mock_user)}, {"$push": {"tokens": other_token}})
+
+        assert invalidate_tokens([
+            mock_user_with_tokens["access_token"],
+            mock_user_with_tokens["refresh_token"],
+            other_token,
+        ])
+
+        assert db['users'].find_one({"_id": ObjectId(mock_user_with_tokens["user_id"])})["tokens"] == []
+        assert db['users'].find_one({"_id": ObjectId(mock_user)})["tokens"] == []
+
 class TestVerifyToken:
     """Test the verify token functionality"""
 
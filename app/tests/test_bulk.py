@@ -0,0 +1,155 @@
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from bson import json_util
+from bson.objectid import ObjectId
+from fastapi.testclient import TestClient
+
+from app import bulk, crud
+from app.database import db
+from app.main import app
+
+# Provides the mock_admin_user fixture without importing it into this module
+pytest_plugins = ["app.tests.test_utils"]
+
+client = TestClient(app)
+
+def parse(data: bytes):
+    return [json_util.loads(line) for line in data.decode().splitlines()]
+
+@pytest.fixture
+def exported_posts():
+    """Three posts by one author, the first two with comments inserted out of order"""
+    author_id = str(ObjectId())
+    now = datetime.now(timezone.utc)
+    post_ids = db['posts'].insert_many([
+        {"title": f"Export {n}", "body": "Body", "author_id": author_id, "is_published": n != 1,
+         "created_at": now + timedelta(seconds=n), "updated_at": now}
+        for n in range(3)
+    ]).inserted_ids
+    comment_ids = db['comments'].insert_many([
+        {"post_id": str(post_ids[post]), "author_id": author_id, "body": f"Comment {post}", "created_at": now}
+        for post in (1, 0, 1, 0, 0)
+    ]).inserted_ids
+    yield author_id, post_ids
+    db['posts'].delete_many({"_id": {"$in": post_ids}})
+    db['comments'].delete_many({"_id": {"$in": comment_ids}})
+
+def test_export_groups_comments_under_their_post(exported_posts):
+    author_id, post_ids = exported_posts
+    stats = bulk.ExportStats()
+    # A batch size of 2 splits the posts across batches
+    data = b"".join(bulk.export_stream(crud.export_post_filters(author_id=author_id), stats=stats, batch_size=2))
+    records = parse(data)
+
+    assert [(r["type"], r["data"].get("post_id", r["data"]["_id"])) for r in records[:-1]] == [
+        ("post", post_ids[0]), ("comment", str(post_ids[0])), ("comment", str(post_ids[0])), ("comment", str(post_ids[0])),
+        ("post", post_ids[1]), ("comment", str(post_ids[1])), ("comment", str(post_ids[1])),
+        ("post", post_ids[2]),
+    ]
+    # Extended JSON keeps types through the round trip
+    assert isinstance(records[0]["data"]["created_at"], datetime)
+    summary = records[-1]
+    assert summary["type"] == "summary"
+    assert summary["data"]["posts"] == 3 and summary["data"]["comments"] == 5
+    assert summary["data"]["last_post_id"] == str(post_ids[2])
+    assert stats.posts == 3 and stats.bytes == len(data) - len(data.splitlines()[-1]) - 1
+
+def test_export_resumes_after_id_and_filters(exported_posts):
+    author_id, post_ids = exported_posts
+    filters = crud.export_post_filters(author_id=author_id, after_id=str(post_ids[0]), is_published=True)
+    records = parse(b"".join(bulk.export_stream(filters)))
+    assert [r["data"]["_id"] for r in records if r["type"] == "post"] == [post_ids[2]]
+
+    with pytest.raises(ValueError):
+        crud.export_post_filters(after_id="not-an-id")
+
+def test_admin_export_gzip(mock_admin_user, exported_posts):
+    author_id, post_ids = exported_posts
+    headers = {"Authorization": f"Bearer {mock_admin_user['token']}"}
+    response = client.get("/api/v1/admin/export", headers=headers, params={"author_id": author_id, "format": "ndjson.gz"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    # TestClient doesn't decode the body as it has no Content-Encoding
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["type"] for line in lines].count("post") == 3
+
+    assert client.get("/api/v1/admin/export", headers=headers, params={"format": "csv"}).status_code == 400
+    assert client.get("/api/v1/admin/export", headers=headers, params={"before_id": "bogus"}).status_code == 400
+
+def test_import_splits_chunks_into_batches():
+    importer = bulk.BulkImporter(batch_size=2, compressed=True)
+    data = gzip.compress(b"a\nb\n\nc\nd")
+    batches = list(importer.feed(data[:10])) + list(importer.feed(data[10:])) + list(importer.close())
+    assert batches == [[(1, b"a"), (2, b"b")], [(4, b"c"), (5, b"d")]]
+
+def test_import_inflates_a_bounded_slice_at_a_time():
+    importer = bulk.BulkImporter(batch_size=1, compressed=True)
+    # 64 MiB of lines compress to well under 1 MiB
+    feed = importer.feed(gzip.compress(b"x\n" * (32 * 1024 * 1024)))
+    assert next(feed) == [(1, b"x")]
+    # Only the first slice has been inflated and split
+    assert importer.stats.lines <= bulk.EXPORT_CHUNK_SIZE // 2
+
+def test_import_rejects_overlong_lines():
+    importer = bulk.BulkImporter(max_line_bytes=10)
+    with pytest.raises(bulk.LineTooLongError):
+        list(importer.feed(b"x" * 11))
+    with pytest.raises(bulk.LineTooLongError):
+        list(bulk.BulkImporter(max_line_bytes=10).feed(b"short\n" + b"y" * 20 + b"\n"))
+
+def test_import_forgets_old_ids_beyond_the_cap():
+    importer = bulk.BulkImporter(max_remapped_ids=2)
+    for n in range(3):
+        importer._validate_post(n, {"title": "T", "body": "B", "author_id": "a"}, f"old{n}")
+    assert list(importer._new_ids) == ["old1", "old2"]
+
+def test_import_round_trip_remaps_ids(exported_posts):
+    author_id, post_ids = exported_posts
+    data = b"".join(bulk.export_stream(crud.export_post_filters(author_id=author_id)))
+    first_comment = db['comments'].find_one({"post_id": str(post_ids[0])}, sort=[("_id", 1)])
+    # A reply, to check parent_id is remapped too
+    reply = bulk._line("comment", {"_id": ObjectId(), "post_id": str(post_ids[0]), "parent_id": str(first_comment["_id"]),
+                                   "author_id": author_id, "body": "Reply"})
+    importer = bulk.BulkImporter(batch_size=3)
+    try:
+        importer.import_chunk(data.replace(b'{"type": "summary"', reply + b'{"type": "summary"'))
+        importer.import_rest()
+        stats = importer.finish()
+
+        assert (stats.posts, stats.comments, stats.invalid, stats.failed) == (3, 6, 0, 0)
+        copies = list(db['posts'].find({"author_id": author_id, "_id": {"$nin": post_ids}}).sort("_id", 1))
+        assert [post["title"] for post in copies] == ["Export 0", "Export 1", "Export 2"]
+        assert copies[0]["body_preview"] == "Body"
+        copied_comments = list(db['comments'].find({"post_id": str(copies[0]["_id"])}).sort("_id", 1))
+        assert len(copied_comments) == 4
+        assert copied_comments[-1]["parent_id"] == str(copied_comments[0]["_id"])
+    finally:
+        copy_ids = [post["_id"] for post in db['posts'].find({"author_id": author_id, "_id": {"$nin": post_ids}})]
+        db['comments'].delete_many({"post_id": {"$in": [str(post_id) for post_id in copy_ids]}})
+        db['posts'].delete_many({"_id": {"$in": copy_ids}})
+
+def test_admin_import_reports_bad_records_without_aborting(mock_admin_user):
+    author_id = str(ObjectId())
+    lines = [
+        bulk._line("post", {"_id": ObjectId(), "title": "Imported", "body": "Body", "author_id": author_id}),
+        b"{not json\n",
+        bulk._line("post", {"_id": ObjectId(), "author_id": author_id}),
+        bulk._line("comment", {"post_id": str(ObjectId()), "author_id": author_id, "body": "Nowhere"}),
+    ]
+    try:
+        response = client.post(
+            "/api/v1/admin/import",
+            headers={"Authorization": f"Bearer {mock_admin_user['token']}", "Content-Type": bulk.GZIP_MEDIA_TYPE},
+            params={"batch_size": 2},
+            content=gzip.compress(b"".join(lines))
+        )
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["posts"] == 1 and stats["invalid"] == 3 and stats["batches"] == 2
+        assert [error["line"] for error in stats["errors"]] == [2, 3, 4]
+        assert db['posts'].count_documents({"author_id": author_id}) == 1
+    finally:
+        db['posts'].delete_many({"author_id": author_id})
@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime, timezone
+from bson.objectid import ObjectId
+
+from app import crud, comment_migration
+from app.database import db
+
+def embedded_comment(n, **fields):
+    return {"_id": ObjectId(), "user_id": "legacy-author", "content": f"Legacy {n}",
+            "created_at": datetime(2020, 1, 1, 0, n, tzinfo=timezone.utc), **fields}
+
+@pytest.fixture
+def legacy_posts():
+    """Posts after a fresh ObjectId with comments embedded the old way"""
+    start = ObjectId()
+    post_ids = db['posts'].insert_many([
+        {"title": "Legacy 0", "body": "Body", "author_id": "legacy-author",
+         "comments": [embedded_comment(n) for n in range(3)]},
+        {"title": "Legacy 1", "body": "Body", "author_id": "legacy-author",
+         "comments": [embedded_comment(3), {"content": "No author"}]},
+        {"title": "Legacy 2", "body": "Body", "author_id": "legacy-author", "comments": []},
+    ]).inserted_ids
+    yield str(start), [str(post_id) for post_id in post_ids]
+    db['comments'].delete_many({"post_id": {"$in": [str(post_id) for post_id in post_ids]}})
+    db['posts'].delete_many({"_id": {"$in": post_ids}})
+    db['checkpoints'].delete_one({"_id": comment_migration.MIGRATION_JOB})
+
+def test_legacy_comment_document_maps_old_fields():
+    post_id = str(ObjectId())
+    created_at = datetime(2021, 6, 1, tzinfo=timezone.utc)
+    document = crud.legacy_comment_document(post_id, {"user_id": "u1", "content": "Hi", "created_at": created_at}, 4)
+
+    assert document["author_id"] == "u1" and document["body"] == "Hi" and document["post_id"] == post_id
+    # Without an embedded _id, one is derived from the post, position and creation time
+    assert document["_id"] == crud.legacy_comment_document(post_id, {"user_id": "u1", "content": "Hi", "created_at": created_at}, 4)["_id"]
+    assert document["_id"] != crud.legacy_comment_document(post_id, {"user_id": "u1", "content": "Hi", "created_at": created_at}, 5)["_id"]
+    assert document["_id"].generation_time == created_at
+
+def test_created_at_key_falls_back_to_id_time():
+    comment_id = ObjectId()
+    assert crud._created_at_key({"_id": comment_id}) == comment_id.generation_time
+    assert crud._created_at_key({"_id": comment_id, "created_at": None}) == comment_id.generation_time
+
+def test_reads_serve_both_layouts(legacy_posts):
+    _, post_ids = legacy_posts
+    embedded_id = db['posts'].find_one({"_id": ObjectId(post_ids[0])})["comments"][1]["_id"]
+    created = crud.create_comment(post_ids[0], {"author_id": "new-author", "body": "New"})
+    assert db['comments'].find_one({"_id": ObjectId(created.id)})["created_at"]
+
+    comments = crud.get_comments_for_post_v2(post_ids[0])
+    assert [comment.body for comment in comments] == ["New", "Legacy 2", "Legacy 1", "Legacy 0"]
+    assert [comment.body for comment in crud.get_comments_for_post_v2(post_ids[0], limit=2, skip=1)] == ["Legacy 2", "Legacy 1"]
+    assert crud.get_comment_by_id(str(embedded_id)).body == "Legacy 1"
+    # New comments no longer go into the array
+    assert len(db['posts'].find_one({"_id": ObjectId(post_ids[0])})["comments"]) == 3
+
+def test_user_comments_serve_both_layouts(legacy_posts):
+    _, post_ids = legacy_posts
+    # Copied by an interrupted run but still embedded: listed once
+    crud.insert_migrated_comments(crud.convert_embedded_comments(post_ids[0], db['posts'].find_one({"_id": ObjectId(post_ids[0])})["comments"][:1]))
+
+    comments = crud.get_comments_by_user_id("legacy-author")
+    assert [comment.body for comment in comments] == ["Legacy 3", "Legacy 2", "Legacy 1", "Legacy 0"]
+    assert [comment.body for comment in crud.get_comments_by_user_id("legacy-author", limit=2, skip=1)] == ["Legacy 2", "Legacy 1"]
+
+def test_migration_moves_valid_posts_and_is_rerunnable(legacy_posts):
+    start_id, post_ids = legacy_posts
+    before = [comment.id for comment in crud.get_comments_for_post_v2(post_ids[0])]
+
+    last_id, counts = comment_migration.migrate_batch(start_id, batch_size=10)
+    assert last_id == post_ids[2]
+    assert counts["posts_migrated"] == 2 and counts["posts_skipped"] == 1
+    assert counts["comments_copied"] == 4 and counts["comments_invalid"] == 1
+
+    # Migrated posts lose their array and read the same from the collection
+    assert "comments" not in db['posts'].find_one({"_id": ObjectId(post_ids[0])})
+    assert [comment.id for comment in crud.get_comments_for_post_v2(post_ids[0])] == before
+    # The post with an invalid comment keeps its array, and still reads both
+    assert len(db['posts'].find_one({"_id": ObjectId(post_ids[1])})["comments"]) == 2
+    assert [comment.body for comment in crud.get_comments_for_post_v2(post_ids[1])] == ["Legacy 3"]
+
+    # Rerunning copies nothing twice
+    last_id, counts = comment_migration.migrate_batch(start_id, batch_size=10)
+    assert counts["posts_scanned"] == 1 and counts["comments_failed"] == 0
+    assert db['comments'].count_documents({"post_id": post_ids[1]}) == 1
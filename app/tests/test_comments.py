@@ -67,9 +67,9 @@ def create_test_post_with_comment(mock_user):
         "author_id": mock_user
     }
     
-    # Clean up - remove the test post and comment
+    # Clean up - remove the test post and its comments, including ones tests added
     db['posts'].delete_one({"_id": ObjectId(post_id)})
-    db['comments'].delete_one({"_id": ObjectId(comment_data["id"])})
+    db['comments'].delete_many({"post_id": post_id})
 
 @pytest.fixture
 def create_test_post_with_nested_comments(mock_user):
@@ -578,6 +578,18 @@ def test_get_nonexistent_comment_api():
     assert response.status_code == 404
     assert "Comment not found" in response.json()["detail"]
 
+def test_get_comment_of_deleted_post_api(create_test_post_with_comment):
+    """Test that comments of a deleted post are not served before the cascade removes them"""
+    post_id = create_test_post_with_comment["post_id"]
+    comment_id = create_test_post_with_comment["comment_id"]
+
+    etag = client.get(f"/api/v1/comments/{comment_id}").headers["etag"]
+    # Deleted, with its comments still waiting for the cascade
+    db['posts'].delete_one({"_id": ObjectId(post_id)})
+
+    assert client.get(f"/api/v1/comments/{comment_id}").status_code == 404
+    assert client.get(f"/api/v1/comments/{comment_id}", headers={"If-None-Match": etag}).status_code == 404
+
 def test_update_comment_api(create_test_post_with_comment):
     """Test the PUT /comments/{comment_id} endpoint"""
     comment_id = create_test_post_with_comment["comment_id"]
@@ -898,4 +910,35 @@ def test_create_reply_nonexistent_comment_api(mock_user):
     )
     
     assert response.status_code == 404
-    assert "Parent comment not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Parent comment not found" in response.json()["detail"]
+
+
+def test_conditional_get_comments_api(create_test_post_with_comment):
+    """Test 304 responses for an unchanged comment and comment list"""
+    post_id = create_test_post_with_comment["post_id"]
+    comment_id = create_test_post_with_comment["comment_id"]
+    token = create_test_post_with_comment["token"]
+
+    response = client.get(f"/api/v1/comments/{comment_id}")
+    assert response.status_code == 200
+    comment_etag = response.headers["etag"]
+    response = client.get(f"/api/v1/comments/{comment_id}", headers={"If-None-Match": comment_etag})
+    assert response.status_code == 304
+
+    response = client.get(f"/api/v1/posts/{post_id}/comments")
+    assert response.status_code == 200
+    list_etag = response.headers["etag"]
+    response = client.get(f"/api/v1/posts/{post_id}/comments", headers={"If-None-Match": list_etag})
+    assert response.status_code == 304
+
+    # A new comment invalidates the list
+    response = client.post(
+        f"/api/v1/posts/{post_id}/comments",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"body": "Another comment"}
+    )
+    assert response.status_code == 201
+    response = client.get(f"/api/v1/posts/{post_id}/comments", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    # The fixture teardown removes both comments
@@ -3,14 +3,14 @@ from datetime import datetime
 from bson.objectid import ObjectId
 from unittest.mock import patch, MagicMock
 
-from app.models import UserModel, PostModel
+from app.models import UserModel, UserPublic, UserSession, PostModel
 from app.crud import (
     # User operations
     create_user, get_user_by_email, get_user_by_id, get_all_users,
-    update_user, delete_user,
+    update_user, delete_user, UserProfile, user_projection,
     # Post operations
     create_post, get_post_by_id, get_all_posts, get_posts_by_author,
-    update_post, delete_post, search_posts, filter_posts,
+    update_post, update_post_owned, UpdateOutcome, delete_post, post_exists, search_posts, filter_posts,
     get_filtered_posts, get_posts_by_category, get_posts_by_author_and_category
 )
 
@@ -35,6 +35,9 @@ def mock_users_collection():
 
 @pytest.fixture
 def mock_posts_collection():
+    from app.negative_cache import missing_posts
+    # Misses cached by earlier tests would skip the mocked queries
+    missing_posts.clear()
     with patch('app.crud.posts_collection') as mock_collection:
         yield mock_collection
 
@@ -93,7 +96,7 @@ class TestUserCRUD:
         result = get_user_by_email("test@example.com")
         
         # Verify
-        mock_users_collection.find_one.assert_called_once_with({"email": "test@example.com"})
+        mock_users_collection.find_one.assert_called_once_with({"email": "test@example.com"}, user_projection(UserProfile.SESSION))
         assert result.id == str(mock_user_data["_id"])
         assert result.email == mock_user_data["email"]
 
@@ -105,7 +108,7 @@ class TestUserCRUD:
         result = get_user_by_email("nonexistent@example.com")
         
         # Verify
-        mock_users_collection.find_one.assert_called_once_with({"email": "nonexistent@example.com"})
+        mock_users_collection.find_one.assert_called_once_with({"email": "nonexistent@example.com"}, user_projection(UserProfile.SESSION))
         assert result is None
 
     def test_get_user_by_email_exception(self, mock_users_collection):
@@ -125,10 +128,24 @@ class TestUserCRUD:
         result = get_user_by_id(user_id)
         
         # Verify
-        mock_users_collection.find_one.assert_called_once_with({"_id": ObjectId(user_id)})
+        mock_users_collection.find_one.assert_called_once_with({"_id": ObjectId(user_id)}, user_projection(UserProfile.SESSION))
         assert result.id == user_id
         assert result.email == mock_user_data["email"]
 
+    def test_get_user_by_id_profiles(self, mock_users_collection, mock_user_data):
+        user_id = str(mock_user_data["_id"])
+        mock_users_collection.find_one.return_value = mock_user_data
+
+        assert isinstance(get_user_by_id(user_id, UserProfile.PUBLIC), UserPublic)
+        assert isinstance(get_user_by_id(user_id, UserProfile.SESSION), UserSession)
+        assert isinstance(get_user_by_id(user_id, UserProfile.CREDENTIAL), UserModel)
+
+        # No profile loads tokens, and only the credential profile loads the password hash
+        projections = [call.args[1] for call in mock_users_collection.find_one.call_args_list]
+        assert projections[0] == {"email": 1, "created_at": 1}
+        assert "hashed_password" not in projections[1] and "tokens" not in projections[1]
+        assert projections[2] == {"tokens": 0}
+
     def test_get_user_by_id_not_found(self, mock_users_collection):
         # Setup
         mock_users_collection.find_one.return_value = None
@@ -308,6 +325,66 @@ class TestPostCRUD:
         )
         assert result.modified_count == 1
 
+    def test_update_post_owned_filters_on_owner_and_changes(self, mock_posts_collection, mock_post_data):
+        # Setup
+        post_id = str(mock_post_data["_id"])
+        mock_posts_collection.find_one.return_value = mock_post_data
+        mock_posts_collection.find_one_and_update.return_value = None
+        
+        # Execute: another user's update matches nothing, and the classifying read finds the owner
+        post, outcome = update_post_owned(post_id, {"title": "Updated Title"}, owner_id="someone-else")
+        
+        # Verify
+        query = mock_posts_collection.find_one_and_update.call_args[0][0]
+        assert query == {
+            "_id": ObjectId(post_id),
+            "$or": [{"title": {"$ne": "Updated Title"}}],
+            "author_id": "someone-else"
+        }
+        assert post is None
+        assert outcome == UpdateOutcome.FORBIDDEN
+
+    def test_update_post_owned_unchanged_and_not_found(self, mock_posts_collection, mock_post_data):
+        # Setup
+        post_id = str(mock_post_data["_id"])
+        mock_posts_collection.find_one_and_update.return_value = None
+        mock_posts_collection.find_one.return_value = mock_post_data
+        
+        # Execute / Verify: the owner setting the current title is a no-op
+        post, outcome = update_post_owned(post_id, {"title": "Test Post"}, owner_id=mock_post_data["author_id"])
+        assert outcome == UpdateOutcome.UNCHANGED
+        assert post.title == "Test Post"
+        
+        # Execute / Verify: no changes at all skips the write
+        mock_posts_collection.find_one_and_update.reset_mock()
+        post, outcome = update_post_owned(post_id, {})
+        mock_posts_collection.find_one_and_update.assert_not_called()
+        assert outcome == UpdateOutcome.UNCHANGED
+        
+        mock_posts_collection.find_one.return_value = None
+        assert update_post_owned(post_id, {"title": "x"}) == (None, UpdateOutcome.NOT_FOUND)
+        assert update_post_owned("not-an-id", {"title": "x"}) == (None, UpdateOutcome.NOT_FOUND)
+
+    def test_post_exists_caches_misses(self, mock_posts_collection, mock_post_data):
+        # Setup
+        post_id = str(mock_post_data["_id"])
+        mock_posts_collection.find_one.return_value = None
+        
+        # Execute: the second lookup of a missing post is answered from the negative cache
+        assert post_exists(post_id) is False
+        assert post_exists(post_id) is False
+        assert post_exists("not-an-id") is False
+        
+        # Verify
+        mock_posts_collection.find_one.assert_called_once_with({"_id": ObjectId(post_id)}, {"_id": 1})
+        
+        # Creating a post with that ID forgets the miss
+        mock_posts_collection.insert_one.return_value = MagicMock(inserted_id=mock_post_data["_id"])
+        with patch('app.crud.bump_version'):
+            create_post(PostModel(**mock_post_data))
+        mock_posts_collection.find_one.return_value = {"_id": mock_post_data["_id"]}
+        assert post_exists(post_id) is True
+
     def test_delete_post(self, mock_posts_collection, mock_post_data):
         # Setup
         post_id = str(mock_post_data["_id"])
@@ -414,4 +491,15 @@ class TestPostCRUD:
         mock_cursor.skip.assert_called_once_with(0)
         mock_cursor.limit.assert_called_once_with(10)
         mock_cursor.sort.assert_called_once_with("created_at", -1)
-        assert len(result) == 1
\ No newline at end of file
+        assert len(result) == 1
+# ===== Job Queue Tests =====
+
+def test_enqueue_job_returns_the_winner_of_a_dedupe_race():
+    from pymongo.errors import DuplicateKeyError
+    from app.crud import enqueue_job
+    winner = ObjectId()
+    with patch('app.crud.jobs_collection') as mock_collection:
+        mock_collection.find_one_and_update.side_effect = DuplicateKeyError("E11000 duplicate key")
+        mock_collection.find_one.return_value = {"_id": winner}
+        assert enqueue_job("cascade_delete", {}, dedupe_key="post:1") == str(winner)
+        assert mock_collection.find_one.call_args[0][0]["dedupe_key"] == "post:1"
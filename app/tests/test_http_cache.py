@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from starlette.requests import Request
+
+from app import http_cache
+
+def make_request(headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/posts/1",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+MODIFIED_AT = datetime(2024, 1, 1, 0, 0, 0, 500000)
+
+def test_if_none_match_takes_precedence():
+    etag = http_cache.document_etag("1", MODIFIED_AT)
+    assert http_cache.is_not_modified(make_request({"If-None-Match": f'"other", W/{etag}'}), etag, MODIFIED_AT)
+    assert not http_cache.is_not_modified(
+        make_request({"If-None-Match": '"other"', "If-Modified-Since": "Tue, 02 Jan 2024 00:00:00 GMT"}), etag, MODIFIED_AT
+    )
+
+def test_if_modified_since_accepts_naive_utc_dates():
+    etag = http_cache.document_etag("1", MODIFIED_AT)
+    # "-0000" parses to a naive datetime; it must compare as UTC, not raise
+    assert http_cache.is_not_modified(make_request({"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 -0000"}), etag, MODIFIED_AT)
+    assert not http_cache.is_not_modified(
+        make_request({"If-Modified-Since": "Sun, 31 Dec 2023 23:59:59 -0000"}), etag, MODIFIED_AT.replace(tzinfo=timezone.utc)
+    )
+    assert not http_cache.is_not_modified(make_request({"If-Modified-Since": "yesterday"}), etag, MODIFIED_AT)
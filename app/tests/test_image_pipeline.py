@@ -0,0 +1,72 @@
+import os
+import pytest
+from datetime import datetime
+
+from app.models import ImageModel, ImageVariant
+from app.image_pipeline import ImagePipeline, render_variants, select_variant
+
+def make_variant(width, fmt):
+    return ImageVariant(
+        width=width,
+        height=width // 2,
+        format=fmt,
+        content_type=f"image/{fmt}",
+        object_name=f"posts/1/images/variants/photo-{width}.{fmt}",
+        file_size=width * 10
+    )
+
+@pytest.fixture
+def image_with_variants():
+    return ImageModel(
+        filename="photo.png",
+        filepath="posts/1/images/photo.png",
+        url="",
+        uploaded_by="user",
+        upload_date=datetime.utcnow(),
+        file_size=100000,
+        content_type="image/png",
+        post_id="1",
+        bucket_name="blog-images",
+        variants=[make_variant(w, f) for w in (320, 640, 1280) for f in ("webp", "jpeg")]
+    )
+
+def test_select_variant_prefers_webp_when_accepted(image_with_variants):
+    variant = select_variant(image_with_variants, width=500, accept="image/avif,image/webp,*/*")
+    assert variant.format == "webp"
+    assert variant.width == 640
+
+def test_select_variant_falls_back_to_jpeg(image_with_variants):
+    variant = select_variant(image_with_variants, width=300, accept="image/*")
+    assert variant.format == "jpeg"
+    assert variant.width == 320
+
+def test_select_variant_without_width_uses_largest(image_with_variants):
+    assert select_variant(image_with_variants, accept="").width == 1280
+
+def test_select_variant_too_wide_uses_original(image_with_variants):
+    assert select_variant(image_with_variants, width=4000) is None
+
+def test_select_variant_without_variants(image_with_variants):
+    image_with_variants.variants = []
+    assert select_variant(image_with_variants, width=320) is None
+
+def test_render_variants(tmp_path):
+    from PIL import Image
+
+    source = tmp_path / "original.png"
+    Image.new("RGBA", (1000, 500), (255, 0, 0, 128)).save(source)
+
+    rendered = render_variants(str(source), str(tmp_path), [320, 640, 1280], ["webp", "jpeg"], 80)
+
+    # 1280 is wider than the original and is skipped
+    assert sorted((r["width"], r["format"]) for r in rendered) == [
+        (320, "jpeg"), (320, "webp"), (640, "jpeg"), (640, "webp")
+    ]
+    for item in rendered:
+        assert os.path.exists(item["path"])
+        assert item["height"] == item["width"] // 2
+
+def test_enqueue_rejects_when_not_running():
+    pipeline = ImagePipeline(workers=1, queue_size=1)
+    assert pipeline.enqueue("abc") is False
+    assert pipeline.get_stats()["queue_depth"] == 0
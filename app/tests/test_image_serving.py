@@ -0,0 +1,77 @@
+import asyncio
+import io
+from datetime import timedelta
+import pytest
+
+from app.object_storage import MockMinioClient
+from app.image_serving import (
+    DiskImageCache, ImageProxy, RangeNotSatisfiable, is_not_modified, parse_range, range_applies, stat
+)
+
+DATA = bytes(range(256)) * 40
+
+@pytest.fixture
+def stored_object():
+    client = MockMinioClient()
+    client.put_object("blog-images", "blobs/sha256/ab/abc", io.BytesIO(DATA), len(DATA), content_type="image/png")
+    return client, stat(client, "blog-images", "blobs/sha256/ab/abc")
+
+def collect(stream):
+    async def run():
+        return b"".join([chunk async for chunk in stream])
+    return asyncio.run(run())
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    # Multiple or malformed ranges fall back to the full object
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+def test_conditional_headers(stored_object):
+    _, info = stored_object
+    assert is_not_modified({"if-none-match": info.etag_header}, info)
+    assert is_not_modified({"if-none-match": f'"other", W/{info.etag_header}'}, info)
+    assert not is_not_modified({"if-none-match": '"other"'}, info)
+    later = (info.last_modified + timedelta(seconds=5)).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    assert is_not_modified({"if-modified-since": later}, info)
+    assert not is_not_modified({"if-modified-since": "Mon, 01 Jan 2001 00:00:00 GMT"}, info)
+    # "-0000" dates parse as naive UTC and must not break the comparison
+    assert is_not_modified({"if-modified-since": later.replace("GMT", "-0000")}, info)
+    assert not is_not_modified({"if-modified-since": "Mon, 01 Jan 2001 00:00:00 -0000"}, info)
+    assert range_applies({"if-range": info.etag_header}, info)
+    assert not range_applies({"if-range": '"stale"'}, info)
+
+def test_proxy_streams_requested_range_in_chunks(stored_object):
+    client, info = stored_object
+    proxy = ImageProxy(max_concurrency=2, chunk_size=1000)
+    assert collect(proxy.stream(client, info, 100, 5000)) == DATA[100:5100]
+    stats = proxy.get_stats()
+    assert stats["served"] == 1
+    assert stats["bytes_sent"] == 5000
+    assert stats["active_streams"] == 0
+
+def test_disk_cache_serves_hot_objects_and_evicts(stored_object, tmp_path):
+    client, info = stored_object
+    cache = DiskImageCache(str(tmp_path), max_bytes=len(DATA) * 2)
+    proxy = ImageProxy(chunk_size=4096, disk_cache=cache)
+
+    assert collect(proxy.stream(client, info, 0, len(DATA))) == DATA
+    assert collect(proxy.stream(client, info, 10, 20)) == DATA[10:30]
+    assert client.calls["fget_object"] == 1
+    assert cache.stats()["hits"] == 1
+
+    for i in range(3):
+        name = f"blobs/sha256/cd/{i}"
+        client.put_object("blog-images", name, io.BytesIO(DATA), len(DATA))
+        collect(proxy.stream(client, stat(client, "blog-images", name), 0, len(DATA)))
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= len(DATA) * 2
+    assert stats["evictions"] == 2
+    assert cache.get(info) is None
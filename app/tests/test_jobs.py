@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from bson.objectid import ObjectId
+
+from app import crud
+from app.database import db
+from app.jobs import JobRunner
+
+@pytest.fixture
+def job_type_name():
+    name = f"test_job_{ObjectId()}"
+    yield name
+    db['jobs'].delete_many({"type": name})
+
+def claim_and_run(runner, name):
+    job = crud.claim_job(name, 60)
+    assert job is not None
+    asyncio.run(runner.run_job(runner._types[name], job))
+    return db['jobs'].find_one({"_id": job["_id"]})
+
+def test_job_completes(job_type_name):
+    seen = []
+    runner = JobRunner()
+    runner.register(job_type_name, lambda job: seen.append(job["payload"]["n"]))
+    runner.enqueue(job_type_name, {"n": 1})
+
+    job = claim_and_run(runner, job_type_name)
+    assert seen == [1]
+    assert job["status"] == "done"
+    assert runner.get_stats()[job_type_name]["completed"] == 1
+    # A claimed job can't be claimed again
+    assert crud.claim_job(job_type_name, 60) is None
+
+def test_failed_job_is_retried_with_backoff_then_fails(job_type_name):
+    async def fail(job):
+        raise ValueError("boom")
+    runner = JobRunner()
+    runner.register(job_type_name, fail, max_attempts=2, retry_delay=0)
+    runner.enqueue(job_type_name, {})
+
+    job = claim_and_run(runner, job_type_name)
+    assert job["status"] == "queued"
+    assert "boom" in job["last_error"]
+
+    job = claim_and_run(runner, job_type_name)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert runner.get_stats()[job_type_name]["retried"] == 1
+
+def test_retry_delay_is_exponential_and_capped(job_type_name):
+    runner = JobRunner(max_retry_delay=30)
+    runner.register(job_type_name, print, retry_delay=5)
+    job_type = runner._types[job_type_name]
+    assert [runner.retry_delay(job_type, attempt) for attempt in (1, 2, 3, 4)] == [5, 10, 20, 30]
+
+def test_dedupe_key_reuses_pending_job(job_type_name):
+    runner = JobRunner()
+    runner.register(job_type_name, print)
+    first = runner.enqueue(job_type_name, {}, dedupe_key="same")
+    assert runner.enqueue(job_type_name, {}, dedupe_key="same") == first
+    assert crud.get_job_queue_stats(since=db['jobs'].find_one({"_id": ObjectId(first)})["created_at"])[job_type_name]["queued"] == 1
+
+def test_concurrent_enqueues_with_a_dedupe_key_create_one_job(job_type_name):
+    from concurrent.futures import ThreadPoolExecutor
+    crud.setup_job_indexes(86400)
+    runner = JobRunner()
+    runner.register(job_type_name, print)
+    key = f"concurrent:{job_type_name}"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        job_ids = set(pool.map(lambda _: runner.enqueue(job_type_name, {}, dedupe_key=key), range(16)))
+    assert len(job_ids) == 1
+    assert db['jobs'].count_documents({"dedupe_key": key}) == 1
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+
+from app import crud
+from app.database import db
+from app.leader import LeaderElector, PeriodicTask
+
+@pytest.fixture
+def lease_name():
+    name = f"test_lease_{ObjectId()}"
+    yield name
+    db['leases'].delete_many({"_id": name})
+
+def test_only_one_worker_is_elected(lease_name):
+    elected = []
+    first = LeaderElector(lease_name, lease_seconds=30, holder="a")
+    second = LeaderElector(lease_name, lease_seconds=30, holder="b")
+    for elector in (first, second):
+        elector.on_elected(lambda elector=elector: elected.append(elector.holder))
+
+    async def campaign():
+        await first.campaign()
+        await second.campaign()
+        # Renewing keeps the term and doesn't rerun startup tasks
+        await first.campaign()
+    asyncio.run(campaign())
+
+    assert first.is_leader and not second.is_leader
+    assert elected == ["a"]
+    assert crud.get_lease(lease_name)["holder"] == "a"
+
+def test_release_hands_over_with_a_new_fencing_token(lease_name):
+    first = LeaderElector(lease_name, lease_seconds=30, holder="a")
+    second = LeaderElector(lease_name, lease_seconds=30, holder="b")
+
+    async def failover():
+        await first.campaign()
+        old_token = first.token
+        await first.stop()
+        await second.campaign()
+        return old_token
+    old_token = asyncio.run(failover())
+
+    assert second.is_leader
+    assert second.token > old_token
+    # The old term is fenced off
+    assert not crud.renew_lease(lease_name, old_token, 30)
+    assert not crud.record_periodic_run(lease_name, old_token, "task")
+    assert crud.record_periodic_run(lease_name, second.token, "task")
+
+def test_deposed_leader_steps_down(lease_name):
+    leader = LeaderElector(lease_name, lease_seconds=30, holder="a")
+    asyncio.run(leader.campaign())
+    db['leases'].update_one({"_id": lease_name}, {"$set": {"expires_at": datetime.now(timezone.utc)}})
+    assert crud.acquire_lease(lease_name, "b", 30) is not None
+
+    asyncio.run(leader.campaign())
+    assert not leader.is_leader
+
+def test_periodic_task_due_time_follows_last_run(lease_name):
+    leader = LeaderElector(lease_name)
+    task = PeriodicTask("task", print, interval=60)
+    assert leader._due_in(task) == 0
+    task.last_run_at = datetime.now(timezone.utc) - timedelta(seconds=45)
+    assert 14 <= leader._due_in(task) <= 15
+    task.last_run_at = datetime.now(timezone.utc) - timedelta(seconds=120)
+    assert leader._due_in(task) == 0
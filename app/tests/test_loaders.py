@@ -0,0 +1,59 @@
+import asyncio
+
+from app.loaders import DataLoader
+
+def make_loader(values):
+    batches = []
+    def batch_load(keys):
+        batches.append(sorted(keys))
+        return {key: values[key] for key in keys if key in values}
+    return DataLoader(batch_load), batches
+
+def test_loads_in_the_same_tick_share_one_batch():
+    loader, batches = make_loader({"a": 1, "b": 2, "c": 3})
+
+    async def run():
+        return await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+
+    assert asyncio.run(run()) == [1, 2, 1, None]
+    assert batches == [["a", "b", "missing"]]
+
+def test_results_are_memoized_for_the_request():
+    loader, batches = make_loader({"a": 1, "b": 2})
+
+    async def run():
+        first = await loader.load("a")
+        again = await loader.load_many(["a", "b"])
+        return first, again
+
+    assert asyncio.run(run()) == (1, [1, 2])
+    assert batches == [["a"], ["b"]]
+
+def test_prime_and_clear():
+    loader, batches = make_loader({"a": 1})
+
+    async def run():
+        loader.prime("a", 10)
+        primed = await loader.load("a")
+        loader.clear("a")
+        return primed, await loader.load("a"), await loader.load(None)
+
+    assert asyncio.run(run()) == (10, 1, None)
+    assert batches == [["a"]]
+
+def test_failures_propagate_and_are_not_memoized():
+    calls = []
+    def batch_load(keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise RuntimeError("database down")
+        return {key: key.upper() for key in keys}
+    loader = DataLoader(batch_load)
+
+    async def run():
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+        return results, await loader.load("a")
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "A"
@@ -0,0 +1,31 @@
+from app.negative_cache import NegativeCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_misses_expire():
+    clock = FakeClock()
+    cache = NegativeCache(ttl=30, clock=clock)
+    cache.add("a")
+    assert "a" in cache
+    clock.now += 31
+    assert "a" not in cache
+    assert cache.stats()["entries"] == 0
+
+def test_discard_and_size_bound():
+    cache = NegativeCache(ttl=30, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.add(key)
+    assert "a" not in cache
+    assert "b" in cache and "c" in cache
+    assert cache.stats()["evictions"] == 1
+    cache.discard("b")
+    assert "b" not in cache
+
+def test_zero_ttl_disables_cache():
+    cache = NegativeCache(ttl=0)
+    cache.add("a")
+    assert "a" not in cache
@@ -0,0 +1,279 @@
+import hashlib
+import io
+import tempfile
+import tracemalloc
+from datetime import timedelta
+import pytest
+from minio.error import S3Error
+
+from app import object_storage
+from app.object_storage import (
+    MockMinioClient, MinioStorage, stream_upload, sniff_content_type,
+    UploadTooLargeError, UploadSizeMismatchError, UnsupportedContentTypeError, StorageError, ObjectNotFoundError
+)
+
+@pytest.fixture
+def mock_storage(monkeypatch):
+    """Run the shared storage client lifecycle against MockMinioClient"""
+    monkeypatch.setenv("TESTING", "true")
+    object_storage.close_storage()
+    client = object_storage.init_storage(["blog-images"])
+    yield client
+    object_storage.close_storage()
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+PART_SIZE = 5 * 1024 * 1024
+
+def make_spooled_file(size: int, header: bytes = PNG_HEADER):
+    """Create a SpooledTemporaryFile like the one Starlette gives UploadFile."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(header)
+    remaining = size - len(header)
+    block = b"\x00" * (1024 * 1024)
+    while remaining > 0:
+        spooled.write(block[:remaining])
+        remaining -= len(block)
+    spooled.seek(0)
+    return spooled
+
+def measure_upload_peak(size: int) -> int:
+    client = MockMinioClient()
+    spooled = make_spooled_file(size)
+    tracemalloc.start()
+    try:
+        stream_upload(client, "blog-images", "posts/1/images/test.png", spooled,
+                      max_size=size, part_size=PART_SIZE)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        spooled.close()
+    return peak
+
+def test_sniff_content_type():
+    assert sniff_content_type(PNG_HEADER + b"rest") == "image/png"
+    assert sniff_content_type(b"\xff\xd8\xff\xe0") == "image/jpeg"
+    assert sniff_content_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_content_type(b"plain text") is None
+
+def test_stream_upload_computes_size_checksum_and_type():
+    client = MockMinioClient()
+    data = PNG_HEADER + b"x" * 10000
+    spooled = make_spooled_file(len(data), header=data)
+
+    result = stream_upload(client, "blog-images", "posts/1/images/a.png", spooled,
+                           declared_content_type="application/octet-stream")
+
+    assert result.size == len(data)
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+    assert result.content_type == "image/png"
+    stored = client.uploaded_files[("blog-images", "posts/1/images/a.png")]
+    assert stored["data_length"] == len(data)
+    assert stored["content_type"] == "image/png"
+
+def test_stream_upload_rejects_oversized_file():
+    client = MockMinioClient()
+    spooled = make_spooled_file(2 * 1024 * 1024)
+    with pytest.raises(UploadTooLargeError):
+        stream_upload(client, "blog-images", "posts/1/images/big.png", spooled, max_size=1024 * 1024)
+
+def test_stream_upload_rejects_disallowed_type():
+    client = MockMinioClient()
+    spooled = make_spooled_file(1024, header=b"%PDF-1.7")
+    with pytest.raises(UnsupportedContentTypeError):
+        stream_upload(client, "blog-images", "posts/1/images/doc.pdf", spooled,
+                      allowed_content_types={"image/png", "image/jpeg"})
+    assert client.uploaded_files == {}
+
+def test_declared_image_type_does_not_override_sniffing():
+    client = MockMinioClient()
+    with pytest.raises(UnsupportedContentTypeError):
+        stream_upload(client, "blog-images", "posts/1/images/fake.png", make_spooled_file(1024, header=b"<html>"),
+                      declared_content_type="image/png", allowed_content_types={"image/png", "image/jpeg"})
+    with pytest.raises(UnsupportedContentTypeError):
+        object_storage.inspect_upload(make_spooled_file(1024, header=PNG_HEADER), "image/jpeg",
+                                      allowed_content_types={"image/png", "image/jpeg"})
+    assert client.uploaded_files == {}
+
+    result = object_storage.inspect_upload(make_spooled_file(1024, header=b"\xff\xd8\xff\xe0"), "image/jpg; q=1",
+                                           allowed_content_types={"image/png", "image/jpeg"})
+    assert result.content_type == "image/jpeg"
+
+def test_stream_upload_peak_memory_is_flat():
+    """Peak memory is bounded by the part size, not by the file size."""
+    small_peak = measure_upload_peak(6 * 1024 * 1024)
+    large_peak = measure_upload_peak(48 * 1024 * 1024)
+
+    # At most a couple of parts are held in memory at any time
+    assert large_peak < 3 * PART_SIZE
+    assert large_peak < small_peak * 1.5
+
+def test_storage_client_is_shared(mock_storage):
+    assert isinstance(mock_storage, MockMinioClient)
+    assert object_storage.get_minio_client() is mock_storage
+    assert object_storage.get_minio_client() is mock_storage
+
+def test_bucket_registry_checks_bucket_once(mock_storage):
+    assert "blog-images" in mock_storage.buckets
+    assert mock_storage.calls["bucket_exists"] == 1
+
+    for _ in range(5):
+        object_storage.bucket_registry.ensure("blog-images")
+
+    assert mock_storage.calls["bucket_exists"] == 1
+    assert mock_storage.calls["make_bucket"] == 1
+
+def test_close_storage_resets_lifecycle(mock_storage):
+    object_storage.close_storage()
+    assert object_storage.bucket_registry.known_buckets() == []
+    assert object_storage.get_minio_client() is not mock_storage
+
+def test_pool_stats(mock_storage):
+    stats = object_storage.get_pool_stats()
+    assert stats["client"] == "MockMinioClient"
+    assert stats["buckets"] == ["blog-images"]
+    assert stats["pools"] == []
+
+def test_pool_stats_reports_http_pools():
+    http = object_storage._create_http_client()
+    http.connection_from_host("localhost", 9000, scheme="http")
+    client = MockMinioClient()
+    client._http = http
+    object_storage._client = client
+    try:
+        stats = object_storage.get_pool_stats()
+        assert stats["pools"][0]["host"] == "localhost"
+        assert stats["pools"][0]["requests"] == 0
+    finally:
+        object_storage.close_storage()
+
+def test_verify_uploaded_object(mock_storage):
+    data = PNG_HEADER + b"\x00" * 100
+    mock_storage.put_object("blog-images", "posts/1/images/ok.png", io.BytesIO(data), len(data), content_type="image/png")
+
+    stat = object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/ok.png", len(data), "image/png")
+
+    assert stat.size == len(data)
+
+def test_verify_uploaded_object_rejects_mismatch(mock_storage):
+    data = b"not an image at all"
+    mock_storage.put_object("blog-images", "posts/1/images/bad.png", io.BytesIO(data), len(data), content_type="image/png")
+
+    with pytest.raises(UploadSizeMismatchError):
+        object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/bad.png", 5, "image/png")
+    with pytest.raises(UploadTooLargeError):
+        object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/bad.png", len(data), "image/png", max_size=5)
+    with pytest.raises(UnsupportedContentTypeError):
+        object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/bad.png", len(data), "image/png")
+
+def test_verify_uploaded_object_rejects_short_upload(mock_storage):
+    data = PNG_HEADER + b"\x00" * 100
+    mock_storage.put_object("blog-images", "posts/1/images/short.png", io.BytesIO(data), len(data), content_type="image/png")
+
+    # A truncated upload is a size mismatch, not an oversized one
+    with pytest.raises(UploadSizeMismatchError):
+        object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/short.png", len(data) + 50, "image/png")
+
+def test_verify_uploaded_object_missing(mock_storage):
+    with pytest.raises(S3Error):
+        object_storage.verify_uploaded_object(mock_storage, "blog-images", "posts/1/images/none.png", 10, "image/png")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_presigned_url_cache_returns_stable_urls():
+    client = MockMinioClient()
+    clock = FakeClock()
+    cache = object_storage.PresignedUrlCache(
+        maxsize=10, expires=timedelta(hours=2), refresh_window=timedelta(hours=1), clock=clock
+    )
+
+    first = cache.get_url("blog-images", "a.png", client=client)
+    clock.now += 30 * 60
+    second = cache.get_url("blog-images", "a.png", client=client)
+
+    assert first == second
+    assert client.calls["presigned_get_object"] == 1
+
+    # Inside the refresh window the URL is signed again
+    clock.now += 31 * 60
+    cache.get_url("blog-images", "a.png", client=client)
+    assert client.calls["presigned_get_object"] == 2
+
+def test_presigned_url_cache_is_bounded():
+    client = MockMinioClient()
+    cache = object_storage.PresignedUrlCache(maxsize=2)
+
+    for name in ["a.png", "b.png", "c.png"]:
+        cache.get_url("blog-images", name, client=client)
+
+    assert cache.stats()["size"] == 2
+    cache.get_url("blog-images", "a.png", client=client)
+    assert client.calls["presigned_get_object"] == 4
+
+def test_presigned_url_cache_signs_many_keys():
+    client = MockMinioClient()
+    cache = object_storage.PresignedUrlCache(maxsize=100)
+    keys = [("blog-images", f"posts/1/images/{i}.png") for i in range(20)]
+
+    cache.get_urls(keys[:5], client=client)
+    urls = cache.get_urls(keys, client=client)
+
+    assert len(urls) == 20
+    assert client.calls["presigned_get_object"] == 20
+    assert cache.stats()["hits"] == 5
+
+def test_inspect_upload_hashes_without_uploading():
+    data = PNG_HEADER + b"y" * 5000
+    spooled = make_spooled_file(len(data), header=data)
+
+    result = object_storage.inspect_upload(spooled, "image/png")
+
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+    assert result.size == len(data)
+    assert result.content_type == "image/png"
+    # The file is rewound so it can be uploaded afterwards
+    assert spooled.tell() == 0
+
+@pytest.fixture
+def minio_storage():
+    client = MockMinioClient()
+    for i in range(12):
+        client.put_object("blog-images", f"posts/{i % 2}/images/{i:02}.png", io.BytesIO(PNG_HEADER), len(PNG_HEADER))
+    return MinioStorage(client)
+
+def test_iter_objects_is_lazy_and_supports_prefix_and_start_after(minio_storage):
+    names = minio_storage.get_file_names("blog-images", prefix="posts/1/")
+    assert not isinstance(names, list)
+    assert list(names) == [f"posts/1/images/{i:02}.png" for i in range(1, 12, 2)]
+
+    resumed = list(minio_storage.get_file_names("blog-images", prefix="posts/1/", start_after="posts/1/images/07.png"))
+    assert resumed == ["posts/1/images/09.png", "posts/1/images/11.png"]
+
+def test_get_storage_reuses_one_instance_until_closed(mock_storage):
+    storage = object_storage.get_storage()
+    assert object_storage.get_storage() is storage
+    assert storage.client is mock_storage
+    object_storage.close_storage()
+    assert object_storage.get_storage() is not storage
+
+def test_delete_files_uses_batched_requests(minio_storage):
+    names = (name for name in minio_storage.get_file_names("blog-images") if name.startswith("posts/0/"))
+    assert minio_storage.delete_files("blog-images", list(names), batch_size=4) == 6
+    assert minio_storage.client.calls["remove_objects"] == 2
+    assert all(name.startswith("posts/1/") for name in minio_storage.get_file_names("blog-images"))
+
+def test_get_files_metadata_marks_missing_objects(minio_storage):
+    metadata = minio_storage.get_files_metadata(
+        "blog-images", ["posts/0/images/00.png", "posts/0/images/missing.png"], max_workers=2
+    )
+    assert metadata["posts/0/images/00.png"]["size"] == len(PNG_HEADER)
+    assert metadata["posts/0/images/missing.png"] is None
+
+def test_storage_errors_replace_empty_results(minio_storage):
+    with pytest.raises(ObjectNotFoundError):
+        minio_storage.get_file_info("blog-images", "posts/0/images/missing.png")
+    with pytest.raises(StorageError):
+        minio_storage.get_file_metadata("blog-images", "posts/0/images/missing.png")
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+import pytest
+from bson.objectid import ObjectId
+
+from app.pagination import encode_cursor, decode_cursor, keyset_filter, keyset_sort, cursor_after
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    document_id = ObjectId()
+    sort_value, decoded_id = decode_cursor(encode_cursor(created_at, document_id))
+    assert sort_value == created_at
+    assert decoded_id == document_id
+
+@pytest.mark.parametrize("cursor", ["bogus", "", encode_cursor(1, ObjectId()).replace("W", "X")])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_keyset_filter_breaks_ties_on_id():
+    document_id = ObjectId()
+    assert keyset_filter("email", -1, ("b@example.com", document_id)) == {"$or": [
+        {"email": {"$lt": "b@example.com"}},
+        {"email": "b@example.com", "_id": {"$lt": document_id}},
+    ]}
+    assert keyset_filter("_id", 1, (None, document_id)) == {"_id": {"$gt": document_id}}
+    assert keyset_filter("email", 1, None) == {}
+    assert keyset_sort("email", 1) == [("email", 1), ("_id", 1)]
+
+def test_cursor_after_document():
+    document = {"_id": ObjectId(), "email": "a@example.com"}
+    assert decode_cursor(cursor_after(document, "email")) == ("a@example.com", document["_id"])
@@ -251,3 +251,367 @@ def test_missing_post():
     )
     
     assert response.status_code == 404  # Not Found
+
+# ********** Direct-to-storage image upload tests **********
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+def test_presigned_image_upload_flow(create_test_post):
+    """Test reserving an upload URL, uploading to storage and completing the upload"""
+    from app.database import db
+    from app.object_storage import get_minio_client, IMAGE_BUCKET
+
+    post_id = create_test_post["post_id"]
+    token = create_test_post["token"]
+
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images/upload-url",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"filename": "photo.png", "content_type": "image/png", "file_size": len(PNG_BYTES)}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    image_id = data["image_id"]
+    assert data["upload_url"]
+    assert data["headers"]["Content-Type"] == "image/png"
+    assert db['images'].find_one({"_id": ObjectId(image_id)})["status"] == "pending"
+
+    # Completing before the object exists is rejected
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images/{image_id}/complete",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 409
+
+    # Stand in for the client's PUT to the presigned URL
+    get_minio_client().put_object(
+        IMAGE_BUCKET, data["object_name"], io.BytesIO(PNG_BYTES), len(PNG_BYTES), content_type="image/png"
+    )
+
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images/{image_id}/complete",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["file_size"] == len(PNG_BYTES)
+    assert db['images'].find_one({"_id": ObjectId(image_id)})["status"] == "ready"
+
+    db['images'].delete_one({"_id": ObjectId(image_id)})
+
+def test_presigned_image_upload_rejects_short_upload(create_test_post):
+    """Test that completing an upload shorter than declared fails as a size mismatch"""
+    from app.database import db
+    from app.object_storage import get_minio_client, IMAGE_BUCKET
+
+    post_id = create_test_post["post_id"]
+    token = create_test_post["token"]
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images/upload-url",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"filename": "photo.png", "content_type": "image/png", "file_size": len(PNG_BYTES)}
+    )
+    data = response.json()
+    short = PNG_BYTES[:100]
+    get_minio_client().put_object(IMAGE_BUCKET, data["object_name"], io.BytesIO(short), len(short), content_type="image/png")
+
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images/{data['image_id']}/complete",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 422
+    assert "expected" in response.json()["detail"]
+    assert db['images'].find_one({"_id": ObjectId(data["image_id"])})["status"] == "failed"
+
+    db['images'].delete_one({"_id": ObjectId(data["image_id"])})
+
+def test_presigned_image_upload_rejects_oversized_request(create_test_post):
+    """Test that upload URLs are not issued for files over the size limit"""
+    from app.object_storage import MAX_UPLOAD_SIZE
+
+    response = client.post(
+        f"/api/v1/posts/{create_test_post['post_id']}/images/upload-url",
+        headers={"Authorization": f"Bearer {create_test_post['token']}"},
+        json={"filename": "huge.png", "content_type": "image/png", "file_size": MAX_UPLOAD_SIZE + 1}
+    )
+    assert response.status_code == 413
+
+def test_duplicate_image_uploads_share_storage(create_test_post):
+    """Test that identical uploads are stored once and removed with the last reference"""
+    from app.database import db
+    from app.object_storage import get_minio_client, IMAGE_BUCKET
+
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    content = PNG_BYTES + ObjectId().binary  # unique content for this test run
+
+    image_ids = []
+    for name in ("first.png", "second.png"):
+        response = client.post(
+            f"/api/v1/posts/{post_id}/images",
+            headers=headers,
+            files={"file": (name, io.BytesIO(content), "image/png")}
+        )
+        assert response.status_code == 200
+        image_ids.append(response.json()["id"])
+
+    images = [db['images'].find_one({"_id": ObjectId(image_id)}) for image_id in image_ids]
+    assert images[0]["filepath"] == images[1]["filepath"]
+    blob = db['image_blobs'].find_one({"_id": images[0]["sha256"]})
+    assert blob["ref_count"] == 2
+
+    minio_client = get_minio_client()
+    response = client.delete(f"/api/v1/posts/{post_id}/images/{image_ids[0]}", headers=headers)
+    assert response.status_code == 204
+    assert db['image_blobs'].find_one({"_id": blob["_id"]})["ref_count"] == 1
+    assert (IMAGE_BUCKET, blob["object_name"]) in minio_client.uploaded_files
+
+    response = client.delete(f"/api/v1/posts/{post_id}/images/{image_ids[1]}", headers=headers)
+    assert response.status_code == 204
+    assert db['image_blobs'].find_one({"_id": blob["_id"]}) is None
+    assert (IMAGE_BUCKET, blob["object_name"]) not in minio_client.uploaded_files
+
+def test_released_blob_stored_again_keeps_its_object(create_test_post, monkeypatch):
+    """Test that a blob registered again by a concurrent upload after its release keeps its object"""
+    from app import crud
+    from app.database import db
+    from app.models import ImageBlobModel
+    from app.object_storage import get_minio_client, IMAGE_BUCKET
+
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images",
+        headers=headers,
+        files={"file": ("photo.png", io.BytesIO(PNG_BYTES + ObjectId().binary), "image/png")}
+    )
+    assert response.status_code == 200
+    # The URL is signed for the response, not stored
+    assert response.json()["url"]
+    image = db['images'].find_one({"_id": ObjectId(response.json()["id"])})
+    assert image["url"] == ""
+
+    release = crud.release_image_blob
+    def release_then_upload_again(sha256):
+        released = release(sha256)
+        crud.register_image_blob(ImageBlobModel(**{**released.dict(by_alias=True), "ref_count": 0}))
+        return released
+    monkeypatch.setattr(crud, "release_image_blob", release_then_upload_again)
+
+    response = client.delete(f"/api/v1/posts/{post_id}/images/{image['_id']}", headers=headers)
+    assert response.status_code == 204
+    assert db['image_blobs'].find_one({"_id": image["sha256"]})["ref_count"] == 1
+    assert (IMAGE_BUCKET, image["filepath"]) in get_minio_client().uploaded_files
+
+    db['image_blobs'].delete_one({"_id": image["sha256"]})
+
+def test_image_upload_rejects_non_image_declared_as_png(create_test_post):
+    post_id = create_test_post["post_id"]
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images",
+        headers={"Authorization": f"Bearer {create_test_post['token']}"},
+        files={"file": ("fake.png", io.BytesIO(b"<html><script>alert(1)</script></html>"), "image/png")}
+    )
+    assert response.status_code == 415
+
+def test_serve_image_with_range_and_etag(create_test_post):
+    """Test streaming an image through the API with range and conditional requests"""
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    content = PNG_BYTES + ObjectId().binary
+    response = client.post(
+        f"/api/v1/posts/{post_id}/images",
+        headers=headers,
+        files={"file": ("served.png", io.BytesIO(content), "image/png")}
+    )
+    assert response.status_code == 200
+    image_id = response.json()["id"]
+
+    response = client.get(f"/api/v1/images/{image_id}")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+
+    response = client.get(f"/api/v1/images/{image_id}", headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == content[:8]
+    assert response.headers["content-range"] == f"bytes 0-7/{len(content)}"
+
+    response = client.get(f"/api/v1/images/{image_id}", headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+
+    response = client.get(f"/api/v1/images/{image_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get(f"/api/v1/images/{ObjectId()}")
+    assert response.status_code == 404
+
+def test_conditional_get_post(create_test_post):
+    """Test that unchanged posts revalidate with 304 and updates change the ETag"""
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+
+    response = client.get(f"/api/v1/posts/{post_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+    assert "cache-control" in response.headers
+
+    response = client.get(f"/api/v1/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    response = client.put(f"/api/v1/posts/{post_id}", headers=headers, json={"title": "Revalidated title"})
+    assert response.status_code == 200
+
+    response = client.get(f"/api/v1/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["title"] == "Revalidated title"
+
+def test_conditional_get_post_list(create_test_post):
+    """Test that the posts list ETag changes when any post changes"""
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+
+    response = client.get("/api/v1/posts?limit=5")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    assert client.get("/api/v1/posts?limit=5", headers={"If-None-Match": etag}).status_code == 304
+    # Different query parameters are a different representation
+    assert client.get("/api/v1/posts?limit=6", headers={"If-None-Match": etag}).status_code == 200
+
+    client.put(f"/api/v1/posts/{post_id}", headers=headers, json={"body": "Changed body"})
+    response = client.get("/api/v1/posts?limit=5", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+class CountingCollection:
+    """Wraps a collection and counts the read queries and round trips made through it."""
+    READS = ("find", "find_one")
+    WRITES = ("find_one_and_update", "update_one", "insert_one", "delete_one")
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.reads = 0
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.READS + self.WRITES:
+            return attr
+        def counted(*args, **kwargs):
+            if name in self.READS:
+                self.reads += 1
+            self.round_trips += 1
+            return attr(*args, **kwargs)
+        return counted
+
+@pytest.fixture
+def count_queries(monkeypatch):
+    from app import crud
+    collections = {}
+    for name in ("posts_collection", "comments_collection", "users_collection"):
+        collections[name] = CountingCollection(getattr(crud, name))
+        monkeypatch.setattr(crud, name, collections[name])
+    return collections
+
+def test_update_post_query_count(create_test_post, count_queries):
+    """Test that updating a post is a single round trip"""
+    post_id = create_test_post["post_id"]
+    response = client.put(
+        f"/api/v1/posts/{post_id}",
+        headers={"Authorization": f"Bearer {create_test_post['token']}"},
+        json={"title": "Counted update"}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "Counted update"
+    assert count_queries["posts_collection"].round_trips == 1
+
+def test_update_post_without_changes(create_test_post):
+    """Test that an update that changes nothing keeps updated_at"""
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    first = client.put(f"/api/v1/posts/{post_id}", headers=headers, json={"title": "Same title"}).json()
+
+    response = client.put(f"/api/v1/posts/{post_id}", headers=headers, json={"title": "Same title"})
+    assert response.status_code == 200
+    assert response.json()["updated_at"] == first["updated_at"]
+
+def test_create_reply_comment_query_count(create_test_post, count_queries):
+    """Test that creating a reply reads the post and the parent comment once each"""
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    parent = client.post(f"/api/v1/posts/{post_id}/comments", headers=headers, json={"body": "Parent"}).json()
+    count_queries["posts_collection"].reads = 0
+    count_queries["comments_collection"].reads = 0
+
+    response = client.post(
+        f"/api/v1/posts/{post_id}/comments",
+        headers=headers,
+        json={"body": "Reply", "parent_id": parent["id"]}
+    )
+    assert response.status_code == 201
+    assert count_queries["posts_collection"].reads == 1
+    assert count_queries["comments_collection"].reads == 1
+
+    from app.database import db
+    db['comments'].delete_many({"post_id": post_id})
+
+def test_get_posts_include_author(create_test_post, count_queries):
+    """Test that include=author embeds authors with one batched users query"""
+    from app.profile_cache import profile_cache
+    profile_cache.clear()
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+
+    response = client.get("/api/v1/posts?limit=20&include=author", headers=headers)
+    assert response.status_code == 200
+    posts = response.json()
+    assert posts and all(post["author"]["id"] == post["author_id"] for post in posts if post["author"])
+    assert count_queries["users_collection"].reads <= 2  # the caller's token check plus one batch
+
+    # Cached profiles need no users query at all
+    count_queries["users_collection"].reads = 0
+    client.get("/api/v1/posts?limit=20&include=author")
+    assert count_queries["users_collection"].reads == 0
+
+    assert client.get("/api/v1/posts?include=comments").status_code == 400
+    assert client.get("/api/v1/posts").json()[0]["author"] is None
+
+def test_missing_post_lookups_are_cached(count_queries):
+    """Test that repeated requests for a missing post stop reaching the database"""
+    missing_id = str(ObjectId())
+    assert client.get(f"/api/v1/posts/{missing_id}/comments").status_code == 404
+    assert count_queries["posts_collection"].reads == 1
+
+    assert client.get(f"/api/v1/posts/{missing_id}/comments").status_code == 404
+    assert client.get(f"/api/v1/posts/not-an-id/comments").status_code == 404
+    assert count_queries["posts_collection"].reads == 1
+
+def run_pending_deletions():
+    from app import crud
+    from app.cascade import CASCADE_JOB, run_cascade
+    while (job := crud.claim_job(CASCADE_JOB, 60)) is not None:
+        run_cascade(job)
+        crud.complete_job(job["_id"], job["attempts"])
+
+def test_delete_post_cascades_in_background(create_test_post):
+    """Test that deleting a post hides it at once and removes its comments in the background"""
+    from app.database import db
+    post_id = create_test_post["post_id"]
+    headers = {"Authorization": f"Bearer {create_test_post['token']}"}
+    for body in ("First", "Second"):
+        client.post(f"/api/v1/posts/{post_id}/comments", headers=headers, json={"body": body})
+
+    assert client.delete(f"/api/v1/posts/{post_id}", headers=headers).status_code == 204
+    assert client.get(f"/api/v1/posts/{post_id}").status_code == 404
+    assert db['jobs'].find_one({"dedupe_key": f"post:{post_id}"})["status"] == "queued"
+
+    run_pending_deletions()
+    assert db['comments'].count_documents({"post_id": post_id}) == 0
+    job = db['jobs'].find_one({"dedupe_key": f"post:{post_id}"})
+    assert job["status"] == "done"
+    assert job["progress"]["comments"] == 2
+
@@ -0,0 +1,43 @@
+from app.profile_cache import ProfileCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def profile(user_id):
+    return {"id": user_id, "email": f"{user_id}@example.com"}
+
+def test_get_many_splits_cached_and_missing():
+    cache = ProfileCache(ttl=60)
+    cache.set_many({"a": profile("a")})
+    found, missing = cache.get_many(["a", "b", "a"])
+    assert found == {"a": profile("a")}
+    # Duplicate IDs are only fetched once
+    assert missing == ["b"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=60, clock=clock)
+    cache.set_many({"a": profile("a")})
+    clock.now += 61
+    assert cache.get_many(["a"]) == ({}, ["a"])
+    assert cache.stats()["entries"] == 0
+
+def test_invalidate_and_lru_bound():
+    cache = ProfileCache(ttl=60, max_entries=2)
+    cache.set_many({"a": profile("a"), "b": profile("b")})
+    cache.get_many(["a"])
+    cache.set_many({"c": profile("c")})
+    # "b" was the least recently used
+    assert cache.get_many(["a", "b", "c"])[1] == ["b"]
+    cache.invalidate("a")
+    assert cache.get_many(["a"])[1] == ["a"]
+
+def test_zero_ttl_disables_caching():
+    cache = ProfileCache(ttl=0)
+    cache.set_many({"a": profile("a")})
+    assert cache.get_many(["a"]) == ({}, ["a"])
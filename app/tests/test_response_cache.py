@@ -0,0 +1,126 @@
+import asyncio
+from starlette.requests import Request
+
+from app.response_cache import CachedResponse, ResponseCache, cache_key, is_cacheable
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def make_request(path="/api/v1/posts", query=b"", headers=None):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+def counting_loader(body=b"[]", delay=0.01):
+    calls = []
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return CachedResponse(body=body, etag='"v1"')
+    return load, calls
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResponseCache(ttl=5)
+    load, calls = counting_loader()
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("k", ["posts"], load) for _ in range(50)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(status for _, status in results).count("COALESCED") == 49
+    assert all(entry.body == b"[]" for entry, _ in results)
+    assert cache.stats()["coalesced"] == 49
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=2, clock=clock)
+    load, calls = counting_loader()
+
+    asyncio.run(cache.get_or_load("k", [], load))
+    assert asyncio.run(cache.get_or_load("k", [], load))[1] == "HIT"
+    clock.now += 3
+    assert asyncio.run(cache.get_or_load("k", [], load))[1] == "MISS"
+    assert len(calls) == 2
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(ttl=60, max_entries=2, max_bytes=10)
+    for key, body in (("a", b"1234"), ("b", b"1234"), ("c", b"1234")):
+        load, _ = counting_loader(body)
+        asyncio.run(cache.get_or_load(key, [], load))
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+    load, _ = counting_loader(b"123456789")
+    asyncio.run(cache.get_or_load("d", [], load))
+    stats = cache.stats()
+    assert stats["bytes"] <= 10
+    assert stats["evictions"] == 3
+
+def test_invalidate_by_tag_and_during_load():
+    cache = ResponseCache(ttl=60)
+    load, _ = counting_loader()
+    asyncio.run(cache.get_or_load("list", ["posts"], load))
+    asyncio.run(cache.get_or_load("detail", ["post:1"], load))
+    cache.invalidate("post:1")
+    assert cache.get("detail") is None
+    assert cache.get("list") is not None
+
+    async def invalidating_load():
+        cache.invalidate("posts")
+        return CachedResponse(body=b"stale")
+    asyncio.run(cache.get_or_load("racing", ["posts"], invalidating_load))
+    # A write during the load means the result may be stale; it isn't stored
+    assert cache.get("racing") is None
+
+def test_loader_errors_reach_every_waiter():
+    cache = ResponseCache(ttl=60)
+
+    async def failing_load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("k", [], failing_load) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert cache.stats()["inflight"] == 0
+
+def test_cancelled_owner_does_not_fail_waiters():
+    cache = ResponseCache(ttl=60)
+    load, calls = counting_loader(delay=0.05)
+
+    async def run():
+        owner = asyncio.ensure_future(cache.get_or_load("k", [], load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_load("k", [], load))
+        await asyncio.sleep(0.01)
+        # The client that started the load disconnects
+        owner.cancel()
+        return await asyncio.gather(owner, waiter, return_exceptions=True)
+
+    owner_result, (entry, status) = asyncio.run(run())
+    assert isinstance(owner_result, asyncio.CancelledError)
+    assert status == "COALESCED" and entry.body == b"[]"
+    # The load still finished and was cached
+    assert len(calls) == 1 and cache.get("k") is not None
+
+def test_cached_response_answers_revalidation():
+    entry = CachedResponse.from_content({"title": "Hello"}, etag='"abc"')
+    assert entry.body == b'{"title":"Hello"}'
+    assert entry.to_response(make_request(headers={"If-None-Match": '"abc"'}), "HIT").status_code == 304
+    response = entry.to_response(make_request(), "HIT")
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "HIT"
+
+def test_only_anonymous_requests_are_cacheable():
+    assert is_cacheable(make_request())
+    assert not is_cacheable(make_request(headers={"Authorization": "Bearer token"}))
+    assert cache_key(make_request(query=b"limit=5&page=0")) == cache_key(make_request(query=b"page=0&limit=5"))
@@ -0,0 +1,49 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+from app.object_storage import MockMinioClient
+from app.storage_gc import collect_garbage
+
+def make_bucket(names, age=timedelta(days=2)):
+    client = MockMinioClient()
+    for name in names:
+        client.put_object("blog-images", name, io.BytesIO(b"data"), 4)
+        client.uploaded_files[("blog-images", name)]["last_modified"] = datetime.now(timezone.utc) - age
+    return client
+
+def stored_names(client):
+    return sorted(name for _, name in client.uploaded_files)
+
+def test_collect_garbage_deletes_only_unreferenced_objects():
+    client = make_bucket(["a.png", "b.png", "c.png", "d.png", "e.png"])
+    stats = collect_garbage("blog-images", client=client, references=iter(["b.png", "d.png", "z.png"]))
+
+    assert stored_names(client) == ["b.png", "d.png"]
+    assert stats.scanned == 5
+    assert stats.referenced == 2
+    assert stats.orphaned == 3
+    assert stats.orphaned_bytes == 12
+    assert stats.deleted == 3
+
+def test_collect_garbage_dry_run_keeps_objects():
+    client = make_bucket(["a.png", "b.png"])
+    stats = collect_garbage("blog-images", dry_run=True, client=client, references=iter([]))
+
+    assert stored_names(client) == ["a.png", "b.png"]
+    assert stats.orphaned == 2
+    assert stats.deleted == 0
+
+def test_collect_garbage_respects_grace_period():
+    client = make_bucket(["recent.png"], age=timedelta(minutes=5))
+    stats = collect_garbage("blog-images", grace_period=timedelta(hours=1), client=client, references=iter([]))
+
+    assert stored_names(client) == ["recent.png"]
+    assert stats.within_grace == 1
+
+def test_collect_garbage_deletes_in_batches():
+    client = make_bucket([f"{i:03}.png" for i in range(25)])
+    stats = collect_garbage("blog-images", batch_size=10, client=client, references=iter([]))
+
+    assert stats.deleted == 25
+    assert client.calls["remove_objects"] == 3
+    assert stored_names(client) == []
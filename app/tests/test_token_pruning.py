@@ -0,0 +1,65 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+
+from app import crud, token_pruning
+from app.database import db
+from app.tests.test_utils import create_test_token
+
+def make_users(count, expired_per_user, valid_per_user):
+    users = []
+    for _ in range(count):
+        user_id = ObjectId()
+        expired = [create_test_token({"id": str(user_id), "n": n}, timedelta(minutes=-5)) for n in range(expired_per_user)]
+        valid = [create_test_token({"id": str(user_id), "n": n}, timedelta(minutes=30)) for n in range(valid_per_user)]
+        db['users'].insert_one({
+            "_id": user_id,
+            "email": f"prune.{user_id}@example.com",
+            "hashed_password": "x",
+            "created_at": datetime.now(timezone.utc),
+            "tokens": expired + valid,
+        })
+        users.append((user_id, valid))
+    return users
+
+@pytest.fixture
+def start_id():
+    start = ObjectId()
+    yield str(start)
+    db['users'].delete_many({"_id": {"$gt": start}, "email": {"$regex": "^prune\\."}})
+    db['checkpoints'].delete_one({"_id": token_pruning.PRUNE_JOB})
+
+def test_expired_tokens():
+    now = datetime.now(timezone.utc).timestamp()
+    expired = create_test_token({"id": "1"}, timedelta(minutes=-1))
+    valid = create_test_token({"id": "1"}, timedelta(minutes=1))
+    assert token_pruning.expired_tokens([expired, valid, "not-a-jwt"], now) == [expired, "not-a-jwt"]
+
+def test_prune_batch_removes_only_expired_tokens(start_id):
+    users = make_users(3, expired_per_user=4, valid_per_user=2)
+
+    last_id, counts = token_pruning.prune_batch(start_id, batch_size=10)
+
+    assert last_id == str(users[-1][0])
+    assert counts["users_scanned"] == 3
+    assert counts["users_updated"] == 3
+    assert counts["tokens_removed"] == 12
+    assert counts["bytes_reclaimed"] > 12 * 100
+    for user_id, valid in users:
+        assert db['users'].find_one({"_id": user_id})["tokens"] == valid
+
+def test_run_prune_resumes_from_checkpoint(start_id):
+    users = make_users(5, expired_per_user=1, valid_per_user=1)
+    crud.save_checkpoint(token_pruning.PRUNE_JOB, start_id)
+    job_id = crud.enqueue_job(token_pruning.PRUNE_JOB, {})
+
+    totals = token_pruning.run_prune({"_id": job_id}, batch_size=2, max_batches=2, batch_delay=0)
+    assert totals["users_scanned"] == 4
+    assert crud.get_checkpoint(token_pruning.PRUNE_JOB)["position"] == str(users[3][0])
+
+    totals = token_pruning.run_prune({"_id": job_id}, batch_size=2, max_batches=2, batch_delay=0)
+    assert totals["users_scanned"] == 1
+    # The scan reached the end and starts over next time
+    assert crud.get_checkpoint(token_pruning.PRUNE_JOB)["position"] is None
+    assert all(len(db['users'].find_one({"_id": user_id})["tokens"]) == 1 for user_id, _ in users)
+    db['jobs'].delete_one({"_id": ObjectId(job_id)})
@@ -59,6 +59,8 @@ def test_get_current_user(mock_user):
     assert "id" in data
     assert "email" in data
     assert data["id"] == mock_user
+    # The session profile never loads stored tokens
+    assert data["tokens"] is None
 
 @pytest.fixture
 def create_second_user():
@@ -0,0 +1,111 @@
+"""
+Periodic pruning of expired tokens from user documents.
+
+Issued tokens are pushed onto users.tokens and only removed on logout or a
+password change, so the arrays of active users keep growing with expired
+JWTs that verify_token would reject anyway. The leader enqueues a
+prune_tokens job every TOKEN_PRUNE_INTERVAL_SECONDS. Each run scans users
+with tokens in _id order, TOKEN_PRUNE_BATCH_SIZE at a time, decodes the
+expiry of their tokens and removes the expired ones with one bulk write of
+$pullAll updates per batch. Runs stop after TOKEN_PRUNE_MAX_BATCHES batches,
+pausing TOKEN_PRUNE_BATCH_DELAY_SECONDS between batches to bound the write
+rate. The last processed _id is checkpointed after every batch, so the next
+run (or a retry) resumes there and starts over once it reaches the end.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import bson
+import jwt
+from jwt.exceptions import PyJWTError
+from dotenv import load_dotenv
+from . import crud
+from .jobs import job_runner
+from .leader import leader
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+TOKEN_PRUNE_INTERVAL = float(os.getenv("TOKEN_PRUNE_INTERVAL_SECONDS", 3600))
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("TOKEN_PRUNE_BATCH_SIZE", 500))
+TOKEN_PRUNE_MAX_BATCHES = int(os.getenv("TOKEN_PRUNE_MAX_BATCHES", 100))
+TOKEN_PRUNE_BATCH_DELAY = float(os.getenv("TOKEN_PRUNE_BATCH_DELAY_SECONDS", 0.1))
+
+PRUNE_JOB = "prune_tokens"
+
+def expired_tokens(tokens: List[str], now: float) -> List[str]:
+    """Tokens whose exp has passed, plus any that can't be decoded, which could never verify."""
+    expired = []
+    for token in tokens:
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except PyJWTError:
+            exp = None
+        if exp is None or exp <= now:
+            expired.append(token)
+    return expired
+
+def _array_bytes(tokens: List[str]) -> int:
+    return len(bson.encode({"tokens": tokens}))
+
+def prune_batch(after_id: Optional[str], batch_size: int = TOKEN_PRUNE_BATCH_SIZE) -> Tuple[Optional[str], Dict[str, int]]:
+    """Prune expired tokens from the next batch of users after after_id. Blocking.
+
+    Returns:
+        Tuple[Optional[str], Dict[str, int]]: The last user ID scanned (None
+        when no users are left) and counts of what was pruned.
+    """
+    users = crud.get_user_tokens_batch(after_id, batch_size)
+    if not users:
+        return None, {}
+    now = datetime.now(timezone.utc).timestamp()
+    removals: Dict[str, List[str]] = {}
+    bytes_reclaimed = 0
+    for user in users:
+        tokens = user.get("tokens", [])
+        expired = expired_tokens(tokens, now)
+        if expired:
+            removals[str(user["_id"])] = expired
+            expired_set = set(expired)
+            remaining = [token for token in tokens if token not in expired_set]
+            bytes_reclaimed += _array_bytes(tokens) - _array_bytes(remaining)
+    users_updated = crud.pull_user_tokens(removals)
+    counts = {
+        "users_scanned": len(users),
+        "users_updated": users_updated,
+        "tokens_removed": sum(len(tokens) for tokens in removals.values()),
+        "bytes_reclaimed": bytes_reclaimed,
+    }
+    return str(users[-1]["_id"]), counts
+
+def run_prune(job: dict, batch_size: int = TOKEN_PRUNE_BATCH_SIZE, max_batches: int = TOKEN_PRUNE_MAX_BATCHES,
+              batch_delay: float = TOKEN_PRUNE_BATCH_DELAY) -> Dict[str, int]:
+    """Job handler: prune up to max_batches batches from the checkpoint on. Blocking."""
+    checkpoint = crud.get_checkpoint(PRUNE_JOB)
+    after_id = checkpoint["position"] if checkpoint else None
+    totals: Dict[str, int] = {}
+    for batch in range(max_batches):
+        if batch and batch_delay:
+            time.sleep(batch_delay)
+        last_id, counts = prune_batch(after_id, batch_size)
+        finished = last_id is None or counts["users_scanned"] < batch_size
+        # Back to the start once the end is reached
+        crud.save_checkpoint(PRUNE_JOB, None if finished else last_id, counts)
+        if counts:
+            crud.record_job_progress(job["_id"], counts)
+            for key, count in counts.items():
+                totals[key] = totals.get(key, 0) + count
+        if finished:
+            break
+        after_id = last_id
+    logger.info(f"Token pruning run finished: {totals}")
+    return totals
+
+def schedule_prune() -> None:
+    job_runner.enqueue(PRUNE_JOB, {}, dedupe_key=PRUNE_JOB)
+
+job_runner.register(PRUNE_JOB, run_prune)
+leader.every(PRUNE_JOB, TOKEN_PRUNE_INTERVAL, schedule_prune)
@@ -0,0 +1,80 @@
+"""
+Measure bulk import throughput against per-document inserts.
+
+Generates an export of posts with comments in memory, imports it with
+BulkImporter at each batch size, then inserts the same documents one
+insert_one at a time as crud.create_post does. Needs the same MongoDB the
+API uses (MONGO_URI). The imported documents are removed afterwards.
+
+Usage:
+    python -m benchmarks.bulk_import --posts 2000 --comments-per-post 4 --batch-sizes 100 1000 5000
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from bson import json_util
+from bson.objectid import ObjectId
+from app import bulk
+from app.database import posts_collection, comments_collection
+
+def generate_export(posts, comments_per_post, author_id):
+    now = datetime.now(timezone.utc)
+    lines = []
+    for n in range(posts):
+        post_id = ObjectId()
+        lines.append(bulk._line("post", {
+            "_id": post_id, "title": f"Benchmark post {n}", "body": "Lorem ipsum dolor sit amet. " * 40,
+            "author_id": author_id, "created_at": now, "categories": [1, 2],
+        }))
+        for c in range(comments_per_post):
+            lines.append(bulk._line("comment", {
+                "_id": ObjectId(), "post_id": str(post_id), "author_id": author_id,
+                "body": f"Benchmark comment {c}. " * 10, "created_at": now,
+            }))
+    return b"".join(lines)
+
+def cleanup(author_id):
+    comments_collection.delete_many({"author_id": author_id})
+    posts_collection.delete_many({"author_id": author_id})
+
+def run_import(data, batch_size):
+    importer = bulk.BulkImporter(batch_size)
+    for start in range(0, len(data), bulk.EXPORT_CHUNK_SIZE):
+        importer.import_chunk(data[start:start + bulk.EXPORT_CHUNK_SIZE])
+    importer.import_rest()
+    return importer.finish()
+
+def run_single_inserts(data):
+    documents = 0
+    started = time.perf_counter()
+    for line in data.splitlines():
+        record = json_util.loads(line)
+        record["data"].pop("_id")
+        collection = posts_collection if record["type"] == "post" else comments_collection
+        collection.insert_one(record["data"])
+        documents += 1
+    return documents / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--comments-per-post", type=int, default=4)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    author_id = f"benchmark-{ObjectId()}"
+    data = generate_export(args.posts, args.comments_per_post, author_id)
+    total = args.posts * (1 + args.comments_per_post)
+    print(f"{total} documents, {len(data) / 1024 / 1024:.1f} MiB of NDJSON")
+    try:
+        for batch_size in args.batch_sizes:
+            stats = run_import(data, batch_size)
+            print(f"batch_size={batch_size:<6} {stats.documents_per_second:>10.0f} docs/s  "
+                  f"({stats.posts} posts, {stats.comments} comments, {stats.invalid + stats.failed} errors)")
+            cleanup(author_id)
+        print(f"insert_one         {run_single_inserts(data):>10.0f} docs/s")
+    finally:
+        cleanup(author_id)
+
+if __name__ == "__main__":
+    main()
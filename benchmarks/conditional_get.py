@@ -0,0 +1,81 @@
+"""
+Compare the cost of full 200 responses against 304 revalidations.
+
+Seeds posts with long bodies, then times GET /posts and GET /posts/{id} with
+and without a matching If-None-Match header. Needs the same MongoDB the API
+uses (MONGO_URI). The seeded posts are removed afterwards.
+
+Usage:
+    python -m benchmarks.conditional_get --posts 200 --requests 300
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from app import crud
+from app.database import posts_collection
+from app.main import app
+from app.models import PostModel
+
+# Any Authorization header bypasses the anonymous response cache, so both
+# measurements include the database work
+BYPASS_CACHE = {"Authorization": "Bearer benchmark"}
+
+def time_requests(client, url, requests, headers=None):
+    timings = []
+    status_codes = set()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url, headers={**BYPASS_CACHE, **(headers or {})})
+        timings.append((time.perf_counter() - started) * 1000)
+        status_codes.add(response.status_code)
+    timings.sort()
+    return {
+        "status": sorted(status_codes),
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "bytes": len(response.content),
+    }
+
+def report(name, full, revalidated):
+    print(f"\n{name}")
+    for label, result in (("200 full", full), ("304 revalidate", revalidated)):
+        print(f"  {label:<15} status={result['status']} mean={result['mean_ms']:.2f}ms "
+              f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms body={result['bytes']}B")
+    print(f"  speedup: {full['mean_ms'] / revalidated['mean_ms']:.1f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark conditional GETs on posts.")
+    parser.add_argument("--posts", type=int, default=200, help="Posts to seed")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per measurement")
+    parser.add_argument("--limit", type=int, default=50, help="Page size for the list endpoint")
+    args = parser.parse_args(argv)
+
+    body = "Lorem ipsum dolor sit amet. " * 200
+    seeded = []
+    for i in range(args.posts):
+        now = datetime.now(timezone.utc)
+        post = crud.create_post(PostModel(
+            title=f"Benchmark post {i}", body=body, author_id="benchmark", created_at=now, updated_at=now
+        ))
+        seeded.append(post.id)
+
+    try:
+        with TestClient(app) as client:
+            for name, url in (
+                (f"GET /posts?limit={args.limit}", f"/api/v1/posts?limit={args.limit}"),
+                ("GET /posts/{id}", f"/api/v1/posts/{seeded[0]}"),
+            ):
+                # Warm up, and fetch the current ETag
+                etag = client.get(url, headers=BYPASS_CACHE).headers["etag"]
+                full = time_requests(client, url, args.requests)
+                revalidated = time_requests(client, url, args.requests, {"If-None-Match": etag})
+                report(name, full, revalidated)
+    finally:
+        posts_collection.delete_many({"author_id": "benchmark"})
+        crud.bump_version(crud.POSTS_VERSION_KEY)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Load test for the anonymous response cache.
+
+Runs concurrent anonymous GET /posts/{id} and GET /posts requests in-process
+and reports requests/sec next to the database queries/sec they caused. With
+the cache, queries/sec should stay flat as concurrency rises; the uncached
+baseline (the same requests with an Authorization header, which bypasses
+the cache) grows with it. Needs the MongoDB the API uses (MONGO_URI).
+
+Usage:
+    python -m benchmarks.response_cache_load --duration 5 --concurrency 1,10,50,100
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import httpx
+from app import crud
+from app.database import posts_collection
+from app.main import app
+from app.models import PostModel
+from app.response_cache import response_cache
+
+COUNTED_QUERIES = ("get_post_by_id", "get_filtered_posts", "get_version")
+
+def count_queries(counter: Counter):
+    """Wrap the crud reads behind the cached endpoints so each call is counted."""
+    for name in COUNTED_QUERIES:
+        original = getattr(crud, name)
+        def counted(*args, _original=original, _name=name, **kwargs):
+            counter[_name] += 1
+            return _original(*args, **kwargs)
+        setattr(crud, name, counted)
+
+async def run_level(urls, concurrency: int, duration: float, headers: dict, queries: Counter) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    requests = 0
+    statuses = Counter()
+    queries.clear()
+    response_cache.clear()
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker(index: int):
+            nonlocal requests
+            i = index
+            while time.perf_counter() < deadline:
+                response = await client.get(urls[i % len(urls)], headers=headers)
+                statuses[response.status_code] += 1
+                requests += 1
+                i += 1
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests_per_sec": requests / elapsed,
+        "queries_per_sec": sum(queries.values()) / elapsed,
+        "statuses": dict(statuses),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the anonymous response cache.")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per concurrency level")
+    parser.add_argument("--concurrency", default="1,10,50,100", help="Comma-separated concurrency levels")
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    now = datetime.now(timezone.utc)
+    post = crud.create_post(PostModel(
+        title="Viral post", body="Everyone is reading this. " * 100, author_id="benchmark",
+        created_at=now, updated_at=now
+    ))
+    urls = [f"/api/v1/posts/{post.id}", "/api/v1/posts?limit=20"]
+    queries = Counter()
+    count_queries(queries)
+
+    try:
+        for label, headers in (("cached (anonymous)", {}), ("uncached baseline", {"Authorization": "Bearer benchmark"})):
+            print(f"\n{label}")
+            print(f"  {'concurrency':>11} {'req/s':>10} {'db queries/s':>13}")
+            for level in levels:
+                result = asyncio.run(run_level(urls, level, args.duration, headers, queries))
+                print(f"  {result['concurrency']:>11} {result['requests_per_sec']:>10.0f} "
+                      f"{result['queries_per_sec']:>13.0f}  {result['statuses']}")
+        print(f"\nresponse cache: {response_cache.stats()}")
+    finally:
+        posts_collection.delete_many({"author_id": "benchmark"})
+        crud.bump_version(crud.POSTS_VERSION_KEY)
+
+if __name__ == "__main__":
+    main()